@@ -36,15 +36,13 @@ import logging
 import os
 import sys
 import re
-import platform
-import subprocess
-import tempfile
 import xml.dom.minidom
 import xml.etree.ElementTree
 
 from hbi_settings import READELF, OBJCPY, OBJDUMP, hbi_sources
 
 import com.elf_support as elf_support
+import com.crypto_backend as crypto_backend
 from   nxt_version import get_version_strings
 __version__, __revision__, version_clean = get_version_strings()
 
@@ -52,8 +50,12 @@ __version__, __revision__, version_clean = get_version_strings()
 
 # Is this a standalone script?
 if __name__ != '__main__':
-    # No -> import the SCons module.
-    import SCons.Script
+    # No -> import the SCons module. It is not available if the module is
+    # used by the batch mode of the COM compiler.
+    try:
+        import SCons.Script
+    except ImportError:
+        pass
 
 
 sdram_choices = [0x00000000, 0x00400000, 0x00800000,
@@ -115,23 +117,30 @@ class AppImage:
     __strNetxType = None
 
     __XmlKeyromContents = None
-    __cfg_openssl = 'openssl'
-    __cfg_openssloptions = None
-    __fOpensslRandOff = False
+
+    # The decoded keys from the keyrom. This maps the index to the DER data.
+    __atKeyromKeys = None
+
+    # The backend for signatures and the analysis of keys.
+    __tCryptoBackend = None
     __signed_binding = False
 
     def __init__(self, tEnv, strNetxType, astrIncludePaths, atKnownFiles,
-                 ulSDRamSplitOffset, strOpensslExe, fOpensslRandOff):
+                 ulSDRamSplitOffset, strOpensslExe, fOpensslRandOff,
+                 strCryptoBackend='auto'):
         self.__tEnv = tEnv
         self.__astrIncludePaths = astrIncludePaths
         self.__atKnownFiles = atKnownFiles
         self.__ulSDRamSplitOffset = ulSDRamSplitOffset
         self.__strNetxType = strNetxType
 
-        self.__cfg_openssl = strOpensslExe
         # No SSL options yet.
-        self.__cfg_openssloptions = []
-        self.__fOpensslRandOff = fOpensslRandOff
+        self.__tCryptoBackend = crypto_backend.get_backend(
+            strCryptoBackend,
+            strOpensslExe,
+            [],
+            fOpensslRandOff
+        )
 
     def segments_init(self):
         self.__tElfSegments = {}
@@ -205,6 +214,7 @@ class AppImage:
             strXml = tFile.read()
             tFile.close()
             self.__XmlKeyromContents = xml.etree.ElementTree.fromstring(strXml)
+            self.__atKeyromKeys = {}
 
     # If strVal begins with the @ character:
     # If the remainder of the string can be resolved as an alias, return the
@@ -442,26 +452,11 @@ class AppImage:
                 pulLoadAddress = int(strOverwriteAddress, 0)
 
             # Extract the binary.
-            tBinFile, strBinFileName = tempfile.mkstemp()
-            os.close(tBinFile)
-            astrCmd = [
-                self.__tEnv['OBJCOPY'],
-                '--output-target=binary'
-            ]
-            if astrSegmentsToDump is not None:
-                for strSegment in astrSegmentsToDump:
-                    astrCmd.append('--only-section=%s' % strSegment)
-            astrCmd.append(strAbsFilePath)
-            astrCmd.append(strBinFileName)
-            subprocess.check_call(astrCmd)
-
-            # Get the application data.
-            tBinFile = open(strBinFileName, 'rb')
-            strData = tBinFile.read()
-            tBinFile.close()
-
-            # Remove the temp file.
-            os.remove(strBinFileName)
+            strData = elf_support.get_binary(
+                self.__tEnv,
+                strAbsFilePath,
+                astrSegmentsToDump
+            )
 
         return strData, pulLoadAddress
 
@@ -740,29 +735,6 @@ class AppImage:
 
         return aucBinding
 
-    # This function gets a data block from the OpenSSL output.
-    def __openssl_get_data_block(self, strStdout, strID):
-        aucData = array.array('B')
-        tReData = re.compile('^[0-9a-fA-F]{2}(:[0-9a-fA-F]{2})*:?$')
-        iState = 0
-        for strLine in iter(strStdout.splitlines()):
-            strLine = strLine.strip()
-            if iState == 0:
-                if strLine == strID:
-                    iState = 1
-            elif iState == 1:
-                tMatch = tReData.search(strLine)
-                if tMatch is None:
-                    break
-                else:
-                    for strDataHex in strLine.split(':'):
-                        strDataHexStrip = strDataHex.strip()
-                        if len(strDataHexStrip) != 0:
-                            strDataBin = binascii.unhexlify(strDataHexStrip)
-                            aucData.append(ord(strDataBin))
-
-        return aucData
-
     def __openssl_cut_leading_zero(self, aucData):
         # Does the number start with "00" and is the third digit >= 8?
         if aucData[0] == 0x00 and aucData[1] >= 0x80:
@@ -772,26 +744,16 @@ class AppImage:
     def __openssl_convert_to_little_endian(self, aucData):
         aucData.reverse()
 
-    def __openssl_uncompress_field(self, aucData):
-        # The data must not be compressed.
-        if aucData[0] != 0x04:
-            raise Exception('The data is compressed. '
-                            'This is not supported yet.')
-        # Cut off the first byte.
-        aucData.pop(0)
-
-    def __openssl_cut_in_half(self, aucData):
-        # Cut the public key in equal parts.
-        sizDataHalf = len(aucData) / 2
-        aucData0 = array.array('B', aucData[:sizDataHalf])
-        aucData1 = array.array('B', aucData[sizDataHalf:])
-        return aucData0, aucData1
-
     def __keyrom_get_key(self, uiIndex):
         # This needs the keyrom data.
         if self.__XmlKeyromContents is None:
             raise Exception('No Keyrom contents specified!')
 
+        # Each key is decoded only once.
+        strKeyDER = self.__atKeyromKeys.get(uiIndex)
+        if strKeyDER is not None:
+            return strKeyDER
+
         # Find the requested key and hash.
         tNode = self.__XmlKeyromContents.find('Entry/[@index="%d"]' % uiIndex)
         if tNode is None:
@@ -807,79 +769,31 @@ class AppImage:
 
         # Decode the BASE64 data. Now we have the key pair in DER format.
         strKeyDER = base64.b64decode(strKeyBase64)
+        self.__atKeyromKeys[uiIndex] = strKeyDER
 
         return strKeyDER
 
+    def __get_key_cache_path(self):
+        # The analysed keys are only stored on disk if the environment has
+        # a path for the database.
+        strKeyCachePath = None
+        if self.__tEnv is not None:
+            strKeyCachePath = self.__tEnv.get('KEY_CACHE')
+        return strKeyCachePath
+
     def __get_cert_mod_exp(self, tNodeParent, strKeyDER, fIsPublicKey):
         # Extract all information from the key.
-        if len(strKeyDER) > 1000:
-            astrCmd = [
-                self.__cfg_openssl,
-                'pkey',
-                '-inform',
-                'DER',
-                '-text',
-                '-noout'
-            ]
-        else:
-            astrCmd = [
-                self.__cfg_openssl,
-                'ec',
-                '-inform',
-                'DER',
-                '-text',
-                '-noout',
-                '-param_enc', 'explicit',
-                '-no_public'
-            ]
-        if fIsPublicKey is True:
-            astrCmd.append('-pubin')
-        if platform.system() == 'Windows':
-            tProcess = subprocess.Popen(
-                astrCmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                shell=True
-            )
-        else:
-            tProcess = subprocess.Popen(
-                astrCmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE
-            )
-        (strStdout, strStdErr) = tProcess.communicate(strKeyDER)
-        if tProcess.returncode != 0:
-            raise Exception('OpenSSL failed with return code %d.' %
-                            tProcess.returncode)
-
-        # Try to guess if this is an RSA or ECC key.
-        # The text dump of an RSA key has " modulus:", while an ECC key has
-        # "priv:".
-        iKeyTyp_1ECC_2RSA = None
+        iKeyTyp_1ECC_2RSA, atNumbers = crypto_backend.get_key_numbers(
+            self.__tCryptoBackend,
+            strKeyDER,
+            fIsPublicKey,
+            self.__get_key_cache_path()
+        )
+
         atAttr = None
-        strDecodedStdout = strStdout.decode()
-        if strDecodedStdout.find('modulus:') != -1:
-            # Looks like this is an RSA key.
-            iKeyTyp_1ECC_2RSA = 2
-
-            strMatchExponent = 'publicExponent:'
-            strMatchModulus = 'modulus:'
-            if fIsPublicKey is True:
-                strMatchExponent = 'Exponent:'
-                strMatchModulus = 'Modulus:'
-
-            # Extract the public exponent.
-            tReExp = re.compile(
-                r'^%s\s+(\d+)\s+\(0x([0-9a-fA-F]+)\)' % strMatchExponent,
-                re.MULTILINE
-            )
-            tMatch = tReExp.search(strDecodedStdout)
-            if tMatch is None:
-                raise Exception('Can not find public exponent!')
-            ulExp = int(tMatch.group(1))
-            ulExpHex = int(tMatch.group(2), 16)
-            if ulExp != ulExpHex:
-                raise Exception('Decimal version differs from hex version!')
+        if iKeyTyp_1ECC_2RSA == crypto_backend.KEY_TYPE_RSA:
+            # Get the public exponent.
+            ulExp = atNumbers['exp']
             if (ulExp < 0) or (ulExp > 0xffffff):
                 raise Exception('The exponent exceeds the allowed range of a '
                                 '24bit unsigned integer!')
@@ -887,17 +801,10 @@ class AppImage:
             strData.append(ulExp & 0xff)
             strData.append((ulExp >> 8) & 0xff)
             strData.append((ulExp >> 16) & 0xff)
-            # strData = (
-            #     chr(ulExp & 0xff) +
-            #     chr((ulExp >> 8) & 0xff) +
-            #     chr((ulExp >> 16) & 0xff)
-            # )
             aucExp = array.array('B', strData)
 
-            # Extract the modulus "N".
-            aucMod = self.__openssl_get_data_block(strDecodedStdout, strMatchModulus)
-            self.__openssl_cut_leading_zero(aucMod)
-            self.__openssl_convert_to_little_endian(aucMod)
+            # Get the modulus "N" in little endian.
+            aucMod = array.array('B', reversed(atNumbers['mod']))
 
             __atKnownRsaSizes = {
                 0: {'mod': 256, 'exp': 3, 'rsa': 2048},
@@ -940,56 +847,18 @@ class AppImage:
                 'exp': aucExp
             }
 
-        elif strStdout.find('priv:') != -1:
-            # Looks like this is an ECC key.
-            iKeyTyp_1ECC_2RSA = 1
-
-            aucPriv = self.__openssl_get_data_block(strStdout, 'priv:')
-            self.__openssl_cut_leading_zero(aucPriv)
-            self.__openssl_convert_to_little_endian(aucPriv)
-
-            aucPub = self.__openssl_get_data_block(strStdout, 'pub:')
-            self.__openssl_uncompress_field(aucPub)
-            aucPubX, aucPubY = self.__openssl_cut_in_half(aucPub)
-            self.__openssl_convert_to_little_endian(aucPubX)
-            self.__openssl_convert_to_little_endian(aucPubY)
-
-            aucPrime = self.__openssl_get_data_block(strStdout, 'Prime:')
-            self.__openssl_cut_leading_zero(aucPrime)
-            self.__openssl_convert_to_little_endian(aucPrime)
-
-            aucA = self.__openssl_get_data_block(strStdout, 'A:')
-            self.__openssl_cut_leading_zero(aucA)
-            self.__openssl_convert_to_little_endian(aucA)
-
-            aucB = self.__openssl_get_data_block(strStdout, 'B:')
-            self.__openssl_cut_leading_zero(aucB)
-            self.__openssl_convert_to_little_endian(aucB)
-
-            strData = self.__openssl_get_data_block(
-                strStdout,
-                'Generator (uncompressed):'
-            )
-            aucGen = array.array('B', strData)
-            self.__openssl_uncompress_field(aucGen)
-            aucGenX, aucGenY = self.__openssl_cut_in_half(aucGen)
-            self.__openssl_convert_to_little_endian(aucGenX)
-            self.__openssl_convert_to_little_endian(aucGenY)
-
-            aucOrder = self.__openssl_get_data_block(strStdout, 'Order:')
-            self.__openssl_cut_leading_zero(aucOrder)
-            self.__openssl_convert_to_little_endian(aucOrder)
-
-            # Extract the cofactor.
-            tReExp = re.compile(r'^Cofactor:\s+(\d+)\s+\(0x([0-9a-fA-F]+)\)',
-                                re.MULTILINE)
-            tMatch = tReExp.search(strStdout)
-            if tMatch is None:
-                raise Exception('Can not find cofactor!')
-            ulCofactor = int(tMatch.group(1))
-            ulCofactorHex = int(tMatch.group(2), 16)
-            if ulCofactor != ulCofactorHex:
-                raise Exception('Decimal version differs from hex version!')
+        elif iKeyTyp_1ECC_2RSA == crypto_backend.KEY_TYPE_ECC:
+            # Get all numbers in little endian.
+            aucPriv = array.array('B', reversed(atNumbers['d']))
+            aucPubX = array.array('B', reversed(atNumbers['Qx']))
+            aucPubY = array.array('B', reversed(atNumbers['Qy']))
+            aucPrime = array.array('B', reversed(atNumbers['p']))
+            aucA = array.array('B', reversed(atNumbers['a']))
+            aucB = array.array('B', reversed(atNumbers['b']))
+            aucGenX = array.array('B', reversed(atNumbers['Gx']))
+            aucGenY = array.array('B', reversed(atNumbers['Gy']))
+            aucOrder = array.array('B', reversed(atNumbers['n']))
+            ulCofactor = atNumbers['cof']
 
             __atKnownEccSizes = {
                 0: 32,
@@ -1180,7 +1049,7 @@ class AppImage:
         else:
             # Build a hash over the first part of the chunk.
             tHash = hashlib.sha384()
-            tHash.update(aulChunk.tostring())
+            tHash.update(aulChunk)
             strHash = tHash.digest()
             aulHash = array.array('I', strHash)
             aulChunk.extend(aulHash)
@@ -1188,57 +1057,33 @@ class AppImage:
         # Get the key in DER encoded format.
         strKeyDER = __atCert['Key']['der']
 
-        # Create a temporary file for the keypair.
-        iFile, strPathKeypair = tempfile.mkstemp(
-            suffix='der',
-            prefix='tmp_hboot_image',
-            dir=None,
-            text=False
-        )
-        os.close(iFile)
-
-        # Create a temporary file for the data to sign.
-        iFile, strPathSignatureInputData = tempfile.mkstemp(
-            suffix='bin',
-            prefix='tmp_hboot_image',
-            dir=None,
-            text=False
-        )
-        os.close(iFile)
-
-        # Write the DER key to the temporary file.
-        tFile = open(strPathKeypair, 'wb')
-        tFile.write(strKeyDER)
-        tFile.close()
-
-        tFile = open(strPathSignatureInputData, 'wb')
         if self.__signed_binding is False:
-            # Write the data from the fw to the file
-            # Write the data to sign to the temporary file.
+            # Sign the data from the fw.
             aulChunk0Data = self.__atDataBlocks[0]['data']
-            tFile.write(aulChunk0Data[0:112])
-            tFile.write(aulChunk0Data[128:])
+            astrSignatureInputData = [
+                aulChunk0Data[0:112].tostring(),
+                aulChunk0Data[128:].tostring()
+            ]
             sizDataBlocks = len(self.__atDataBlocks)
             for sizCnt in range(1, sizDataBlocks):
-                tFile.write(self.__atDataBlocks[sizCnt]['header'])
-                tFile.write(self.__atDataBlocks[sizCnt]['data'])
+                astrSignatureInputData.append(
+                    self.__atDataBlocks[sizCnt]['header'].tostring()
+                )
+                astrSignatureInputData.append(
+                    self.__atDataBlocks[sizCnt]['data'].tostring()
+                )
+            strSignatureInputData = b''.join(astrSignatureInputData)
         else:
-            # Write the data from the chunk to the file instead of the whole fw
-            tFile.write(aulChunk)
-        tFile.close()
+            # Sign the data from the chunk instead of the whole fw.
+            strSignatureInputData = aulChunk.tostring()
+
+        strSignature = self.__tCryptoBackend.sign(
+            strKeyDER,
+            strSignatureInputData
+        )
 
         if iKeyTyp_1ECC_2RSA == 1:
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            astrCmd.extend(self.__cfg_openssloptions)
-            astrCmd.append(strPathSignatureInputData)
-            strEccSignature = subprocess.check_output(astrCmd)
-            aucEccSignature = array.array('B', strEccSignature)
+            aucEccSignature = array.array('B', strSignature)
 
             # Parse the signature.
             aucSignature = self.__openssl_ecc_get_signature(
@@ -1247,29 +1092,10 @@ class AppImage:
             )
 
         elif iKeyTyp_1ECC_2RSA == 2:
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignatureMirror = subprocess.check_output(astrCmd)
-            aucSignature = array.array('B', strSignatureMirror)
+            aucSignature = array.array('B', strSignature)
             # Mirror the signature.
             aucSignature.reverse()
 
-        # Remove the temp files.
-        os.remove(strPathKeypair)
-        os.remove(strPathSignatureInputData)
-
         # Append the signature to the chunk.
         aulChunk.fromstring(aucSignature.tostring())
         # print("signature: %s " % aucSignature.tostring())
@@ -1448,9 +1274,14 @@ class AppImage:
         # Create a SHA384 hash over the cm4 vectors, the complete application
         # and all other blocks.
         # (i.e. everything except the first header).
+        # The slices are views on the image, not copies. Arrays have no
+        # memoryview on Python 2, so the image is sliced there.
+        tInputImage = aulInputImage
+        if sys.version_info.major > 2:
+            tInputImage = memoryview(aulInputImage)
         tHash = hashlib.sha384()
-        tHash.update(aulInputImage[0:112])
-        tHash.update(aulInputImage[128:])
+        tHash.update(tInputImage[0:112])
+        tHash.update(tInputImage[128:])
         for sizCnt in range(1, sizDataBlocks):
             tHash.update(self.__atDataBlocks[sizCnt]['header'])
             tHash.update(self.__atDataBlocks[sizCnt]['data'])
@@ -1892,7 +1723,9 @@ def print_args(args):
     print("")
 
 
-if __name__ == '__main__':
+def main(astrArgs=None):
+    # Run the APP compiler with the command line arguments astrArgs. The
+    # default is the command line of the process.
 
     executed_file = os.path.split(sys.argv[0])[-1]
     # todo fill this properly
@@ -2047,6 +1880,24 @@ Example for creating a nai and nae HBoot image
         # help='Add PATH to the list of include paths.'
         help=argparse.SUPPRESS
     )
+    tParser.add_argument(
+        '--elf-cache',
+        dest='strElfCachePath',
+        required=False,
+        default=None,
+        metavar='FILE',
+        # help='Keep the ELF analysis results in the database FILE.'
+        help=argparse.SUPPRESS
+    )
+    tParser.add_argument(
+        '--key-cache',
+        dest='strKeyCachePath',
+        required=False,
+        default=None,
+        metavar='FILE',
+        # help='Keep the analysed keys in the database FILE.'
+        help=argparse.SUPPRESS
+    )
     tParser.add_argument(
         '-k', '--keyrom',
         dest='strKeyRomPath',
@@ -2095,8 +1946,22 @@ Example for creating a nai and nae HBoot image
         # help='Set openssl randomization true or false.'
         help=argparse.SUPPRESS
     )
+    tParser.add_argument(
+        '--crypto-backend',
+        dest='strCryptoBackend',
+        required=False,
+        default='auto',
+        choices=['auto', 'openssl', 'cryptography'],
+        metavar='BACKEND',
+        # help='Use BACKEND for signatures. This is "auto", "openssl" or '
+        #      '"cryptography".'
+        help=argparse.SUPPRESS
+    )
 
-    tArgs = tParser.parse_args(args=['--help'] if len(sys.argv) < 2 else None)  # prints help if args are less than 2
+    if astrArgs is None:
+        tArgs = tParser.parse_args(args=['--help'] if len(sys.argv) < 2 else None)  # prints help if args are less than 2
+    else:
+        tArgs = tParser.parse_args(args=astrArgs)
     print("HBoot image compiler APP")
     print(__version__)
     print_args(tArgs)
@@ -2144,7 +2009,9 @@ Example for creating a nai and nae HBoot image
         'OBJCOPY': tArgs.strObjCopy,
         'OBJDUMP': tArgs.strObjDump,
         'READELF': tArgs.strReadElf,
-        'HBOOT_INCLUDE': tArgs.astrIncludePaths
+        'HBOOT_INCLUDE': tArgs.astrIncludePaths,
+        'ELF_CACHE': tArgs.strElfCachePath,
+        'KEY_CACHE': tArgs.strKeyCachePath
     }
 
     ulSDRamSplitOffset = int(tArgs.strSDRamSplitOffset, 0)
@@ -2160,7 +2027,8 @@ Example for creating a nai and nae HBoot image
         atKnownFiles,
         ulSDRamSplitOffset,
         tArgs.strOpensslExe,
-        tArgs.fOpensslRandOff
+        tArgs.fOpensslRandOff,
+        tArgs.strCryptoBackend
     )
     if tArgs.strKeyRomPath is not None:
         tAppImg.read_keyrom(tArgs.strKeyRomPath)
@@ -2204,3 +2072,13 @@ Example for creating a nai and nae HBoot image
         strInputFile,
         astrOutputFiles
     )
+
+    if tArgs.fVerbose is True:
+        print('ELF cache: %(hits)d hits, %(database_hits)d database hits, '
+              '%(misses)d misses' % elf_support.get_cache_statistics())
+        print('Key cache: %(hits)d hits, %(database_hits)d database hits, '
+              '%(misses)d misses' % crypto_backend.get_cache_statistics())
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,9 @@ from hbi_settings import *
 import sys
 
 from com.hboot_image  import HbootImage
+from com              import elf_support
+from com              import crypto_backend
+from com              import batch
 from nxt_version      import get_version_strings
 
 __version__, __revision__, version_clean = get_version_strings()
@@ -134,6 +137,59 @@ tParser.add_argument('-r', '--readelf',
                      metavar='FILE',
                      # help='Use FILE as the readelf tool.',
                      help=argparse.SUPPRESS)
+tParser.add_argument('--elf-cache',
+                     dest='strElfCachePath',
+                     required=False,
+                     default=None,
+                     metavar='FILE',
+                     # help='Keep the ELF analysis results in the database FILE.',
+                     help=argparse.SUPPRESS)
+tParser.add_argument('--key-cache',
+                     dest='strKeyCachePath',
+                     required=False,
+                     default=None,
+                     metavar='FILE',
+                     # help='Keep the analysed keys in the database FILE.',
+                     help=argparse.SUPPRESS)
+tParser.add_argument('--sniplib-cache',
+                     dest='strSnipLibCachePath',
+                     required=False,
+                     default=None,
+                     metavar='FILE',
+                     # help='Keep the index of the snippet libraries in the '
+                     #      'database FILE.',
+                     help=argparse.SUPPRESS)
+tParser.add_argument('--sniplib-exclude',
+                     dest='astrSnipLibExcludes',
+                     required=False,
+                     action='append',
+                     metavar='PATTERN',
+                     # help='Do not scan folders of the snippet libraries '
+                     #      'matching PATTERN. This replaces the default '
+                     #      'list of excluded folders.',
+                     help=argparse.SUPPRESS)
+tParser.add_argument('--chunk-cache',
+                     dest='strChunkCachePath',
+                     required=False,
+                     default=None,
+                     metavar='FILE',
+                     # help='Reuse unchanged chunks from the database FILE.',
+                     help=argparse.SUPPRESS)
+tParser.add_argument('--batch',
+                     dest='strBatchManifest',
+                     required=False,
+                     default=None,
+                     metavar='FILE',
+                     # help='Build all images listed in the manifest FILE.',
+                     help=argparse.SUPPRESS)
+tParser.add_argument('-j', '--jobs',
+                     dest='sizJobs',
+                     required=False,
+                     default=None,
+                     type=int,
+                     metavar='N',
+                     # help='Build up to N chunks in parallel.',
+                     help=argparse.SUPPRESS)
 tParser.add_argument('-k', '--keyrom',
                      dest='strKeyRomPath',
                      required=False,
@@ -208,6 +264,16 @@ tParser.add_argument('--openssl-rand-off',
                      # help='Set openssl randomization true or false.',
                      help=argparse.SUPPRESS
                      )
+tParser.add_argument('--crypto-backend',
+                     dest='strCryptoBackend',
+                     required=False,
+                     default='auto',
+                     choices=['auto', 'openssl', 'cryptography'],
+                     metavar='BACKEND',
+                     # help='Use BACKEND for signatures. This is "auto", '
+                     #      '"openssl" or "cryptography".',
+                     help=argparse.SUPPRESS
+                     )
 # tParser.add_argument('strInputFile',
 #                      metavar='FILE',
 #                      help='Read the HBoot definition from FILE.')
@@ -224,7 +290,7 @@ tParser.add_argument(
 )
 tParser.add_argument(
     'astrFiles',
-    nargs='+',
+    nargs='*',
     metavar='FILES',
     help="List of files. If argument '--template-layout' is not used the first file of the list will be used as input file"
 )
@@ -237,150 +303,195 @@ tParser.add_argument(
 )
 
 
-tArgs = tParser.parse_args(args=['--help'] if len(sys.argv) < 2 else None)
-print("HBoot image compiler COM")
-print(__version__)
-print_args(tArgs)
-
-# Set the default for the patch table here.
-atDefaultPatchTables = {
-    'NETX56': 'hboot_netx56_patch_table.xml',
-    'NETX90': 'hboot_netx90_patch_table.xml',
-    'NETX90B': 'hboot_netx90b_patch_table.xml',
-    'NETX90C': 'hboot_netx90b_patch_table.xml',  # c also uses patch table b
-    'NETX90D': 'hboot_netx90d_patch_table.xml',
-    'NETX90_MPW': 'hboot_netx90_mpw_patch_table.xml',
-    'NETX4000_RELAXED': 'hboot_netx4000_relaxed_patch_table.xml',
-    'NETX4000': 'hboot_netx4000_patch_table.xml',
-    'NETX4100': 'hboot_netx4000_patch_table.xml'
-}
-
-# change netx_type to internal namings
-if tArgs.strNetxType == 'netx90':  # netx90 is always mapped to newest netx90_revx
-    strNetxType = 'NETX90B'
-elif tArgs.strNetxType == 'netx90_rev0':
-    strNetxType = 'NETX90'
-elif tArgs.strNetxType == 'netx90_rev1':
-    strNetxType = 'NETX90B'  # NETX90C is included in this case (same functionality)
-elif tArgs.strNetxType == 'netx90_rev2':
-    strNetxType = 'NETX90D'
-elif tArgs.strNetxType == 'netx90_mpw':
-    strNetxType = 'NETX90_MPW'
-else:
-    strNetxType = tArgs.strNetxType
-
-
-if tArgs.strPatchTablePath is None:
-
-    path_patch_tables = os.path.join(hbi_sources, "patch_tables")
-
-    tArgs.strPatchTablePath = os.path.join(
-        path_patch_tables,
-        atDefaultPatchTables[strNetxType]
-    )
+def main(astrArgs=None):
+    # Run the COM compiler with the command line arguments astrArgs. The
+    # default is the command line of the process.
+    if astrArgs is None:
+        tArgs = tParser.parse_args(args=['--help'] if len(sys.argv) < 2 else None)
+    else:
+        tArgs = tParser.parse_args(args=astrArgs)
+
+    if tArgs.strBatchManifest is not None:
+        # Build all images from the manifest in this process.
+        if astrArgs is not None:
+            raise Exception('A batch manifest must not start another batch.')
+        # The APP compiler is only needed for batches.
+        from app import netx90_app_image
+        sizFailed = batch.run_batch(
+            tArgs.strBatchManifest,
+            dict({
+                'com': main,
+                'app': netx90_app_image.main
+            }),
+            tArgs.sizJobs
+        )
+        if sizFailed != 0:
+            return 1
+        return 0
+
+    if len(tArgs.astrFiles) == 0:
+        tParser.error('the following arguments are required: FILES')
+
+    print("HBoot image compiler COM")
+    print(__version__)
+    print_args(tArgs)
+
+    # Set the default for the patch table here.
+    atDefaultPatchTables = {
+        'NETX56': 'hboot_netx56_patch_table.xml',
+        'NETX90': 'hboot_netx90_patch_table.xml',
+        'NETX90B': 'hboot_netx90b_patch_table.xml',
+        'NETX90C': 'hboot_netx90b_patch_table.xml',  # c also uses patch table b
+        'NETX90D': 'hboot_netx90d_patch_table.xml',
+        'NETX90_MPW': 'hboot_netx90_mpw_patch_table.xml',
+        'NETX4000_RELAXED': 'hboot_netx4000_relaxed_patch_table.xml',
+        'NETX4000': 'hboot_netx4000_patch_table.xml',
+        'NETX4100': 'hboot_netx4000_patch_table.xml'
+    }
+
+    # change netx_type to internal namings
+    if tArgs.strNetxType == 'netx90':  # netx90 is always mapped to newest netx90_revx
+        strNetxType = 'NETX90B'
+    elif tArgs.strNetxType == 'netx90_rev0':
+        strNetxType = 'NETX90'
+    elif tArgs.strNetxType == 'netx90_rev1':
+        strNetxType = 'NETX90B'  # NETX90C is included in this case (same functionality)
+    elif tArgs.strNetxType == 'netx90_rev2':
+        strNetxType = 'NETX90D'
+    elif tArgs.strNetxType == 'netx90_mpw':
+        strNetxType = 'NETX90_MPW'
+    else:
+        strNetxType = tArgs.strNetxType
 
-# Parse all alias definitions.
-atKnownFiles = {}
-if tArgs.astrAliases is not None:
-    tPattern = re.compile('([a-zA-Z0-9_]+)=(.+)$')
-    for strAliasDefinition in tArgs.astrAliases:
-        tMatch = re.match(tPattern, strAliasDefinition)
-        if tMatch is None:
-            raise Exception(
-                'Invalid alias definition: "%s". '
-                'It must be "ALIAS=VALUE" instead.' % strAliasDefinition
-            )
-        strAlias = tMatch.group(1)
-        strFile = tMatch.group(2)
-        if strAlias in atKnownFiles:
-            raise Exception(
-                'Double defined alias "%s". The old value "%s" should be '
-                'overwritten with "%s".' % (
-                    strAlias,
-                    atKnownFiles[strAlias],
-                    strFile
+
+    if tArgs.strPatchTablePath is None:
+
+        path_patch_tables = os.path.join(hbi_sources, "patch_tables")
+
+        tArgs.strPatchTablePath = os.path.join(
+            path_patch_tables,
+            atDefaultPatchTables[strNetxType]
+        )
+
+    # Parse all alias definitions.
+    atKnownFiles = {}
+    if tArgs.astrAliases is not None:
+        tPattern = re.compile('([a-zA-Z0-9_]+)=(.+)$')
+        for strAliasDefinition in tArgs.astrAliases:
+            tMatch = re.match(tPattern, strAliasDefinition)
+            if tMatch is None:
+                raise Exception(
+                    'Invalid alias definition: "%s". '
+                    'It must be "ALIAS=VALUE" instead.' % strAliasDefinition
                 )
-            )
-        atKnownFiles[strAlias] = strFile
-
-# Parse all defines.
-atDefinitions = {}
-if tArgs.astrDefines is not None:
-    tPattern = re.compile('([a-zA-Z0-9_]+)=(.+)$')
-    for strDefine in tArgs.astrDefines:
-        tMatch = re.match(tPattern, strDefine)
-        if tMatch is None:
-            raise Exception('Invalid define: "%s". '
-                            'It must be "NAME=VALUE" instead.' % strDefine)
-        strName = tMatch.group(1)
-        strValue = tMatch.group(2)
-        if strName in atDefinitions:
-            raise Exception(
-                'Double defined name "%s". '
-                'The old value "%s" should be overwritten with "%s".' % (
-                    strName,
-                    atKnownFiles[strName],
-                    strValue
+            strAlias = tMatch.group(1)
+            strFile = tMatch.group(2)
+            if strAlias in atKnownFiles:
+                raise Exception(
+                    'Double defined alias "%s". The old value "%s" should be '
+                    'overwritten with "%s".' % (
+                        strAlias,
+                        atKnownFiles[strAlias],
+                        strFile
+                    )
+                )
+            atKnownFiles[strAlias] = strFile
+
+    # Parse all defines.
+    atDefinitions = {}
+    if tArgs.astrDefines is not None:
+        tPattern = re.compile('([a-zA-Z0-9_]+)=(.+)$')
+        for strDefine in tArgs.astrDefines:
+            tMatch = re.match(tPattern, strDefine)
+            if tMatch is None:
+                raise Exception('Invalid define: "%s". '
+                                'It must be "NAME=VALUE" instead.' % strDefine)
+            strName = tMatch.group(1)
+            strValue = tMatch.group(2)
+            if strName in atDefinitions:
+                raise Exception(
+                    'Double defined name "%s". '
+                    'The old value "%s" should be overwritten with "%s".' % (
+                        strName,
+                        atKnownFiles[strName],
+                        strValue
+                    )
                 )
+            atDefinitions[strName] = strValue
+
+    # Set an empty list of include paths if nothing was specified.
+    if tArgs.astrIncludePaths is None:
+        tArgs.astrIncludePaths = []
+
+    # Set an empty list of sniplib paths if nothing was specified.
+    if tArgs.astrSnipLib is None:
+        tArgs.astrSnipLib = []
+
+    tEnv = {'OBJCOPY': tArgs.strObjCopy,
+            'OBJDUMP': tArgs.strObjDump,
+            'READELF': tArgs.strReadElf,
+            'HBOOT_INCLUDE': tArgs.astrIncludePaths,
+            'ELF_CACHE': tArgs.strElfCachePath,
+            'KEY_CACHE': tArgs.strKeyCachePath,
+            'CHUNK_CACHE': tArgs.strChunkCachePath}
+
+    tCompiler = HbootImage(
+        tEnv,
+        strNetxType,
+        defines=atDefinitions,
+        includes=tArgs.astrIncludePaths,
+        known_files=atKnownFiles,
+        patch_definition=tArgs.strPatchTablePath,
+        verbose=tArgs.fVerbose,
+        sniplibs=tArgs.astrSnipLib,
+        sniplib_cache=tArgs.strSnipLibCachePath,
+        sniplib_excludes=tArgs.astrSnipLibExcludes,
+        keyrom=tArgs.strKeyRomPath,
+        openssloptions=tArgs.astrOpensslOptions,
+        opensslexe=tArgs.strOpensslExe,
+        opensslrandoff=tArgs.fOpensslRandOff,
+        crypto_backend=tArgs.strCryptoBackend,
+        jobs=tArgs.sizJobs
+    )
+
+    astrOutputFiles = None
+    strInputFile = None
+    if getattr(tArgs, 'strHbootImageLayout') is not None:
+        # use one of the template files
+        strHbootImageLayout = getattr(tArgs, 'strHbootImageLayout')
+        strInputFile = os.path.join(hbi_sources, 'templates', 'com',  'top_hboot_image_%s.xml' % strHbootImageLayout.lower())
+        if not os.path.exists(strInputFile):
+            raise FileNotFoundError("could not find template '%s'" % strInputFile)
+        # all the files are output files
+        if len(tArgs.astrFiles) in [1]:
+            astrOutputFiles = tArgs.astrFiles[0]
+        else:
+            raise argparse.ArgumentError(
+                "Too few/many files were passed for this mode. (should be 1 but is %s)" % len(tArgs.astrFiles)
             )
-        atDefinitions[strName] = strValue
-
-# Set an empty list of include paths if nothing was specified.
-if tArgs.astrIncludePaths is None:
-    tArgs.astrIncludePaths = []
-
-# Set an empty list of sniplib paths if nothing was specified.
-if tArgs.astrSnipLib is None:
-    tArgs.astrSnipLib = []
-
-tEnv = {'OBJCOPY': tArgs.strObjCopy,
-        'OBJDUMP': tArgs.strObjDump,
-        'READELF': tArgs.strReadElf,
-        'HBOOT_INCLUDE': tArgs.astrIncludePaths}
-
-tCompiler = HbootImage(
-    tEnv,
-    strNetxType,
-    defines=atDefinitions,
-    includes=tArgs.astrIncludePaths,
-    known_files=atKnownFiles,
-    patch_definition=tArgs.strPatchTablePath,
-    verbose=tArgs.fVerbose,
-    sniplibs=tArgs.astrSnipLib,
-    keyrom=tArgs.strKeyRomPath,
-    openssloptions=tArgs.astrOpensslOptions,
-    opensslexe=tArgs.strOpensslExe,
-    opensslrandoff=tArgs.fOpensslRandOff
-)
 
-astrOutputFiles = None
-strInputFile = None
-if getattr(tArgs, 'strHbootImageLayout') is not None:
-    # use one of the template files
-    strHbootImageLayout = getattr(tArgs, 'strHbootImageLayout')
-    strInputFile = os.path.join(hbi_sources, 'templates', 'com',  'top_hboot_image_%s.xml' % strHbootImageLayout.lower())
-    if not os.path.exists(strInputFile):
-        raise FileNotFoundError("could not find template '%s'" % strInputFile)
-    # all the files are output files
-    if len(tArgs.astrFiles) in [1]:
-        astrOutputFiles = tArgs.astrFiles[0]
     else:
-        raise argparse.ArgumentError(
-            "Too few/many files were passed for this mode. (should be 1 but is %s)" % len(tArgs.astrFiles)
-        )
+        print("Info: you are using an advanced mode. Consider using the parameter '--template-layout'.")
+        strHbootImageLayout = getattr(tArgs, 'strHbootImageLayout')
+        strInputFile = tArgs.astrFiles[0]
+        if not (strInputFile.endswith(".xml") or strInputFile.endswith(".XML")):
+            raise argparse.ArgumentError("For the advanced mode the first parameter must be a HBoot image XMl file.")
+        if len(tArgs.astrFiles) in [2]:
+            astrOutputFiles = tArgs.astrFiles[1]
+        else:
+            raise argparse.ArgumentError(
+                "Too few/many files were passed for this mode. (should be 2 but is %s)" % len(tArgs.astrFiles)
+            )
+
+    tCompiler.parse_image(strInputFile)
+    tCompiler.write(astrOutputFiles, strFileToAppend=tArgs.strFileToAppend)
+
+    if tArgs.fVerbose is True:
+        print('ELF cache: %(hits)d hits, %(database_hits)d database hits, '
+              '%(misses)d misses' % elf_support.get_cache_statistics())
+        print('Key cache: %(hits)d hits, %(database_hits)d database hits, '
+              '%(misses)d misses' % crypto_backend.get_cache_statistics())
 
-else:
-    print("Info: you are using an advanced mode. Consider using the parameter '--template-layout'.")
-    strHbootImageLayout = getattr(tArgs, 'strHbootImageLayout')
-    strInputFile = tArgs.astrFiles[0]
-    if not (strInputFile.endswith(".xml") or strInputFile.endswith(".XML")):
-        raise argparse.ArgumentError("For the advanced mode the first parameter must be a HBoot image XMl file.")
-    if len(tArgs.astrFiles) in [2]:
-        astrOutputFiles = tArgs.astrFiles[1]
-    else:
-        raise argparse.ArgumentError(
-            "Too few/many files were passed for this mode. (should be 2 but is %s)" % len(tArgs.astrFiles)
-        )
 
-tCompiler.parse_image(strInputFile)
-tCompiler.write(astrOutputFiles, strFileToAppend=tArgs.strFileToAppend)
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import json
+import threading
+import time
+import traceback
+
+# The thread pool is not available on Python 2 without the "futures"
+# backport. Build all images one after the other in this case.
+try:
+    import concurrent.futures
+    fHaveConcurrentFutures = True
+except ImportError:
+    fHaveConcurrentFutures = False
+
+
+# A batch manifest is a JSON file with a list of images:
+#
+#   {
+#     "images": [
+#       {
+#         "name": "hwc",
+#         "compiler": "com",
+#         "args": ["-t", "hwc", "-nt", "netx90", "-A", "hw_config=hw.xml",
+#                  "hwc.hwc"]
+#       },
+#       {
+#         "name": "app",
+#         "compiler": "app",
+#         "args": ["-t", "nai", "-A", "tElf=app.elf", "-nt", "netx90",
+#                  "app.nai"]
+#       }
+#     ]
+#   }
+#
+# The "args" are the command line arguments of the COM or APP compiler.
+# Relative paths are relative to the current working directory. The "name"
+# is optional and only used for the report.
+
+__tPrintLock = threading.Lock()
+
+
+def __read_manifest(strManifestPath, atCompilers):
+    tFile = open(strManifestPath, 'rt')
+    tManifest = json.load(tFile)
+    tFile.close()
+
+    if isinstance(tManifest, dict) is not True or 'images' not in tManifest:
+        raise Exception('The batch manifest "%s" has no "images" list.' %
+                        strManifestPath)
+
+    atImages = []
+    for uiIndex, tImage in enumerate(tManifest['images']):
+        strCompiler = tImage.get('compiler', 'com')
+        if strCompiler not in atCompilers:
+            raise Exception(
+                'Image %d in the batch manifest has an unknown compiler "%s". '
+                'Known compilers are: %s' % (
+                    uiIndex,
+                    strCompiler,
+                    ', '.join(sorted(atCompilers.keys()))
+                )
+            )
+        astrArgs = tImage.get('args')
+        if(
+            (isinstance(astrArgs, list) is not True) or
+            (len(astrArgs) == 0)
+        ):
+            raise Exception('Image %d in the batch manifest has no "args".' %
+                            uiIndex)
+        atImages.append(dict({
+            'name': str(tImage.get('name', 'image %d' % uiIndex)),
+            'compiler': strCompiler,
+            'args': [str(strArg) for strArg in astrArgs]
+        }))
+
+    return atImages
+
+
+def __build_image(tImage, pfnMain):
+    tStartTime = time.time()
+    fOk = True
+    try:
+        pfnMain(tImage['args'])
+    except SystemExit as tExit:
+        # The argument parser exits on errors.
+        fOk = tExit.code in (None, 0)
+    except Exception:
+        fOk = False
+        with __tPrintLock:
+            print('[Batch] Failed to build "%s":' % tImage['name'])
+            traceback.print_exc()
+    return fOk, time.time() - tStartTime
+
+
+def run_batch(strManifestPath, atCompilers, sizJobs=None):
+    """ Build all images from a batch manifest in this process.
+
+    atCompilers maps the compiler names of the manifest to the "main"
+    functions of the compilers. The images are built by a pool of sizJobs
+    threads. All images share the ELF and key caches, so every ELF file
+    and key is analysed only once, and the signatures of different images
+    are created at the same time. Without concurrent.futures or with
+    sizJobs set to 1 the images are built one after the other.
+
+    Return the number of images which failed.
+    """
+    atImages = __read_manifest(strManifestPath, atCompilers)
+
+    tStartTime = time.time()
+    atResults = []
+    if (fHaveConcurrentFutures is not True) or (sizJobs == 1):
+        for tImage in atImages:
+            fOk, tDuration = __build_image(
+                tImage,
+                atCompilers[tImage['compiler']]
+            )
+            atResults.append((tImage, fOk, tDuration))
+    else:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=sizJobs
+        ) as tPool:
+            atFutures = []
+            for tImage in atImages:
+                atFutures.append(tPool.submit(
+                    __build_image,
+                    tImage,
+                    atCompilers[tImage['compiler']]
+                ))
+            for tImage, tFuture in zip(atImages, atFutures):
+                fOk, tDuration = tFuture.result()
+                atResults.append((tImage, fOk, tDuration))
+    tDuration = time.time() - tStartTime
+
+    # Print the timing of all images.
+    sizFailed = 0
+    sizNameColumn = max([len(tImage['name']) for tImage in atImages] + [5])
+    print('[Batch] %-*s  %-8s  %s' % (sizNameColumn, 'Image', 'Compiler',
+                                      'Time'))
+    for tImage, fOk, tImageDuration in atResults:
+        strResult = ''
+        if fOk is not True:
+            strResult = '  FAILED'
+            sizFailed += 1
+        print('[Batch] %-*s  %-8s  %8.3fs%s' % (
+            sizNameColumn,
+            tImage['name'],
+            tImage['compiler'],
+            tImageDuration,
+            strResult
+        ))
+    print('[Batch] %d images, %d failed, %.3fs in total' % (
+        len(atImages),
+        sizFailed,
+        tDuration
+    ))
+
+    return sizFailed
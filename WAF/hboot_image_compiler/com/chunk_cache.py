@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import atexit
+import collections
+import marshal
+import sqlite3
+import sys
+import threading
+import zlib
+
+
+class ChunkCache:
+    # The maximum number of chunks kept in memory.
+    __sizMaxEntries = None
+
+    # The maximum number of chunks kept in the database.
+    __sizMaxDatabaseEntries = None
+
+    # The in-memory chunks in LRU order. The most recently used entry is at
+    # the end.
+    __atEntries = None
+
+    # The filename of the database.
+    __strDatabasePath = None
+
+    # The database connection.
+    __tDb = None
+
+    # The chunks are stored with marshal. Its data types differ between
+    # Python 2 and 3, so each major version has its own table.
+    __strTable = 'chunk_cache_py%d' % sys.version_info.major
+
+    # The keys of all database entries which were used since the last
+    # write. Their "last_used" time is updated in one transaction.
+    __atUsedKeys = None
+
+    __tLock = None
+
+    __ulHits = None
+    __ulDatabaseHits = None
+    __ulMisses = None
+
+    def __init__(self, sizMaxEntries=256, sizMaxDatabaseEntries=4096):
+        self.__sizMaxEntries = sizMaxEntries
+        self.__sizMaxDatabaseEntries = sizMaxDatabaseEntries
+        self.__atEntries = collections.OrderedDict()
+        self.__strDatabasePath = None
+        self.__tDb = None
+        self.__atUsedKeys = set()
+        self.__tLock = threading.RLock()
+        self.__ulHits = 0
+        self.__ulDatabaseHits = 0
+        self.__ulMisses = 0
+
+        # Write the pending "last_used" times when the process ends.
+        atexit.register(self.flush)
+
+    def set_database(self, strDatabasePath):
+        # Keep the chunks on disk. Only this makes the cache useful for
+        # incremental builds.
+        with self.__tLock:
+            if strDatabasePath == self.__strDatabasePath:
+                return
+            if self.__tDb is not None:
+                self.flush()
+                self.__tDb.close()
+                self.__tDb = None
+            self.__strDatabasePath = strDatabasePath
+            if strDatabasePath is not None:
+                tDb = sqlite3.connect(strDatabasePath, check_same_thread=False)
+                tDb.execute(
+                    'CREATE TABLE IF NOT EXISTS %s ('
+                    'key TEXT NOT NULL PRIMARY KEY, '
+                    'value BLOB NOT NULL, '
+                    'last_used INTEGER NOT NULL)' % self.__strTable
+                )
+                tDb.commit()
+                self.__tDb = tDb
+
+    def get(self, strKey):
+        """ Return the chunk stored under strKey or None. """
+        with self.__tLock:
+            if strKey in self.__atEntries:
+                self.__touch(strKey)
+                self.__ulHits += 1
+                return self.__atEntries[strKey]
+
+            tValue = None
+            if self.__tDb is not None:
+                tCursor = self.__tDb.execute(
+                    'SELECT value FROM %s WHERE key=?' % self.__strTable,
+                    (strKey, )
+                )
+                atRow = tCursor.fetchone()
+                if atRow is not None:
+                    tValue = marshal.loads(zlib.decompress(atRow[0]))
+                    # A hit only reads the database. The new "last_used"
+                    # time is written later together with all other hits.
+                    self.__atUsedKeys.add(strKey)
+
+            if tValue is None:
+                self.__ulMisses += 1
+            else:
+                self.__ulDatabaseHits += 1
+                self.__remember(strKey, tValue)
+
+            return tValue
+
+    def __touch(self, strKey):
+        # Move the entry to the end of the LRU order. Python 2 has no
+        # "move_to_end", so the entry is inserted again.
+        self.__atEntries[strKey] = self.__atEntries.pop(strKey)
+
+    def __remember(self, strKey, tValue):
+        self.__atEntries.pop(strKey, None)
+        self.__atEntries[strKey] = tValue
+        while len(self.__atEntries) > self.__sizMaxEntries:
+            self.__atEntries.popitem(last=False)
+
+    def set(self, strKey, tValue):
+        """ Store the chunk tValue under strKey. """
+        with self.__tLock:
+            self.__remember(strKey, tValue)
+            if self.__tDb is not None:
+                self.__tDb.execute(
+                    'INSERT OR REPLACE INTO %s '
+                    '(key, value, last_used) '
+                    'VALUES (?, ?, strftime(\'%%s\',\'now\'))' %
+                    self.__strTable,
+                    (
+                        strKey,
+                        sqlite3.Binary(
+                            zlib.compress(marshal.dumps(tValue, 2))
+                        )
+                    )
+                )
+                # Remove the least recently used entries. The pending hits
+                # must be written first, or they would look unused.
+                self.__db_update_last_used()
+                self.__tDb.execute(
+                    'DELETE FROM %s WHERE rowid IN ('
+                    'SELECT rowid FROM %s ORDER BY last_used DESC '
+                    'LIMIT -1 OFFSET ?)' % (self.__strTable, self.__strTable),
+                    (self.__sizMaxDatabaseEntries, )
+                )
+                self.__tDb.commit()
+
+    def __db_update_last_used(self):
+        if len(self.__atUsedKeys) != 0:
+            self.__tDb.executemany(
+                'UPDATE %s SET last_used=strftime(\'%%s\',\'now\') '
+                'WHERE key=?' % self.__strTable,
+                [(strKey, ) for strKey in self.__atUsedKeys]
+            )
+            self.__atUsedKeys.clear()
+
+    def flush(self):
+        """ Write the "last_used" times of all database hits. """
+        with self.__tLock:
+            if self.__tDb is not None and len(self.__atUsedKeys) != 0:
+                self.__db_update_last_used()
+                self.__tDb.commit()
+
+    def get_statistics(self):
+        with self.__tLock:
+            return dict({
+                'hits': self.__ulHits,
+                'database_hits': self.__ulDatabaseHits,
+                'misses': self.__ulMisses,
+                'entries': len(self.__atEntries)
+            })
+
+    def clear(self):
+        with self.__tLock:
+            self.__atEntries.clear()
@@ -0,0 +1,673 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import binascii
+import os
+import platform
+import re
+import subprocess
+import tempfile
+
+from . import key_cache
+
+# The "cryptography" package is optional. Without it only the OpenSSL
+# command line tool can be used.
+try:
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    fHaveCryptography = True
+except ImportError:
+    fHaveCryptography = False
+
+
+# The key types. They match the "iKeyTyp_1ECC_2RSA" values of the image
+# compilers.
+KEY_TYPE_ECC = 1
+KEY_TYPE_RSA = 2
+
+# The domain parameters of the supported ECC curves. The "cryptography"
+# package only provides the name of a curve.
+s_atEccCurves = {
+    'brainpoolP256r1': {
+        'p': int(
+            'a9fb57dba1eea9bc3e660a909d838d726e3bf623d5262028'
+            '2013481d1f6e5377', 16
+        ),
+        'a': int(
+            '7d5a0975fc2c3057eef67530417affe7fb8055c126dc5c6c'
+            'e94a4b44f330b5d9', 16
+        ),
+        'b': int(
+            '26dc5c6ce94a4b44f330b5d9bbd77cbf958416295cf7e1ce'
+            '6bccdc18ff8c07b6', 16
+        ),
+        'Gx': int(
+            '8bd2aeb9cb7e57cb2c4b482ffc81b7afb9de27e1e3bd23c2'
+            '3a4453bd9ace3262', 16
+        ),
+        'Gy': int(
+            '547ef835c3dac4fd97f8461a14611dc9c27745132ded8e54'
+            '5c1d54c72f046997', 16
+        ),
+        'n': int(
+            'a9fb57dba1eea9bc3e660a909d838d718c397aa3b561a6f7'
+            '901e0e82974856a7', 16
+        ),
+        'cof': 1
+    },
+    'brainpoolP384r1': {
+        'p': int(
+            '8cb91e82a3386d280f5d6f7e50e641df152f7109ed5456b4'
+            '12b1da197fb71123acd3a729901d1a71874700133107ec53', 16
+        ),
+        'a': int(
+            '7bc382c63d8c150c3c72080ace05afa0c2bea28e4fb22787'
+            '139165efba91f90f8aa5814a503ad4eb04a8c7dd22ce2826', 16
+        ),
+        'b': int(
+            '04a8c7dd22ce28268b39b55416f0447c2fb77de107dcd2a6'
+            '2e880ea53eeb62d57cb4390295dbc9943ab78696fa504c11', 16
+        ),
+        'Gx': int(
+            '1d1c64f068cf45ffa2a63a81b7c13f6b8847a3e77ef14fe3'
+            'db7fcafe0cbd10e8e826e03436d646aaef87b2e247d4af1e', 16
+        ),
+        'Gy': int(
+            '8abe1d7520f9c2a45cb1eb8e95cfd55262b70b29feec5864'
+            'e19c054ff99129280e4646217791811142820341263c5315', 16
+        ),
+        'n': int(
+            '8cb91e82a3386d280f5d6f7e50e641df152f7109ed5456b3'
+            '1f166e6cac0425a7cf3ab6af6b7fc3103b883202e9046565', 16
+        ),
+        'cof': 1
+    },
+    'brainpoolP512r1': {
+        'p': int(
+            'aadd9db8dbe9c48b3fd4e6ae33c9fc07cb308db3b3c9d20e'
+            'd6639cca703308717d4d9b009bc66842aecda12ae6a380e6'
+            '2881ff2f2d82c68528aa6056583a48f3', 16
+        ),
+        'a': int(
+            '7830a3318b603b89e2327145ac234cc594cbdd8d3df91610'
+            'a83441caea9863bc2ded5d5aa8253aa10a2ef1c98b9ac8b5'
+            '7f1117a72bf2c7b9e7c1ac4d77fc94ca', 16
+        ),
+        'b': int(
+            '3df91610a83441caea9863bc2ded5d5aa8253aa10a2ef1c9'
+            '8b9ac8b57f1117a72bf2c7b9e7c1ac4d77fc94cadc083e67'
+            '984050b75ebae5dd2809bd638016f723', 16
+        ),
+        'Gx': int(
+            '81aee4bdd82ed9645a21322e9c4c6a9385ed9f70b5d916c1'
+            'b43b62eef4d0098eff3b1f78e2d0d48d50d1687b93b97d5f'
+            '7c6d5047406a5e688b352209bcb9f822', 16
+        ),
+        'Gy': int(
+            '7dde385d566332ecc0eabfa9cf7822fdf209f70024a57b1a'
+            'a000c55b881f8111b2dcde494a5f485e5bca4bd88a2763ae'
+            'd1ca2b2fa8f0540678cd1e0f3ad80892', 16
+        ),
+        'n': int(
+            'aadd9db8dbe9c48b3fd4e6ae33c9fc07cb308db3b3c9d20e'
+            'd6639cca70330870553e5c414ca92619418661197fac1047'
+            '1db1d381085ddaddb58796829ca90069', 16
+        ),
+        'cof': 1
+    },
+    'secp256r1': {
+        'p': int(
+            'ffffffff00000001000000000000000000000000ffffffff'
+            'ffffffffffffffff', 16
+        ),
+        'a': int(
+            'ffffffff00000001000000000000000000000000ffffffff'
+            'fffffffffffffffc', 16
+        ),
+        'b': int(
+            '5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f6'
+            '3bce3c3e27d2604b', 16
+        ),
+        'Gx': int(
+            '6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0'
+            'f4a13945d898c296', 16
+        ),
+        'Gy': int(
+            '4fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ece'
+            'cbb6406837bf51f5', 16
+        ),
+        'n': int(
+            'ffffffff00000000ffffffffffffffffbce6faada7179e84'
+            'f3b9cac2fc632551', 16
+        ),
+        'cof': 1
+    },
+    'secp384r1': {
+        'p': int(
+            'ffffffffffffffffffffffffffffffffffffffffffffffff'
+            'fffffffffffffffeffffffff0000000000000000ffffffff', 16
+        ),
+        'a': int(
+            'ffffffffffffffffffffffffffffffffffffffffffffffff'
+            'fffffffffffffffeffffffff0000000000000000fffffffc', 16
+        ),
+        'b': int(
+            'b3312fa7e23ee7e4988e056be3f82d19181d9c6efe814112'
+            '0314088f5013875ac656398d8a2ed19d2a85c8edd3ec2aef', 16
+        ),
+        'Gx': int(
+            'aa87ca22be8b05378eb1c71ef320ad746e1d3b628ba79b98'
+            '59f741e082542a385502f25dbf55296c3a545e3872760ab7', 16
+        ),
+        'Gy': int(
+            '3617de4a96262c6f5d9e98bf9292dc29f8f41dbd289a147c'
+            'e9da3113b5f0b8c00a60b1ce1d7e819d7a431d7c90ea0e5f', 16
+        ),
+        'n': int(
+            'ffffffffffffffffffffffffffffffffffffffffffffffff'
+            'c7634d81f4372ddf581a0db248b0a77aecec196accc52973', 16
+        ),
+        'cof': 1
+    },
+}
+
+
+class CryptoBackendError(Exception):
+    pass
+
+
+class CryptoBackendOpenssl:
+    """ Sign and analyse keys with the OpenSSL command line tool.
+
+    The OpenSSL output is returned unchanged. RSA signatures are big endian
+    and ECC signatures are DER encoded.
+    """
+    # The path to the OpenSSL executable.
+    __strOpenssl = None
+
+    # Additional options for all "dgst" calls.
+    __astrOptions = None
+
+    # Use PKCS#1 v1.5 instead of PSS for RSA signatures.
+    __fRandOff = None
+
+    def __init__(self, strOpenssl='openssl', astrOptions=None,
+                 fRandOff=False):
+        self.__strOpenssl = strOpenssl
+        self.__astrOptions = astrOptions
+        self.__fRandOff = fRandOff
+
+    def get_name(self):
+        return 'openssl'
+
+    def sign(self, strKeyDER, strData):
+        iKeyType = get_key_type(strKeyDER)
+
+        # Create a temporary file for the keypair.
+        iFile, strPathKeypair = tempfile.mkstemp(
+            suffix='der',
+            prefix='tmp_hboot_image',
+            dir=None,
+            text=False
+        )
+        os.close(iFile)
+
+        # Create a temporary file for the data to sign.
+        iFile, strPathSignatureInputData = tempfile.mkstemp(
+            suffix='bin',
+            prefix='tmp_hboot_image',
+            dir=None,
+            text=False
+        )
+        os.close(iFile)
+
+        try:
+            # Write the DER key to the temporary file.
+            tFile = open(strPathKeypair, 'wb')
+            tFile.write(strKeyDER)
+            tFile.close()
+
+            # Write the data to sign to the temporary file.
+            tFile = open(strPathSignatureInputData, 'wb')
+            tFile.write(strData)
+            tFile.close()
+
+            astrCmd = [
+                self.__strOpenssl,
+                'dgst',
+                '-sign', strPathKeypair,
+                '-keyform', 'DER',
+                '-sha384'
+            ]
+            if self.__astrOptions:
+                astrCmd.extend(self.__astrOptions)
+            if (iKeyType == KEY_TYPE_RSA) and (not self.__fRandOff):
+                astrCmd.extend([
+                    '-sigopt', 'rsa_padding_mode:pss',
+                    '-sigopt', 'rsa_pss_saltlen:-1'])
+            astrCmd.append(strPathSignatureInputData)
+            strSignature = subprocess.check_output(astrCmd)
+
+        finally:
+            # Remove the temp files.
+            os.remove(strPathKeypair)
+            os.remove(strPathSignatureInputData)
+
+        return strSignature
+
+    def __get_data_block(self, strStdout, strID):
+        # Get a data block from the OpenSSL output.
+        aucData = bytearray()
+        tReData = re.compile('^[0-9a-fA-F]{2}(:[0-9a-fA-F]{2})*:?')
+        iState = 0
+        for strLine in iter(strStdout.splitlines()):
+            strLine = strLine.strip()
+            if iState == 0:
+                if strLine == strID:
+                    iState = 1
+            elif iState == 1:
+                tMatch = tReData.search(strLine)
+                if tMatch is None:
+                    break
+                else:
+                    for strDataHex in strLine.split(':'):
+                        strDataHexStrip = strDataHex.strip()
+                        if len(strDataHexStrip) != 0:
+                            aucData.extend(
+                                binascii.unhexlify(strDataHexStrip)
+                            )
+
+        return aucData
+
+    def __cut_leading_zero(self, aucData):
+        # Does the number start with "00" and is the third digit >= 8?
+        if aucData[0] == 0x00 and aucData[1] >= 0x80:
+            # Remove the leading "00".
+            aucData.pop(0)
+
+    def __uncompress_field(self, aucData):
+        # The data must not be compressed.
+        if aucData[0] != 0x04:
+            raise CryptoBackendError('The data is compressed. '
+                                     'This is not supported yet.')
+        # Cut off the first byte and split the point in X and Y.
+        sizDataHalf = (len(aucData) - 1) // 2
+        return aucData[1:1 + sizDataHalf], aucData[1 + sizDataHalf:]
+
+    def __get_decimal_and_hex(self, strStdout, strID):
+        tReExp = re.compile(
+            r'^%s\s+(\d+)\s+\(0x([0-9a-fA-F]+)\)' % strID,
+            re.MULTILINE
+        )
+        tMatch = tReExp.search(strStdout)
+        if tMatch is None:
+            raise CryptoBackendError('Can not find "%s"!' % strID)
+        ulValue = int(tMatch.group(1))
+        ulValueHex = int(tMatch.group(2), 16)
+        if ulValue != ulValueHex:
+            raise CryptoBackendError(
+                'Decimal version differs from hex version!'
+            )
+        return ulValue
+
+    def get_key_numbers(self, strKeyDER, fIsPublicKey):
+        # Extract all information from the key.
+        if len(strKeyDER) > 1000:
+            astrCmd = [
+                self.__strOpenssl,
+                'pkey',
+                '-inform',
+                'DER',
+                '-text',
+                '-noout'
+            ]
+        else:
+            astrCmd = [
+                self.__strOpenssl,
+                'ec',
+                '-inform',
+                'DER',
+                '-text',
+                '-noout',
+                '-param_enc', 'explicit',
+                '-no_public'
+            ]
+        if fIsPublicKey is True:
+            astrCmd.append('-pubin')
+        if platform.system() == 'Windows':
+            tProcess = subprocess.Popen(
+                astrCmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                shell=True
+            )
+        else:
+            tProcess = subprocess.Popen(
+                astrCmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE
+            )
+        (strStdout, strStdErr) = tProcess.communicate(strKeyDER)
+        if tProcess.returncode != 0:
+            raise CryptoBackendError('OpenSSL failed with return code %d.' %
+                                     tProcess.returncode)
+        strStdout = strStdout.decode()
+
+        # Try to guess if this is an RSA or ECC key.
+        # The text dump of an RSA key has " modulus:", while an ECC key has
+        # "priv:".
+        strMatchExponent = 'publicExponent:'
+        strMatchModulus = 'modulus:'
+        if fIsPublicKey is True:
+            strMatchExponent = 'Exponent:'
+            strMatchModulus = 'Modulus:'
+        if strStdout.find(strMatchModulus) != -1:
+            iKeyType = KEY_TYPE_RSA
+
+            aucMod = self.__get_data_block(strStdout, strMatchModulus)
+            self.__cut_leading_zero(aucMod)
+
+            atNumbers = {
+                'mod': aucMod,
+                'exp': self.__get_decimal_and_hex(strStdout, strMatchExponent)
+            }
+
+        elif strStdout.find('priv:') != -1:
+            iKeyType = KEY_TYPE_ECC
+
+            atNumbers = {}
+            for strName, strID in [
+                ('d', 'priv:'),
+                ('p', 'Prime:'),
+                ('a', 'A:'),
+                ('b', 'B:'),
+                ('n', 'Order:')
+            ]:
+                aucData = self.__get_data_block(strStdout, strID)
+                self.__cut_leading_zero(aucData)
+                atNumbers[strName] = aucData
+
+            atNumbers['Qx'], atNumbers['Qy'] = self.__uncompress_field(
+                self.__get_data_block(strStdout, 'pub:')
+            )
+            atNumbers['Gx'], atNumbers['Gy'] = self.__uncompress_field(
+                self.__get_data_block(strStdout, 'Generator (uncompressed):')
+            )
+            atNumbers['cof'] = self.__get_decimal_and_hex(
+                strStdout,
+                'Cofactor:'
+            )
+
+        else:
+            raise CryptoBackendError('Unknown key format.')
+
+        return iKeyType, atNumbers
+
+
+class CryptoBackendCryptography:
+    """ Sign and analyse keys in-process with the "cryptography" package.
+
+    The results have the same format as the OpenSSL backend.
+    """
+    # Use PKCS#1 v1.5 instead of PSS for RSA signatures.
+    __fRandOff = None
+
+    def __init__(self, fRandOff=False):
+        if fHaveCryptography is not True:
+            raise CryptoBackendError(
+                'The "cryptography" package is not installed.'
+            )
+        self.__fRandOff = fRandOff
+
+    def get_name(self):
+        return 'cryptography'
+
+    def __load_key(self, strKeyDER, fIsPublicKey):
+        try:
+            if fIsPublicKey is True:
+                tKey = serialization.load_der_public_key(
+                    bytes(strKeyDER),
+                    backend=default_backend()
+                )
+            else:
+                tKey = serialization.load_der_private_key(
+                    bytes(strKeyDER),
+                    password=None,
+                    backend=default_backend()
+                )
+        except ValueError as tException:
+            raise CryptoBackendError('Failed to load the key: %s' %
+                                     str(tException))
+        return tKey
+
+    def sign(self, strKeyDER, strData):
+        tKey = self.__load_key(strKeyDER, False)
+        if isinstance(tKey, rsa.RSAPrivateKey):
+            if self.__fRandOff:
+                tPadding = padding.PKCS1v15()
+            else:
+                tPadding = padding.PSS(
+                    mgf=padding.MGF1(hashes.SHA384()),
+                    salt_length=hashes.SHA384.digest_size
+                )
+            strSignature = tKey.sign(bytes(strData), tPadding, hashes.SHA384())
+        elif isinstance(tKey, ec.EllipticCurvePrivateKey):
+            strSignature = tKey.sign(
+                bytes(strData),
+                ec.ECDSA(hashes.SHA384())
+            )
+        else:
+            raise CryptoBackendError('Unknown key format.')
+        return strSignature
+
+    def get_key_numbers(self, strKeyDER, fIsPublicKey):
+        tKey = self.__load_key(strKeyDER, fIsPublicKey)
+        if fIsPublicKey is True:
+            tPublicNumbers = tKey.public_numbers()
+            tPrivateNumbers = None
+        else:
+            tPrivateNumbers = tKey.private_numbers()
+            tPublicNumbers = tPrivateNumbers.public_numbers
+
+        if isinstance(tPublicNumbers, rsa.RSAPublicNumbers):
+            iKeyType = KEY_TYPE_RSA
+            atNumbers = {
+                'mod': int_to_bytes(tPublicNumbers.n),
+                'exp': tPublicNumbers.e
+            }
+
+        elif(
+            isinstance(tPublicNumbers, ec.EllipticCurvePublicNumbers) and
+            (tPrivateNumbers is not None)
+        ):
+            iKeyType = KEY_TYPE_ECC
+            strCurve = tPublicNumbers.curve.name
+            if strCurve not in s_atEccCurves:
+                raise CryptoBackendError('Unsupported ECC curve: %s' %
+                                         strCurve)
+            atCurve = s_atEccCurves[strCurve]
+            sizField = (atCurve['p'].bit_length() + 7) // 8
+
+            atNumbers = {
+                'd': int_to_bytes(tPrivateNumbers.private_value, sizField),
+                'Qx': int_to_bytes(tPublicNumbers.x, sizField),
+                'Qy': int_to_bytes(tPublicNumbers.y, sizField),
+                'cof': atCurve['cof']
+            }
+            for strName in ['p', 'a', 'b', 'Gx', 'Gy', 'n']:
+                atNumbers[strName] = int_to_bytes(atCurve[strName], sizField)
+
+        else:
+            raise CryptoBackendError('Unknown key format.')
+
+        return iKeyType, atNumbers
+
+
+def int_to_bytes(ulValue, sizBytes=None):
+    # Convert a positive number to big endian bytes. Without a size the
+    # shortest representation is used.
+    # This works with Python 2, which has no int.to_bytes.
+    strHex = '%x' % ulValue
+    if (len(strHex) % 2) != 0:
+        strHex = '0' + strHex
+    if sizBytes is None:
+        sizBytes = len(strHex) // 2
+    elif len(strHex) > (2 * sizBytes):
+        raise OverflowError('The number does not fit into %d bytes.' %
+                            sizBytes)
+    return bytearray(binascii.unhexlify(strHex.zfill(2 * sizBytes)))
+
+
+def bytes_to_int(strData):
+    # Convert big endian bytes to a positive number.
+    if len(strData) == 0:
+        return 0
+    return int(binascii.hexlify(bytes(strData)), 16)
+
+
+def __der_read_element(strDER, uiOffset):
+    # Read the tag and length of a DER element. Return the tag, the offset
+    # of the contents and the offset of the next element.
+    ucTag = strDER[uiOffset]
+    sizLength = strDER[uiOffset + 1]
+    uiOffset += 2
+    if sizLength >= 0x80:
+        sizLengthBytes = sizLength & 0x7f
+        sizLength = bytes_to_int(
+            strDER[uiOffset:uiOffset + sizLengthBytes]
+        )
+        uiOffset += sizLengthBytes
+    return ucTag, uiOffset, uiOffset + sizLength
+
+
+# The DER encoded object IDs of the key algorithms.
+s_strOidRsaEncryption = b'\x2a\x86\x48\x86\xf7\x0d\x01\x01\x01'
+s_strOidEcPublicKey = b'\x2a\x86\x48\xce\x3d\x02\x01'
+
+
+def get_key_type(strKeyDER):
+    """ Return KEY_TYPE_RSA or KEY_TYPE_ECC for a DER encoded key.
+
+    This understands PKCS#8 private keys, SubjectPublicKeyInfo and the
+    traditional RSAPrivateKey and ECPrivateKey structures.
+    """
+    # Indexing a bytearray returns numbers on Python 2 and 3.
+    strKeyDER = bytearray(strKeyDER)
+    iKeyType = None
+    try:
+        ucTag, uiContents, uiEnd = __der_read_element(strKeyDER, 0)
+        if ucTag != 0x30:
+            raise CryptoBackendError('The key is no DER sequence.')
+
+        # Look for the algorithm identifier. It is the first element of a
+        # public key and follows the version of a PKCS#8 key.
+        uiAlgorithm = None
+        ucTag, uiFirst, uiNext = __der_read_element(strKeyDER, uiContents)
+        if ucTag == 0x30:
+            uiAlgorithm = uiFirst
+        elif ucTag == 0x02:
+            # Skip the version. Now there is either the algorithm
+            # identifier of a PKCS#8 key, the modulus of an RSA key or the
+            # private value of an ECC key.
+            ucTag, uiSecond, uiNext = __der_read_element(strKeyDER, uiNext)
+            if ucTag == 0x30:
+                uiAlgorithm = uiSecond
+            elif ucTag == 0x02:
+                iKeyType = KEY_TYPE_RSA
+            elif ucTag == 0x04:
+                iKeyType = KEY_TYPE_ECC
+
+        if uiAlgorithm is not None:
+            # The algorithm identifier starts with the OID.
+            ucTag, uiOid, uiOidEnd = __der_read_element(
+                strKeyDER,
+                uiAlgorithm
+            )
+            strOid = strKeyDER[uiOid:uiOidEnd]
+            if strOid == s_strOidRsaEncryption:
+                iKeyType = KEY_TYPE_RSA
+            elif strOid == s_strOidEcPublicKey:
+                iKeyType = KEY_TYPE_ECC
+    except IndexError:
+        raise CryptoBackendError('The DER key is truncated.')
+
+    if iKeyType is None:
+        raise CryptoBackendError('Unknown key format.')
+    return iKeyType
+
+
+def get_backend(strName='auto', strOpenssl='openssl', astrOptions=None,
+                fRandOff=False):
+    """ Create a crypto backend.
+
+    strName can be "openssl", "cryptography" or "auto". The automatic
+    selection prefers the "cryptography" package. It falls back to the
+    OpenSSL tool if the package is not installed, if additional OpenSSL
+    options are requested or if another OpenSSL tool than the default
+    "openssl" was selected.
+    """
+    if strName == 'auto':
+        if(
+            (fHaveCryptography is True) and
+            (not astrOptions) and
+            (strOpenssl == 'openssl')
+        ):
+            strName = 'cryptography'
+        else:
+            strName = 'openssl'
+
+    if strName == 'openssl':
+        tBackend = CryptoBackendOpenssl(strOpenssl, astrOptions, fRandOff)
+    elif strName == 'cryptography':
+        tBackend = CryptoBackendCryptography(fRandOff)
+    else:
+        raise CryptoBackendError('Unknown crypto backend: %s' % strName)
+
+    return tBackend
+
+
+# All analysed keys are shared through this cache. It is kept in memory and
+# optionally in a database.
+tKeyCache = key_cache.KeyCache()
+
+
+def get_key_numbers(tBackend, strKeyDER, fIsPublicKey, strDatabasePath=None):
+    """ Get the numbers of a key through the key cache.
+
+    This is the cached version of the "get_key_numbers" method of the
+    backends. The key is only analysed by tBackend if it is not in the
+    cache yet.
+    """
+    tKeyCache.set_database(strDatabasePath)
+    return tKeyCache.get(
+        strKeyDER,
+        fIsPublicKey,
+        lambda: tBackend.get_key_numbers(strKeyDER, fIsPublicKey)
+    )
+
+
+def get_cache_statistics():
+    return tKeyCache.get_statistics()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import atexit
+import collections
+import copy
+import hashlib
+import marshal
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+
+
+class ElfCache:
+    # The maximum number of results kept in memory.
+    __sizMaxEntries = None
+
+    # The maximum number of results kept in the database.
+    __sizMaxDatabaseEntries = None
+
+    # The in-memory results in LRU order. The most recently used entry is
+    # at the end.
+    __atEntries = None
+
+    # Map the path, size and modification time of a file to the digest of
+    # its contents. A file is only hashed again if one of them changed.
+    __atFileDigests = None
+
+    # The filename of the optional database.
+    __strDatabasePath = None
+
+    # The database connection.
+    __tDb = None
+
+    # The results are stored with marshal. Its data types differ between
+    # Python 2 and 3, so each major version has its own table.
+    __strTable = 'elf_results_py%d' % sys.version_info.major
+
+    # The keys of all database entries which were used since the last
+    # write. Their "last_used" time is updated in one transaction.
+    __atUsedKeys = None
+
+    __tLock = None
+
+    __ulHits = None
+    __ulDatabaseHits = None
+    __ulMisses = None
+
+    def __init__(self, sizMaxEntries=256, sizMaxDatabaseEntries=4096):
+        self.__sizMaxEntries = sizMaxEntries
+        self.__sizMaxDatabaseEntries = sizMaxDatabaseEntries
+        self.__atEntries = collections.OrderedDict()
+        self.__atFileDigests = {}
+        self.__strDatabasePath = None
+        self.__tDb = None
+        self.__atUsedKeys = set()
+        self.__tLock = threading.RLock()
+        self.__ulHits = 0
+        self.__ulDatabaseHits = 0
+        self.__ulMisses = 0
+
+        # Write the pending "last_used" times when the process ends.
+        atexit.register(self.flush)
+
+    def set_database(self, strDatabasePath):
+        # Keep the results also on disk. This is optional, without a
+        # database the results live only as long as the process.
+        with self.__tLock:
+            if strDatabasePath == self.__strDatabasePath:
+                return
+            if self.__tDb is not None:
+                self.flush()
+                self.__tDb.close()
+                self.__tDb = None
+            self.__strDatabasePath = strDatabasePath
+            if strDatabasePath is not None:
+                tDb = sqlite3.connect(strDatabasePath, check_same_thread=False)
+                tDb.execute(
+                    'CREATE TABLE IF NOT EXISTS %s ('
+                    'digest TEXT NOT NULL, '
+                    'kind TEXT NOT NULL, '
+                    'args TEXT NOT NULL, '
+                    'value BLOB NOT NULL, '
+                    'last_used INTEGER NOT NULL, '
+                    'PRIMARY KEY (digest, kind, args))' % self.__strTable
+                )
+                tDb.commit()
+                self.__tDb = tDb
+
+    def get_file_digest(self, strFileName):
+        strAbsFileName = os.path.abspath(strFileName)
+        tStat = os.stat(strAbsFileName)
+        tFileKey = (strAbsFileName, tStat.st_size, tStat.st_mtime)
+        with self.__tLock:
+            strDigest = self.__atFileDigests.get(tFileKey)
+        if strDigest is None:
+            tHash = hashlib.sha384()
+            tFile = open(strAbsFileName, 'rb')
+            while True:
+                strChunk = tFile.read(0x100000)
+                if len(strChunk) == 0:
+                    break
+                tHash.update(strChunk)
+            tFile.close()
+            strDigest = tHash.hexdigest()
+            with self.__tLock:
+                self.__atFileDigests[tFileKey] = strDigest
+        return tFileKey, strDigest
+
+    def __db_get(self, strDigest, strKind, strArgs):
+        tValue = None
+        fFound = False
+        if self.__tDb is not None:
+            tCursor = self.__tDb.execute(
+                'SELECT value FROM %s '
+                'WHERE digest=? AND kind=? AND args=?' % self.__strTable,
+                (strDigest, strKind, strArgs)
+            )
+            atRow = tCursor.fetchone()
+            if atRow is not None:
+                tValue = marshal.loads(zlib.decompress(atRow[0]))
+                fFound = True
+                # A hit only reads the database. The new "last_used" time
+                # is written later together with all other hits.
+                self.__atUsedKeys.add((strDigest, strKind, strArgs))
+        return fFound, tValue
+
+    def __db_update_last_used(self):
+        if len(self.__atUsedKeys) != 0:
+            self.__tDb.executemany(
+                'UPDATE %s SET last_used=strftime(\'%%s\',\'now\') '
+                'WHERE digest=? AND kind=? AND args=?' % self.__strTable,
+                self.__atUsedKeys
+            )
+            self.__atUsedKeys.clear()
+
+    def __db_set(self, strDigest, strKind, strArgs, tValue):
+        if self.__tDb is not None:
+            self.__tDb.execute(
+                'INSERT OR REPLACE INTO %s '
+                '(digest, kind, args, value, last_used) '
+                'VALUES (?, ?, ?, ?, strftime(\'%%s\',\'now\'))' %
+                self.__strTable,
+                (
+                    strDigest,
+                    strKind,
+                    strArgs,
+                    sqlite3.Binary(zlib.compress(marshal.dumps(tValue, 2)))
+                )
+            )
+            # Remove the least recently used entries. The pending hits must
+            # be written first, or they would look unused.
+            self.__db_update_last_used()
+            self.__tDb.execute(
+                'DELETE FROM %s WHERE rowid IN ('
+                'SELECT rowid FROM %s ORDER BY last_used DESC '
+                'LIMIT -1 OFFSET ?)' % (self.__strTable, self.__strTable),
+                (self.__sizMaxDatabaseEntries, )
+            )
+            self.__tDb.commit()
+
+    def flush(self):
+        """ Write the "last_used" times of all database hits. """
+        with self.__tLock:
+            if self.__tDb is not None and len(self.__atUsedKeys) != 0:
+                self.__db_update_last_used()
+                self.__tDb.commit()
+
+    def __touch(self, tKey):
+        # Move the entry to the end of the LRU order. Python 2 has no
+        # "move_to_end", so the entry is inserted again.
+        self.__atEntries[tKey] = self.__atEntries.pop(tKey)
+
+    def get(self, strFileName, strKind, tArgs, pfnCompute):
+        """ Return the cached result of pfnCompute for the ELF file.
+
+        The entries are keyed by the path, size, modification time and
+        content digest of the file plus the kind of the result and the
+        hashable arguments tArgs. The database only uses the digest, so
+        results survive a rebuild which produces the same file.
+        """
+        tFileKey, strDigest = self.get_file_digest(strFileName)
+        tKey = tFileKey + (strDigest, strKind, tArgs)
+        strArgs = repr(tArgs)
+
+        with self.__tLock:
+            if tKey in self.__atEntries:
+                self.__touch(tKey)
+                self.__ulHits += 1
+                return copy.deepcopy(self.__atEntries[tKey])
+
+            fFound, tValue = self.__db_get(strDigest, strKind, strArgs)
+            if fFound is True:
+                self.__ulDatabaseHits += 1
+            else:
+                self.__ulMisses += 1
+
+        if fFound is False:
+            tValue = pfnCompute()
+
+        with self.__tLock:
+            if fFound is False:
+                self.__db_set(strDigest, strKind, strArgs, tValue)
+            self.__atEntries.pop(tKey, None)
+            self.__atEntries[tKey] = tValue
+            while len(self.__atEntries) > self.__sizMaxEntries:
+                self.__atEntries.popitem(last=False)
+
+        return copy.deepcopy(tValue)
+
+    def get_statistics(self):
+        with self.__tLock:
+            return dict({
+                'hits': self.__ulHits,
+                'database_hits': self.__ulDatabaseHits,
+                'misses': self.__ulMisses,
+                'entries': len(self.__atEntries)
+            })
+
+    def clear(self):
+        with self.__tLock:
+            self.__atEntries.clear()
+            self.__atFileDigests.clear()
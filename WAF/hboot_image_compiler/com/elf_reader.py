@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import struct
+
+
+class ElfReaderError(Exception):
+    """ The file can not be handled by the native reader. """
+    pass
+
+
+class ElfReader:
+    ELFCLASS32 = 1
+
+    ELFDATA2LSB = 1
+    ELFDATA2MSB = 2
+
+    SHN_UNDEF = 0x0000
+    SHN_LORESERVE = 0xff00
+    SHN_XINDEX = 0xffff
+
+    SHT_NULL = 0
+    SHT_PROGBITS = 1
+    SHT_SYMTAB = 2
+    SHT_STRTAB = 3
+    SHT_RELA = 4
+    SHT_DYNSYM = 11
+    SHT_NOBITS = 8
+    SHT_REL = 9
+    SHT_GROUP = 17
+    SHT_SYMTAB_SHNDX = 18
+
+    SHF_WRITE = 0x00000001
+    SHF_ALLOC = 0x00000002
+    SHF_EXECINSTR = 0x00000004
+    SHF_TLS = 0x00000400
+    SHF_EXCLUDE = 0x80000000
+
+    PT_LOAD = 1
+
+    STB_GLOBAL = 1
+    STV_DEFAULT = 0
+
+    # The raw contents of the ELF file.
+    __tData = None
+
+    # The byte order prefix for the struct module.
+    __strEndian = None
+
+    # The entry point from the file header.
+    __ulEntry = None
+
+    # The list of all section headers as dicts.
+    __atSections = None
+
+    # The list of all program headers as dicts.
+    __atProgramHeaders = None
+
+    def __init__(self, strFileName):
+        # Read the complete file at once. All further accesses are slices of
+        # this buffer.
+        tFile = open(strFileName, 'rb')
+        strData = tFile.read()
+        tFile.close()
+        self.__tData = memoryview(strData)
+
+        self.__parse_file_header()
+        self.__parse_program_headers()
+        self.__parse_section_headers()
+
+    def __unpack(self, strFormat, ulOffset):
+        try:
+            return struct.unpack_from(
+                self.__strEndian + strFormat,
+                self.__tData,
+                ulOffset
+            )
+        except struct.error as e:
+            raise ElfReaderError('Truncated ELF file: %s' % str(e))
+
+    def __parse_file_header(self):
+        tData = self.__tData
+        if len(tData) < 52:
+            raise ElfReaderError('Not an ELF file.')
+
+        # Read the identification with struct. Indexing a memoryview returns
+        # a string on Python 2 and an int on Python 3.
+        strMagic, ucClass, ucEndian = struct.unpack_from('4sBB', tData, 0)
+        if strMagic != b'\x7fELF':
+            raise ElfReaderError('Not an ELF file.')
+        if ucClass != self.ELFCLASS32:
+            raise ElfReaderError('Only 32 bit ELF files are supported.')
+        if ucEndian == self.ELFDATA2LSB:
+            self.__strEndian = '<'
+        elif ucEndian == self.ELFDATA2MSB:
+            self.__strEndian = '>'
+        else:
+            raise ElfReaderError('Unknown ELF data encoding %d.' % ucEndian)
+
+        (
+            self.__ulEntry,
+            self.__ulPhOff,
+            self.__ulShOff,
+            self.__usPhEntSize,
+            self.__usPhNum,
+            self.__usShEntSize,
+            self.__usShNum,
+            self.__usShStrNdx
+        ) = self.__unpack('IIIxxxxxxHHHHH', 24)
+
+    def __parse_program_headers(self):
+        atProgramHeaders = []
+        if self.__ulPhOff != 0:
+            for uiCnt in range(0, self.__usPhNum):
+                aulHeader = self.__unpack(
+                    'IIIIIIII',
+                    self.__ulPhOff + uiCnt * self.__usPhEntSize
+                )
+                atProgramHeaders.append(dict({
+                    'type':   aulHeader[0],
+                    'offset': aulHeader[1],
+                    'vaddr':  aulHeader[2],
+                    'paddr':  aulHeader[3],
+                    'filesz': aulHeader[4],
+                    'memsz':  aulHeader[5]
+                }))
+        self.__atProgramHeaders = atProgramHeaders
+
+    def __parse_section_headers(self):
+        atSections = []
+        if self.__ulShOff != 0:
+            uiShNum = self.__usShNum
+            uiShStrNdx = self.__usShStrNdx
+            # Extended numbering stores the real values in section 0.
+            if uiShNum == 0:
+                uiShNum = self.__unpack('I', self.__ulShOff + 20)[0]
+            if uiShStrNdx == self.SHN_XINDEX:
+                uiShStrNdx = self.__unpack('I', self.__ulShOff + 24)[0]
+
+            for uiCnt in range(0, uiShNum):
+                aulHeader = self.__unpack(
+                    'IIIIIIIIII',
+                    self.__ulShOff + uiCnt * self.__usShEntSize
+                )
+                atSections.append(dict({
+                    'name_off':  aulHeader[0],
+                    'type':      aulHeader[1],
+                    'flags':     aulHeader[2],
+                    'addr':      aulHeader[3],
+                    'offset':    aulHeader[4],
+                    'size':      aulHeader[5],
+                    'link':      aulHeader[6],
+                    'info':      aulHeader[7],
+                    'addralign': aulHeader[8],
+                    'entsize':   aulHeader[9]
+                }))
+
+            if uiShStrNdx >= len(atSections):
+                raise ElfReaderError('Invalid section name table index.')
+            tShStrTab = atSections[uiShStrNdx]
+            for tSection in atSections:
+                tSection['name'] = self.__get_string(
+                    tShStrTab,
+                    tSection['name_off']
+                )
+            self.__uiShStrNdx = uiShStrNdx
+
+        self.__atSections = atSections
+
+    def __get_string(self, tStrTab, ulOffset):
+        ulStart = tStrTab['offset'] + ulOffset
+        ulEnd = tStrTab['offset'] + tStrTab['size']
+        if ulStart >= ulEnd:
+            return ''
+        strTab = self.__tData[ulStart:ulEnd].tobytes()
+        sizName = strTab.find(b'\x00')
+        if sizName != -1:
+            strTab = strTab[:sizName]
+        return strTab.decode('utf-8', 'replace')
+
+    def __get_lma(self, tSection):
+        # Non-allocated sections have no load address.
+        ulLma = tSection['addr']
+        if (tSection['flags'] & self.SHF_ALLOC) != 0:
+            fHasContents = tSection['type'] != self.SHT_NOBITS
+            for tPhdr in self.__atProgramHeaders:
+                if tPhdr['type'] != self.PT_LOAD:
+                    continue
+
+                # Is the section inside this segment?
+                ulAddr = tSection['addr']
+                ulSize = tSection['size']
+                if ulAddr < tPhdr['vaddr'] or ulAddr > (
+                    tPhdr['vaddr'] + tPhdr['memsz']
+                ):
+                    continue
+                if fHasContents is True:
+                    ulOffset = tSection['offset']
+                    if ulOffset < tPhdr['offset'] or (
+                        ulOffset + ulSize > tPhdr['offset'] + tPhdr['filesz']
+                    ):
+                        continue
+                    # Calculate the LMA from the position in the segment.
+                    ulLma = tPhdr['paddr'] + ulOffset - tPhdr['offset']
+                else:
+                    ulLma = tPhdr['paddr'] + ulAddr - tPhdr['vaddr']
+
+                # Sections with zero size at the border of two segments
+                # belong to the segment which also covers their address.
+                if ulAddr + ulSize <= tPhdr['vaddr'] + tPhdr['memsz']:
+                    break
+        return ulLma & 0xffffffff
+
+    def __get_flags(self, tSection, fHasRelocs):
+        # Reproduce the section flags which objdump prints for ELF sections.
+        astrFlags = []
+        ulFlags = tSection['flags']
+        fHasContents = tSection['type'] != self.SHT_NOBITS
+        fAlloc = (ulFlags & self.SHF_ALLOC) != 0
+        fLoad = fAlloc and fHasContents
+        strName = tSection['name']
+
+        fDebugging = False
+        fOctets = False
+        if fAlloc is False and strName.startswith('.'):
+            if(
+                strName.startswith('.debug') or
+                strName.startswith('.gnu.debuglto_.debug_') or
+                strName.startswith('.gnu.linkonce.wi.') or
+                strName.startswith('.zdebug')
+            ):
+                fDebugging = True
+                fOctets = True
+            elif(
+                strName.startswith('.gnu.build.attributes') or
+                strName.startswith('.note.gnu')
+            ):
+                fOctets = True
+            elif(
+                strName.startswith('.line') or
+                strName.startswith('.stab') or
+                strName == '.gdb_index'
+            ):
+                fDebugging = True
+
+        if fHasContents is True:
+            astrFlags.append('CONTENTS')
+        if fAlloc is True:
+            astrFlags.append('ALLOC')
+        if fLoad is True:
+            astrFlags.append('LOAD')
+        if fHasRelocs is True:
+            astrFlags.append('RELOC')
+        if (ulFlags & self.SHF_WRITE) == 0:
+            astrFlags.append('READONLY')
+        if (ulFlags & self.SHF_EXECINSTR) != 0:
+            astrFlags.append('CODE')
+        elif fLoad is True:
+            astrFlags.append('DATA')
+        if fDebugging is True:
+            astrFlags.append('DEBUGGING')
+        if (ulFlags & self.SHF_EXCLUDE) != 0:
+            astrFlags.append('EXCLUDE')
+        if (ulFlags & self.SHF_TLS) != 0:
+            astrFlags.append('THREAD_LOCAL')
+        if tSection['type'] == self.SHT_GROUP:
+            astrFlags.append('GROUP')
+        if fOctets is True:
+            astrFlags.append('OCTETS')
+        return astrFlags
+
+    def __get_symtab_index(self):
+        uiSymTab = None
+        for uiIdx, tSection in enumerate(self.__atSections):
+            if tSection['type'] == self.SHT_SYMTAB:
+                uiSymTab = uiIdx
+                break
+        return uiSymTab
+
+    def get_segment_table(self, astrSegmentsToConsider=None):
+        """ Return the sections in the same form as "objdump -h -w". """
+        atSections = self.__atSections
+        uiSymTab = self.__get_symtab_index()
+
+        # Collect all sections which are not shown as separate entries.
+        # These are the symbol table with its strings, the section name
+        # table and all relocations which belong to another section.
+        auiHidden = set([0, self.__uiShStrNdx])
+        auiHasRelocs = set()
+        if uiSymTab is not None:
+            auiHidden.add(uiSymTab)
+            auiHidden.add(atSections[uiSymTab]['link'])
+        for uiIdx, tSection in enumerate(atSections):
+            ulType = tSection['type']
+            if ulType == self.SHT_SYMTAB_SHNDX:
+                auiHidden.add(uiIdx)
+            elif(
+                (ulType == self.SHT_REL or ulType == self.SHT_RELA) and
+                (tSection['flags'] & self.SHF_ALLOC) == 0 and
+                uiSymTab is not None and
+                tSection['link'] == uiSymTab and
+                tSection['info'] != self.SHN_UNDEF and
+                tSection['info'] < len(atSections)
+            ):
+                auiHidden.add(uiIdx)
+                auiHasRelocs.add(tSection['info'])
+
+        atSegments = []
+        uiObjdumpIdx = 0
+        for uiIdx, tSection in enumerate(atSections):
+            if uiIdx in auiHidden or tSection['type'] == self.SHT_NULL:
+                continue
+
+            strName = tSection['name']
+            if(
+                astrSegmentsToConsider is None or
+                strName in astrSegmentsToConsider
+            ):
+                # objdump rounds the alignment up to a power of 2.
+                ulAlign = max(tSection['addralign'], 1)
+                uiAlign = 1 << (ulAlign - 1).bit_length()
+                atSegments.append(dict({
+                    'idx':      uiObjdumpIdx,
+                    'name':     strName,
+                    'size':     tSection['size'],
+                    'vma':      tSection['addr'],
+                    'lma':      self.__get_lma(tSection),
+                    'file_off': tSection['offset'],
+                    'align':    uiAlign,
+                    'flags':    self.__get_flags(
+                        tSection,
+                        uiIdx in auiHasRelocs
+                    )
+                }))
+            uiObjdumpIdx += 1
+
+        return atSegments
+
+    def get_binary(self, astrSegmentsToDump=None):
+        """ Return the flat image like "objcopy --output-target=binary". """
+        # Collect all sections which end up in the binary. These are all
+        # allocated sections with contents in the file.
+        atLoad = []
+        for tSection in self.__atSections:
+            if(
+                tSection['type'] == self.SHT_NULL or
+                tSection['type'] == self.SHT_NOBITS or
+                (tSection['flags'] & self.SHF_ALLOC) == 0 or
+                tSection['size'] == 0
+            ):
+                continue
+            if(
+                astrSegmentsToDump is not None and
+                tSection['name'] not in astrSegmentsToDump
+            ):
+                continue
+            atLoad.append((self.__get_lma(tSection), tSection))
+
+        if len(atLoad) == 0:
+            return b''
+
+        # The image starts at the lowest LMA. Gaps between the sections are
+        # filled with 0.
+        ulLow = min(ulLma for ulLma, tSection in atLoad)
+        ulHigh = max(ulLma + tSection['size'] for ulLma, tSection in atLoad)
+        aucImage = bytearray(ulHigh - ulLow)
+        for ulLma, tSection in atLoad:
+            ulOffset = tSection['offset']
+            sizSection = tSection['size']
+            if ulOffset + sizSection > len(self.__tData):
+                raise ElfReaderError(
+                    'Section "%s" exceeds the file.' % tSection['name']
+                )
+            ulPos = ulLma - ulLow
+            aucImage[ulPos:ulPos + sizSection] = \
+                self.__tData[ulOffset:ulOffset + sizSection]
+        return bytes(aucImage)
+
+    def __iter_symbols(self):
+        # readelf lists the dynamic symbols before the static ones.
+        atSymTabs = [
+            tSection for tSection in self.__atSections
+            if tSection['type'] == self.SHT_DYNSYM
+        ] + [
+            tSection for tSection in self.__atSections
+            if tSection['type'] == self.SHT_SYMTAB
+        ]
+        for tSymTab in atSymTabs:
+            if tSymTab['link'] >= len(self.__atSections):
+                raise ElfReaderError('Invalid string table for symbols.')
+            tStrTab = self.__atSections[tSymTab['link']]
+            sizEntry = tSymTab['entsize']
+            if sizEntry == 0:
+                sizEntry = 16
+            for ulOffset in range(
+                tSymTab['offset'],
+                tSymTab['offset'] + tSymTab['size'],
+                sizEntry
+            ):
+                (
+                    ulName,
+                    ulValue,
+                    ulSize,
+                    ucInfo,
+                    ucOther,
+                    usShndx
+                ) = self.__unpack('IIIBBH', ulOffset)
+                yield dict({
+                    'name':  self.__get_string(tStrTab, ulName),
+                    'value': ulValue,
+                    'size':  ulSize,
+                    'bind':  ucInfo >> 4,
+                    'type':  ucInfo & 0x0f,
+                    'vis':   ucOther & 0x03,
+                    'shndx': usShndx
+                })
+
+    def __is_symbol_in_section(self, tSymbol):
+        # readelf prints a number for the section index only for symbols
+        # which are defined in a real section.
+        usShndx = tSymbol['shndx']
+        return (
+            usShndx == self.SHN_XINDEX or
+            (usShndx != self.SHN_UNDEF and usShndx < self.SHN_LORESERVE)
+        )
+
+    def get_symbol_table(self):
+        """ Return all global symbols like "readelf --symbols". """
+        atSymbols = dict({})
+        for tSymbol in self.__iter_symbols():
+            if(
+                tSymbol['bind'] == self.STB_GLOBAL and
+                self.__is_symbol_in_section(tSymbol) and
+                len(tSymbol['name']) != 0
+            ):
+                atSymbols[tSymbol['name']] = tSymbol['value']
+        return atSymbols
+
+    def get_start_symbol(self):
+        """ Return the value of the global "start" symbol or None. """
+        ulValue = None
+        for tSymbol in self.__iter_symbols():
+            # NOTE: The text based parser matches all names beginning with
+            #       "start". Keep this behaviour to get the same results.
+            if(
+                tSymbol['bind'] == self.STB_GLOBAL and
+                tSymbol['vis'] == self.STV_DEFAULT and
+                self.__is_symbol_in_section(tSymbol) and
+                tSymbol['name'].startswith('start')
+            ):
+                ulValue = tSymbol['value']
+                break
+        return ulValue
+
+    def get_entry_point(self):
+        return self.__ulEntry
@@ -24,6 +24,10 @@
 import os
 import re
 import subprocess
+import tempfile
+
+from . import elf_cache
+from . import elf_reader
 
 # NOTE: this is only for debug.
 import datetime
@@ -42,7 +46,59 @@ def run_cmd(aCmd, stdout=subprocess.PIPE):
     return strOutput
 
 
+# All ELF analysis results are shared through this cache. It is kept in
+# memory and optionally in the database at env['ELF_CACHE'].
+tElfCache = elf_cache.ElfCache()
+
+
+def __get_cache(env):
+    tElfCache.set_database(env.get('ELF_CACHE'))
+    return tElfCache
+
+
+def __freeze_list(astrList):
+    if astrList is None:
+        return None
+    return tuple(astrList)
+
+
+def __open_elf(strFileName):
+    # Try to parse the ELF file natively. Return None if the file can not be
+    # handled here, the caller falls back to the binutils then.
+    tElf = None
+    try:
+        tElf = elf_reader.ElfReader(strFileName)
+    except elf_reader.ElfReaderError:
+        pass
+    return tElf
+
+
 def get_segment_table(env, strFileName, astrSegmentsToConsider=None):
+    # Only the complete table is cached. Filter it here.
+    atSegmentsAll = __get_cache(env).get(
+        strFileName,
+        'segments',
+        None,
+        lambda: __read_segment_table(env, strFileName)
+    )
+    if astrSegmentsToConsider is None:
+        atSegments = atSegmentsAll
+    else:
+        atSegments = [
+            tSegment for tSegment in atSegmentsAll
+            if tSegment['name'] in astrSegmentsToConsider
+        ]
+    return atSegments
+
+
+def __read_segment_table(env, strFileName):
+    tElf = __open_elf(strFileName)
+    if tElf is not None:
+        return tElf.get_segment_table()
+    return __get_segment_table_objdump(env, strFileName, None)
+
+
+def __get_segment_table_objdump(env, strFileName, astrSegmentsToConsider):
     atSegments = []
     aCmd = [env['OBJDUMP'], '-h', '-w', strFileName]
     strOutput = run_cmd(aCmd)
@@ -95,6 +151,22 @@ def segment_is_loadable(tSegment):
 
 
 def get_symbol_table(env, strFileName):
+    return __get_cache(env).get(
+        strFileName,
+        'symbols',
+        None,
+        lambda: __read_symbol_table(env, strFileName)
+    )
+
+
+def __read_symbol_table(env, strFileName):
+    tElf = __open_elf(strFileName)
+    if tElf is not None:
+        return tElf.get_symbol_table()
+    return __get_symbol_table_readelf(env, strFileName)
+
+
+def __get_symbol_table_readelf(env, strFileName):
     aCmd = [env['READELF'], '--symbols', '--wide', strFileName]
     strOutput = run_cmd(aCmd)
 
@@ -121,6 +193,58 @@ def get_symbol_table(env, strFileName):
     return atSymbols
 
 
+def get_binary(env, strFileName, astrSegmentsToDump=None):
+    # Build the flat binary image of all loadable sections or only the
+    # sections in astrSegmentsToDump.
+    return __get_cache(env).get(
+        strFileName,
+        'binary',
+        __freeze_list(astrSegmentsToDump),
+        lambda: __read_binary(env, strFileName, astrSegmentsToDump)
+    )
+
+
+def __read_binary(env, strFileName, astrSegmentsToDump):
+    tElf = __open_elf(strFileName)
+    if tElf is not None:
+        return tElf.get_binary(astrSegmentsToDump)
+    return __get_binary_objcopy(env, strFileName, astrSegmentsToDump)
+
+
+def __get_binary_objcopy(env, strFileName, astrSegmentsToDump):
+    tBinFile, strBinFileName = tempfile.mkstemp()
+    os.close(tBinFile)
+
+    aCmd = [
+        env['OBJCOPY'],
+        '--output-target=binary'
+    ]
+    if astrSegmentsToDump is not None:
+        for strSegment in astrSegmentsToDump:
+            aCmd.append('--only-section=%s' % strSegment)
+    aCmd.append(strFileName)
+    aCmd.append(strBinFileName)
+
+    try:
+        subprocess.check_call(aCmd)
+    except Exception as e:
+        print("Failed to call external program:")
+        print(aCmd)
+        print(e)
+        os.remove(strBinFileName)
+        raise
+
+    # Get the application data.
+    tBinFile = open(strBinFileName, 'rb')
+    strData = tBinFile.read()
+    tBinFile.close()
+
+    # Remove the temp file.
+    os.remove(strBinFileName)
+
+    return strData
+
+
 def get_debug_structure(env, strFileName):
     aCmd = [env['READELF'], '--debug-dump=info', strFileName]
     proc = subprocess.Popen(aCmd, stdout=subprocess.PIPE)
@@ -277,6 +401,18 @@ def __iter_debug_info(tNode, atDebugInfo, atSymbols):
 
 
 def get_debug_symbols(env, strFileName):
+    # Parsing the debug info takes long for big firmwares. Keep the result
+    # in the ELF cache, which also stores it in the database if one is
+    # configured.
+    return __get_cache(env).get(
+        strFileName,
+        'debug_symbols',
+        None,
+        lambda: __read_debug_symbols(env, strFileName)
+    )
+
+
+def __read_debug_symbols(env, strFileName):
     atDebugInfo = get_debug_structure(env, strFileName)
     atAllSymbols = dict({})
     __iter_debug_info(atDebugInfo, atDebugInfo, atAllSymbols)
@@ -284,51 +420,80 @@ def get_debug_symbols(env, strFileName):
 
 
 def get_macro_definitions(env, strFileName):
+    return __get_cache(env).get(
+        strFileName,
+        'macros',
+        None,
+        lambda: __read_macro_definitions(env, strFileName)
+    )
+
+
+# FIXME: Macro extraction should respect different files.
+# NOTE: This matches only macros without parameter.
+# This is one expression for all known define records of the
+#   --debug-dump=macro output:
+#  * DW_MACINFO_define
+#  * DW_MACRO_GNU_define_indirect
+#  * DW_MACRO_define_strp (gcc 9.2 output)
+s_reMacro = re.compile(
+    r'\s+DW_MAC(?:INFO_define|RO_GNU_define_indirect|RO_define_strp) '
+    r'- lineno : \d+ macro : (\w+)\s+(.*)'
+)
+
+
+def merge_macro_definitions(tLines, atMergedMacros=None):
+    # Collect the macros from an iterable of readelf output lines.
+    # The lines are processed one by one, so the complete dump is never held
+    # in memory.
+    if atMergedMacros is None:
+        atMergedMacros = dict({})
+
+    reMacro = s_reMacro
+    for strLine in tLines:
+        # Most lines are no define records. A plain substring search is much
+        # cheaper than the regular expression.
+        if 'DW_MAC' not in strLine:
+            continue
+
+        tObj = reMacro.match(strLine.rstrip('\r\n'))
+        if tObj is not None:
+            strName = tObj.group(1)
+            strValue = tObj.group(2)
+
+            # Does the macro already exist?
+            strOldValue = atMergedMacros.get(strName, strValue)
+            if strOldValue is not None and strOldValue != strValue:
+                # The macro exists more than one time with different
+                # values. Now that's a problem.
+                atMergedMacros[strName] = None
+            elif strName not in atMergedMacros:
+                atMergedMacros[strName] = strValue
+
+    return atMergedMacros
+
+
+def __decode_lines(tStream):
+    # Decode a binary stream line by line. This works with the pipes of
+    # Python 2 and 3. Use readline instead of the file iterator, as the
+    # iterator of Python 2 reads ahead in large blocks.
+    for strLine in iter(tStream.readline, b''):
+        yield strLine.decode('utf-8', 'replace')
+
+
+def __read_macro_definitions(env, strFileName):
     aCmd = [env['READELF'], '--debug-dump=macro', strFileName]
     proc = subprocess.Popen(aCmd, stdout=subprocess.PIPE)
-    strOutput = proc.communicate()[0].decode("utf-8", "replace")
 
     time_start = datetime.datetime.now()
 
-    # All macros are collected in this dict.
-    atMergedMacros = dict({})
-
-    # FIXME: Macro extraction should respect different files.
-    # NOTE: This matches only macros without parameter.
-    areMacro = [
-        re.compile(
-            r'\s+DW_MACINFO_define - lineno : \d+ macro : (\w+)\s+(.*)'
-        ),
-        re.compile(
-            r'\s+DW_MACRO_GNU_define_indirect - lineno : \d+ '
-            r'macro : (\w+)\s+(.*)'
-        ),
-        # match gcc 9.2 output
-        re.compile(
-            r'\s+DW_MACRO_define_strp - lineno : \d+ macro : (\w+)\s+(.*)'
+    # Parse the output while readelf is still writing it.
+    try:
+        atMergedMacros = merge_macro_definitions(
+            __decode_lines(proc.stdout)
         )
-    ]
-    # Loop over all lines in the ".debug_macinfo" section.
-    for strLine in strOutput.split(os.linesep):
-        # Is this a new element?
-        for reMacro in areMacro:
-            tObj = reMacro.match(strLine)
-            if tObj is not None:
-                strName = tObj.group(1)
-                strValue = tObj.group(2)
-
-                # Does the macro already exist?
-                if strName in atMergedMacros:
-                    # Yes, it exists already. Is the value the same?
-                    if(
-                        atMergedMacros[strName] is not None and
-                        atMergedMacros[strName] != strValue
-                    ):
-                        # The macro exists more than one time with different
-                        # values. Now that's a problem.
-                        atMergedMacros[strName] = None
-                else:
-                    atMergedMacros[strName] = strValue
+    finally:
+        proc.stdout.close()
+        proc.wait()
 
     time_end = datetime.datetime.now()
     print('Time used:', str(time_end - time_start))
@@ -336,6 +501,10 @@ def get_macro_definitions(env, strFileName):
     return atMergedMacros
 
 
+def get_cache_statistics():
+    return tElfCache.get_statistics()
+
+
 def get_load_address(atSegments):
     # Set an invalid lma
     ulLowestLma = 0x100000000
@@ -379,6 +548,26 @@ def get_estimated_bin_size(atSegments):
 
 
 def get_exec_address(env, strElfFileName):
+    return __get_cache(env).get(
+        strElfFileName,
+        'exec_address',
+        None,
+        lambda: __read_exec_address(env, strElfFileName)
+    )
+
+
+def __read_exec_address(env, strElfFileName):
+    tElf = __open_elf(strElfFileName)
+    if tElf is not None:
+        # Prefer the global symbol like the readelf based version below.
+        tResult = tElf.get_start_symbol()
+        if tResult is None:
+            tResult = tElf.get_entry_point()
+        return tResult
+    return __get_exec_address_readelf(env, strElfFileName)
+
+
+def __get_exec_address_readelf(env, strElfFileName):
     # Get the start address.
     # Try the global symbol first, then fall back to the file header.
     # The global symbol is better, as it holds not only the plain address, but
@@ -29,10 +29,8 @@ import math
 import os
 import os.path
 import re
-import platform
-import subprocess
+import shutil
 import sys
-import tempfile
 import xml.dom.minidom
 import xml.etree.ElementTree
 
@@ -40,6 +38,95 @@ from . import patch_definitions
 from . import option_compiler
 from . import elf_support
 from . import snippet_library
+from . import crypto_backend
+from . import chunk_cache
+
+# The thread pool is not available on Python 2 without the "futures"
+# backport. Build all chunks one after the other in this case.
+try:
+    import concurrent.futures
+    fHaveConcurrentFutures = True
+except ImportError:
+    fHaveConcurrentFutures = False
+
+
+def __crc7_table():
+    atTable = []
+    for uiByte in range(0, 256):
+        ucCrc = uiByte
+        for uiBitCnt in range(0, 8):
+            ucBit = ucCrc & 0x80
+            ucCrc = (ucCrc << 1) & 0xff
+            if ucBit != 0:
+                ucCrc ^= 0x07
+        atTable.append(ucCrc)
+    return tuple(atTable)
+
+
+def __crc16_table():
+    atTable = []
+    for uiByte in range(0, 256):
+        usCrc = uiByte << 8
+        for uiBitCnt in range(0, 8):
+            if (usCrc & 0x8000) != 0:
+                usCrc = ((usCrc << 1) ^ 0x1021) & 0xffff
+            else:
+                usCrc = (usCrc << 1) & 0xffff
+        atTable.append(usCrc)
+    return tuple(atTable)
+
+
+# The lookup tables for the CRC7 of the SECMEM zones and the CRC16 of the
+# netX56 option chunks. Each entry is the CRC of one byte.
+s_aucCrc7Table = __crc7_table()
+s_ausCrc16Table = __crc16_table()
+
+# All compiled chunks are shared through this cache. It is only used if
+# env['CHUNK_CACHE'] names a database.
+tChunkCache = chunk_cache.ChunkCache()
+
+
+def __crc_bytes(atData):
+    # Get the bytes of atData as numbers. Strings with one character per
+    # byte are also accepted.
+    if sys.version_info.major > 2:
+        # Read the data without a copy.
+        if isinstance(atData, str):
+            atData = bytearray([ord(cByte) for cByte in atData])
+        return memoryview(atData).cast('B')
+
+    # Python 2 has no memoryview.cast and its arrays do not support the
+    # new buffer protocol. Copy the data to a bytearray.
+    if isinstance(atData, array.array):
+        atData = atData.tostring()
+    elif isinstance(atData, memoryview):
+        atData = atData.tobytes()
+    return bytearray(atData)
+
+
+def crc7(atData):
+    """ Get the CRC of the netX10/51/52 SECMEM zones.
+
+    atData can be bytes, a bytearray, a memoryview or an array of bytes.
+    """
+    aucTable = s_aucCrc7Table
+    ucCrc = 0
+    for ucByte in __crc_bytes(atData):
+        ucCrc = aucTable[ucCrc ^ ucByte]
+    return ucCrc
+
+
+def crc16(atData):
+    """ Get the CRC16 (CCITT) of the netX56 option chunks.
+
+    atData can be bytes, a bytearray, a memoryview or an array of bytes.
+    """
+    ausTable = s_ausCrc16Table
+    usCrc = 0
+    for ucByte in __crc_bytes(atData):
+        usCrc = ((usCrc << 8) & 0xffff) ^ ausTable[(usCrc >> 8) ^ ucByte]
+    return usCrc
+
 
 class ResolveDefines(ast.NodeTransformer):
     __atDefines = None
@@ -96,6 +183,13 @@ class HbootImage:
 
     __cSnippetLibrary = None
 
+    # This is a cache of all instantiated snippets. It maps the group,
+    # artifact, version and parameters to the parsed XML and the snippet
+    # file.
+    __atSnippetCache = None
+    __uiSnippetCacheHits = None
+    __uiSnippetCacheMisses = None
+
     __astrDependencies = None
 
     __strNetxType = None
@@ -113,9 +207,13 @@ class HbootImage:
     __sizHashDw = None
 
     __XmlKeyromContents = None
-    __cfg_openssl = None
-    __cfg_openssloptions = None
-    __fOpensslRandOff = False
+
+    # The decoded keys from the keyrom. This maps the index to the DER data.
+    __atKeyromKeys = None
+
+    # The backend for signatures and the analysis of keys. It is an instance
+    # of one of the classes in the crypto_backend module.
+    __tCryptoBackend = None
 
     # This is the revision for the netX10, netX51 and netX52 Secmem zone.
     __SECMEM_ZONE2_REV1_0 = 0x81
@@ -138,6 +236,12 @@ class HbootImage:
 
     __resolver = None
 
+    # This matches a comma separated list of plain decimal and hex numbers.
+    __reNumericLiteralList = re.compile(
+        r'\s*(?:0[xX][0-9a-fA-F]+|[1-9][0-9]*|0)\s*'
+        r'(?:,\s*(?:0[xX][0-9a-fA-F]+|[1-9][0-9]*|0)\s*)*$'
+    )
+
     __ulStartOffset = 0
 
     __strDevice = None
@@ -150,17 +254,59 @@ class HbootImage:
     __ulMinImageSizeFillValue = None
     __ulMaxImageSize = None
 
+    # The maximum number of threads for building chunks. "None" uses the
+    # default of the thread pool, 1 builds all chunks in the main thread.
+    __sizJobs = None
+
+    # These chunks do not depend on their position in the image. They are
+    # built before the layout pass.
+    __astrPrebuildChunks = [
+        'Data',
+        'Text',
+        'Execute'
+    ]
+
+    # These chunks depend on the offset. Only their data is extracted
+    # before the layout pass.
+    __astrPrefetchChunks = [
+        'XIP'
+    ]
+
+    # These chunks change the state of the image. They are always built
+    # and never taken from the chunk cache.
+    __astrUncachedChunks = [
+        'SkipIncomplete'
+    ]
+
+    # Increment this if the format of any chunk changes. It invalidates all
+    # entries in the chunk cache.
+    __CHUNK_CACHE_VERSION = 1
+
+    # The patch definition and keyrom files. They are part of the chunk
+    # cache configuration.
+    __astrConfigurationFiles = None
+
+    # The digest of all settings which influence the chunks. It is "None"
+    # if the chunk cache is not used.
+    __strChunkCacheConfig = None
+    __uiChunkCacheHits = None
+    __uiChunkCacheMisses = None
+
     def __init__(self, tEnv, strNetxType, **kwargs):
         strPatchDefinition = None
         strKeyromFile = None
         strCfgOpenssl = 'openssl'
         astrIncludePaths = []
         astrSnippetSearchPaths = []
+        strSnippetDatabase = ':memory:'
+        astrSnippetExcludes = None
         atKnownFiles = {}
         atGlobalDefines = {}
         atOpensslOptions = []
         fVerbose = False
         fOpensslRandOff = False
+        strCryptoBackend = 'auto'
+        sizJobs = None
 
         # Parse the kwargs.
         for strKey, tValue in iter(kwargs.items()):
@@ -178,6 +324,18 @@ class HbootImage:
                 else:
                     astrSnippetSearchPaths.extend(tValue)
 
+            elif strKey == 'sniplib_cache':
+                if tValue is not None:
+                    strSnippetDatabase = tValue
+
+            elif strKey == 'sniplib_excludes':
+                if tValue is None:
+                    pass
+                elif isinstance(tValue, ("".__class__, u"".__class__)):
+                    astrSnippetExcludes = [tValue]
+                else:
+                    astrSnippetExcludes = list(tValue)
+
             elif strKey == 'includes':
                 if tValue is None:
                     pass
@@ -207,13 +365,21 @@ class HbootImage:
             elif strKey == 'opensslrandoff':
                 fOpensslRandOff = bool(tValue)
 
+            elif strKey == 'crypto_backend':
+                if tValue is not None:
+                    strCryptoBackend = tValue
+
+            elif strKey == 'jobs':
+                if tValue is not None:
+                    sizJobs = int(tValue)
+
         # Set the default search path if nothing was specified.
         if len(astrSnippetSearchPaths) == 0:
             astrSnippetSearchPaths = ['sniplib']
 
         self.__fVerbose = fVerbose
 
-        self.__fOpensslRandOff = fOpensslRandOff
+        self.__sizJobs = sizJobs
 
         # Do not override anything in the pre-calculated header yet.
         self.__atHeaderOverride = [None] * 16
@@ -233,11 +399,14 @@ class HbootImage:
         # Set the defines.
         self.__atGlobalDefines = atGlobalDefines
 
-        # Set the OpenSSL options.
-        self.__cfg_openssloptions = atOpensslOptions
-
-        # Set the OpenSSL Path.
-        self.__cfg_openssl = strCfgOpenssl
+        # Select the backend for signatures. The OpenSSL path and options
+        # are only used by the "openssl" backend.
+        self.__tCryptoBackend = crypto_backend.get_backend(
+            strCryptoBackend,
+            strCfgOpenssl,
+            atOpensslOptions,
+            fOpensslRandOff
+        )
 
         if self.__fVerbose:
             print('[HBootImage] Configuration: netX type = %s' % strNetxType)
@@ -289,9 +458,11 @@ class HbootImage:
             self.__cPatchDefinitions.read_patch_definition(strPatchDefinition)
 
         self.__cSnippetLibrary = snippet_library.SnippetLibrary(
-            ':memory:',
+            strSnippetDatabase,
             astrSnippetSearchPaths,
-            debug=self.__fVerbose
+            debug=self.__fVerbose,
+            excludes=astrSnippetExcludes,
+            jobs=sizJobs
         )
 
         self.__strNetxType = strNetxType
@@ -310,6 +481,8 @@ class HbootImage:
         # Initialize the include paths from the environment.
         self.__astrIncludePaths = astrIncludePaths
 
+        self.__astrConfigurationFiles = [strPatchDefinition, strKeyromFile]
+
         # Read the keyrom file if specified.
         if strKeyromFile is not None:
             if self.__fVerbose:
@@ -320,9 +493,15 @@ class HbootImage:
             strXml = tFile.read()
             tFile.close()
             self.__XmlKeyromContents = xml.etree.ElementTree.fromstring(strXml)
+            self.__atKeyromKeys = {}
 
         self.__resolver = ResolveDefines()
 
+        # Start with an empty snippet cache.
+        self.__atSnippetCache = {}
+        self.__uiSnippetCacheHits = 0
+        self.__uiSnippetCacheMisses = 0
+
     def __get_tag_id(self, cId0, cId1, cId2, cId3):
         # Combine the 4 ID characters to a 32 bit value.
         ulId = (
@@ -377,6 +556,20 @@ class HbootImage:
             tResult = tXml.documentElement
         return tResult
 
+    def __replace_node(self, tOldNode, tNewRootNode):
+        # Move all children of the new root node in front of the old node.
+        # The new root node is a fresh parse result, so the children are
+        # moved and not cloned.
+        tParentNode = tOldNode.parentNode
+        atNewNodes = list(tNewRootNode.childNodes)
+        for tNode in atNewNodes:
+            tParentNode.insertBefore(tNode, tOldNode)
+
+        # Remove the old node.
+        tParentNode.removeChild(tOldNode)
+
+        return atNewNodes
+
     def __preprocess_snip(self, tSnipNode):
         # Get the group, artifact and optional revision.
         strGroup = tSnipNode.getAttribute('group')
@@ -438,44 +631,59 @@ class HbootImage:
                         )
                     )
 
-        # Search the snippet.
-        tSnippetAttr = self.__cSnippetLibrary.find(
+        # The same snippet is often instantiated with the same parameters.
+        # It depends only on the global defines and the parameters, so the
+        # parsed result can be reused.
+        tCacheKey = (
             strGroup,
             strArtifact,
             strVersion,
-            atParameter
+            frozenset(atParameter.items())
         )
-        strSnippetText = tSnippetAttr[0]
-        if strSnippetText is None:
-            raise Exception('Snippet not found!')
+        if tCacheKey in self.__atSnippetCache:
+            self.__uiSnippetCacheHits += 1
+            tSnippetNode, strSnippetAbsFile = self.__atSnippetCache[tCacheKey]
+        else:
+            self.__uiSnippetCacheMisses += 1
+
+            # Search the snippet.
+            tSnippetAttr = self.__cSnippetLibrary.find(
+                strGroup,
+                strArtifact,
+                strVersion,
+                atParameter
+            )
+            strSnippetText = tSnippetAttr[0]
+            if strSnippetText is None:
+                raise Exception('Snippet not found!')
+
+            # Get the list of key/value pairs for the replacement.
+            atReplace = {}
+            atReplace.update(self.__atGlobalDefines)
+            atReplace.update(tSnippetAttr[1])
+
+            # Replace and convert to XML.
+            tSnippetNode = self.__plaintext_to_xml_with_replace(
+                strSnippetText,
+                atReplace,
+                False
+            )
 
-        # Get the list of key/value pairs for the replacement.
-        atReplace = {}
-        atReplace.update(self.__atGlobalDefines)
-        atReplace.update(tSnippetAttr[1])
+            strSnippetAbsFile = tSnippetAttr[2]
+            self.__atSnippetCache[tCacheKey] = (
+                tSnippetNode,
+                strSnippetAbsFile
+            )
 
-        # Replace and convert to XML.
-        tSnippetNode = self.__plaintext_to_xml_with_replace(
-            strSnippetText,
-            atReplace,
-            False
-        )
+        # The cached node must not be modified. Work on a copy.
+        tSnippetNode = tSnippetNode.cloneNode(True)
 
         # Add the snippet file to the dependencies.
-        strSnippetAbsFile = tSnippetAttr[2]
         if strSnippetAbsFile not in self.__astrDependencies:
             self.__astrDependencies.append(strSnippetAbsFile)
 
-        # Get the parent node of the "Snip" node.
-        tParentNode = tSnipNode.parentNode
-
         # Replace the "Snip" node with the snippet contents.
-        for tNode in tSnippetNode.childNodes:
-            tClonedNode = tNode.cloneNode(True)
-            tParentNode.insertBefore(tClonedNode, tSnipNode)
-
-        # Remove the old "Snip" node.
-        tParentNode.removeChild(tSnipNode)
+        return self.__replace_node(tSnipNode, tSnippetNode)
 
     def __preprocess_include(self, tIncludeNode):
         # Get the name.
@@ -535,16 +743,8 @@ class HbootImage:
         if strAbsIncludeName not in self.__astrDependencies:
             self.__astrDependencies.append(strAbsIncludeName)
 
-        # Get the parent node of the "Include" node.
-        tParentNode = tIncludeNode.parentNode
-
         # Replace the "Include" node with the include file contents.
-        for tNode in tNewNode.childNodes:
-            tClonedNode = tNode.cloneNode(True)
-            tParentNode.insertBefore(tClonedNode, tIncludeNode)
-
-        # Remove the old "Include" node.
-        tParentNode.removeChild(tIncludeNode)
+        return self.__replace_node(tIncludeNode, tNewNode)
 
     def __preprocess(self, tXmlDocument):
         if self.__strNetxType == 'NETX90_MPW':
@@ -561,34 +761,51 @@ class HbootImage:
                     '<?xml version="1.0" encoding="utf-8"?><Root>%s</Root>' %
                     strNewText
                 )
-                tParentNode = tReplaceNode.parentNode
-                for tChildNode in tNewXml.documentElement.childNodes:
-                    tClonedNode = tChildNode.cloneNode(True)
-                    tParentNode.insertBefore(tClonedNode, tReplaceNode)
-                # Remove the old "StartAPP" node.
-                tParentNode.removeChild(tReplaceNode)
-
-        # Look for all 'Snip' nodes repeatedly until the maximum count is
-        # reached or no more 'Snip' nodes are found.
-        uiMaximumDepth = 100
-        uiDepth = 0
-        fFoundPreproc = True
-        while fFoundPreproc is True:
-            atSnipNodes = tXmlDocument.getElementsByTagName('Snip')
-            atIncludeNodes = tXmlDocument.getElementsByTagName('Include')
-            if (len(atSnipNodes) == 0) and (len(atIncludeNodes) == 0):
-                fFoundPreproc = False
-            elif uiDepth >= uiMaximumDepth:
-                raise Exception(
-                    'Too many nested preprocessor directives found! '
-                    'The maximum nesting depth is %d.' % uiMaximumDepth
+                self.__replace_node(tReplaceNode, tNewXml.documentElement)
+
+        # Expand all 'Snip' and 'Include' nodes in one walk over the
+        # document.
+        self.__preprocess_children(tXmlDocument, 0)
+
+        if self.__fVerbose:
+            print(
+                '[HBootImage] Snippet cache: %d reused, %d parsed' % (
+                    self.__uiSnippetCacheHits,
+                    self.__uiSnippetCacheMisses
                 )
+            )
+
+    def __preprocess_node(self, tNode, uiDepth):
+        # The maximum nesting depth of snippets and includes.
+        uiMaximumDepth = 100
+
+        if tNode.nodeType == tNode.ELEMENT_NODE:
+            strTag = tNode.localName
+            if (strTag == 'Snip') or (strTag == 'Include'):
+                if uiDepth >= uiMaximumDepth:
+                    raise Exception(
+                        'Too many nested preprocessor directives found! '
+                        'The maximum nesting depth is %d.' % uiMaximumDepth
+                    )
+                if strTag == 'Snip':
+                    atNewNodes = self.__preprocess_snip(tNode)
+                else:
+                    atNewNodes = self.__preprocess_include(tNode)
+
+                # Only the new nodes can contain more directives.
+                for tNewNode in atNewNodes:
+                    self.__preprocess_node(tNewNode, uiDepth + 1)
             else:
-                uiDepth += 1
-                for tNode in atSnipNodes:
-                    self.__preprocess_snip(tNode)
-                for tNode in atIncludeNodes:
-                    self.__preprocess_include(tNode)
+                self.__preprocess_children(tNode, uiDepth)
+
+    def __preprocess_children(self, tParentNode, uiDepth):
+        # Get the next sibling before processing the node. The node might be
+        # replaced.
+        tNode = tParentNode.firstChild
+        while tNode is not None:
+            tNextNode = tNode.nextSibling
+            self.__preprocess_node(tNode, uiDepth)
+            tNode = tNextNode
 
     BUS_SPI = 1
     BUS_IFlash = 2
@@ -684,7 +901,7 @@ class HbootImage:
         aBootBlock[5] = ulFlashInfo
         aBootBlock[2] = ulFlashOffset
 
-    def __build_standard_header(self, atChunks):
+    def __build_standard_header(self, atChunks, atEndMarker):
 
         ulMagicCookie = None
         ulSignature = None
@@ -740,11 +957,16 @@ class HbootImage:
                 'configured, please update the HBOOT image compiler.'
             )
 
-        # Get the hash for the image.
+        # Get the hash for the image. It covers the chunks and the end
+        # marker.
         tHash = hashlib.sha224()
-        tHash.update(atChunks.tostring())
+        tHash.update(atChunks)
+        tHash.update(atEndMarker)
         aulHash = array.array('I', tHash.digest())
 
+        # The size of the chunks includes the end marker.
+        sizChunksDw = len(atChunks) + len(atEndMarker)
+
         # Get the parameter0 value.
         # For now only the lower 4 bits are defined. They set the number of
         # hash DWORDs minus 1.
@@ -756,7 +978,7 @@ class HbootImage:
         aBootBlock[0x01] = 0                    # reserved
         aBootBlock[0x02] = 0                    # reserved
         aBootBlock[0x03] = 0                    # reserved
-        aBootBlock[0x04] = len(atChunks)        # chunks dword size
+        aBootBlock[0x04] = sizChunksDw          # chunks dword size
         aBootBlock[0x05] = 0                    # reserved
         aBootBlock[0x06] = ulSignature          # The image signature.
         aBootBlock[0x07] = ulParameter0         # Image parameters.
@@ -826,10 +1048,37 @@ class HbootImage:
         if sizNewData < sizMinimum:
             aucBuffer.extend([0] * (sizMinimum - sizNewData))
 
+    def __parse_numeric_list(self, strList, strTypeCode):
+        # Parse a comma separated list of numbers to an array with the
+        # type code strTypeCode and return the data.
+        sizBits = 8 * array.array(strTypeCode).itemsize
+        ulMaximum = (1 << sizBits) - 1
+
+        astrNumbers = strList.split(',')
+        if self.__reNumericLiteralList.match(strList) is not None:
+            # Lists with only plain numbers are converted in one step.
+            aulNumbers = [int(strNumber, 0) for strNumber in astrNumbers]
+        else:
+            aulNumbers = [
+                self.__parse_numeric_expression(strNumber.strip())
+                for strNumber in astrNumbers
+            ]
+
+        # Check the range of all elements.
+        if (min(aulNumbers) < 0) or (max(aulNumbers) > ulMaximum):
+            for strNumber, ulNumber in zip(astrNumbers, aulNumbers):
+                if (ulNumber < 0) or (ulNumber > ulMaximum):
+                    raise Exception(
+                        'The element "%s" does not fit into %d bits.' % (
+                            strNumber.strip(),
+                            sizBits
+                        )
+                    )
+
+        return array.array(strTypeCode, aulNumbers).tostring()
+
     def __parse_numeric_expression(self, strExpression):
-        tAstNode = ast.parse(strExpression, mode='eval')
-        tAstResolved = self.__cPatchDefinitions.resolve_constants(tAstNode)
-        ulResult = eval(compile(tAstResolved, 'lala', mode='eval'))
+        ulResult = self.__cPatchDefinitions.evaluate_expression(strExpression)
         # TODO: is this really necessary? Maybe ast.literal_eval throws
         # something already.
         if ulResult is None:
@@ -915,17 +1164,6 @@ class HbootImage:
         atData.append((ulValue >> 16) & 0xff)
         atData.append((ulValue >> 24) & 0xff)
 
-    def __crc16(self, strData):
-        usCrc = 0
-        for uiCnt in range(0, len(strData)):
-            ucByte = ord(strData[uiCnt])
-            usCrc = (usCrc >> 8) | ((usCrc & 0xff) << 8)
-            usCrc ^= ucByte
-            usCrc ^= (usCrc & 0xff) >> 4
-            usCrc ^= (usCrc & 0x0f) << 12
-            usCrc ^= ((usCrc & 0xff) << 4) << 1
-        return usCrc
-
     def __build_chunk_options(self, tChunkAttributes, atParserState,
                               uiChunkIndex, atAllChunks):
         tChunkNode = tChunkAttributes['tNode']
@@ -955,7 +1193,7 @@ class HbootImage:
                 aucChunk.extend(aucPadding)
 
                 # Get the CRC16 for the chunk.
-                usCrc = self.__crc16(aucChunk.tostring())
+                usCrc = crc16(aucChunk)
                 aucChunk.append((usCrc >> 8) & 0xff)
                 aucChunk.append(usCrc & 0xff)
 
@@ -988,7 +1226,7 @@ class HbootImage:
 
                 # Get the hash for the chunk.
                 tHash = hashlib.sha384()
-                tHash.update(atChunk.tostring())
+                tHash.update(atChunk)
                 strHash = tHash.digest()
                 aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
                 atChunk.extend(aulHash)
@@ -1017,7 +1255,7 @@ class HbootImage:
 
                 # Get the hash for the chunk.
                 tHash = hashlib.sha384()
-                tHash.update(atChunk.tostring())
+                tHash.update(atChunk)
                 strHash = tHash.digest()
                 aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
                 atChunk.extend(aulHash)
@@ -1069,35 +1307,11 @@ class HbootImage:
             pulLoadAddress = None
 
         # Extract the binary.
-        tBinFile, strBinFileName = tempfile.mkstemp()
-        os.close(tBinFile)
-
-        astrCmd = [
-            self.__tEnv['OBJCOPY'],
-            '--output-target=binary'
-        ]
-        if astrSegmentsToDump is not None:
-            for strSegment in astrSegmentsToDump:
-                astrCmd.append('--only-section=%s' % strSegment)
-        astrCmd.append(strAbsFilePath)
-        astrCmd.append(strBinFileName)
-        # subprocess.check_call(astrCmd)
-
-        try:
-            subprocess.check_call(astrCmd)
-        except Exception as e:
-            print("Failed to call external program:")
-            print(astrCmd)
-            print(e)
-            raise
-
-        # Get the application data.
-        tBinFile = open(strBinFileName, 'rb')
-        strData = tBinFile.read()
-        tBinFile.close()
-
-        # Remove the temp file.
-        os.remove(strBinFileName)
+        strData = elf_support.get_binary(
+            self.__tEnv,
+            strAbsFilePath,
+            astrSegmentsToDump
+        )
 
         # Print an info message if the extracted data is empty.
         if len(strData) == 0:
@@ -1439,7 +1653,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -1611,15 +1825,7 @@ class HbootImage:
                     if strDataUint is None:
                         raise Exception('No text in node "UInt32" found!')
 
-                    astrNumbers = strDataUint.split(',')
-                    aulNumbers = array.array('I')
-                    for strNumber in astrNumbers:
-                        ulNum = self.__parse_numeric_expression(
-                            strNumber.strip()
-                        )
-                        aulNumbers.append(ulNum)
-
-                    strData = aulNumbers.tostring()
+                    strData = self.__parse_numeric_list(strDataUint, 'I')
 
                 elif tNode.localName == 'UInt16':
                     if fWantLoadAddress is True:
@@ -1638,15 +1844,7 @@ class HbootImage:
                     if strDataUint is None:
                         raise Exception('No text in node "UInt16" found!')
 
-                    astrNumbers = strDataUint.split(',')
-                    ausNumbers = array.array('H')
-                    for strNumber in astrNumbers:
-                        usNum = self.__parse_numeric_expression(
-                            strNumber.strip()
-                        )
-                        ausNumbers.append(usNum)
-
-                    strData = ausNumbers.tostring()
+                    strData = self.__parse_numeric_list(strDataUint, 'H')
 
                 elif tNode.localName == 'UInt8':
                     if fWantLoadAddress is True:
@@ -1665,15 +1863,7 @@ class HbootImage:
                     if strDataUint is None:
                         raise Exception('No text in node "UInt8" found!')
 
-                    astrNumbers = strDataUint.split(',')
-                    aucNumbers = array.array('B')
-                    for strNumber in astrNumbers:
-                        ucNum = self.__parse_numeric_expression(
-                            strNumber.strip()
-                        )
-                        aucNumbers.append(ucNum)
-
-                    strData = aucNumbers.tostring()
+                    strData = self.__parse_numeric_list(strDataUint, 'B')
 
                 elif tNode.localName == 'Key':
                     if fWantLoadAddress is True:
@@ -1745,15 +1935,10 @@ class HbootImage:
                                     raise Exception('No text in node '
                                                     '"UInt32" found!')
 
-                                astrNumbers = strDataUint.split(',')
-                                aulNumbers = array.array('I')
-                                for strNumber in astrNumbers:
-                                    ulNum = self.__parse_numeric_expression(
-                                        strNumber.strip()
-                                    )
-                                    aulNumbers.append(ulNum)
-
-                                strDataChunk = aulNumbers.tostring()
+                                strDataChunk = self.__parse_numeric_list(
+                                    strDataUint,
+                                    'I'
+                                )
                                 astrData.append(strDataChunk)
 
                             elif tConcatNode.localName == 'UInt16':
@@ -1766,15 +1951,10 @@ class HbootImage:
                                     raise Exception('No text in node '
                                                     '"UInt16" found!')
 
-                                astrNumbers = strDataUint.split(',')
-                                ausNumbers = array.array('H')
-                                for strNumber in astrNumbers:
-                                    usNum = self.__parse_numeric_expression(
-                                        strNumber.strip()
-                                    )
-                                    ausNumbers.append(usNum)
-
-                                strDataChunk = ausNumbers.tostring()
+                                strDataChunk = self.__parse_numeric_list(
+                                    strDataUint,
+                                    'H'
+                                )
                                 astrData.append(strDataChunk)
 
                             elif tConcatNode.localName == 'UInt8':
@@ -1787,15 +1967,10 @@ class HbootImage:
                                     raise Exception('No text in node "UInt8" '
                                                     ' found!')
 
-                                astrNumbers = strDataUint.split(',')
-                                aucNumbers = array.array('B')
-                                for strNumber in astrNumbers:
-                                    ucNum = self.__parse_numeric_expression(
-                                        strNumber.strip()
-                                    )
-                                    aucNumbers.append(ucNum)
-
-                                strDataChunk = aucNumbers.tostring()
+                                strDataChunk = self.__parse_numeric_list(
+                                    strDataUint,
+                                    'B'
+                                )
                                 astrData.append(strDataChunk)
 
                             elif tConcatNode.localName == 'Key':
@@ -1862,7 +2037,7 @@ class HbootImage:
 
             # Get the hash for the chunk.
             tHash = hashlib.sha384()
-            tHash.update(aulChunk.tostring())
+            tHash.update(aulChunk)
             strHash = tHash.digest()
             aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
             aulChunk.extend(aulHash)
@@ -1873,7 +2048,7 @@ class HbootImage:
 
             # Get the hash for the chunk.
             tHash = hashlib.sha384()
-            tHash.update(aulChunk.tostring())
+            tHash.update(aulChunk)
             strHash = tHash.digest()
 
         tChunkAttributes['fIsFinished'] = True
@@ -1902,7 +2077,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -1915,9 +2090,12 @@ class HbootImage:
                           atAllChunks):
         tChunkNode = tChunkAttributes['tNode']
 
-        # Get the data block.
-        atData = {}
-        self.__get_data_contents(tChunkNode, atData, True)
+        # Get the data block. It might be already extracted by the chunk
+        # scheduler.
+        atData = tChunkAttributes['atContents']
+        if atData is None:
+            atData = {}
+            self.__get_data_contents(tChunkNode, atData, True)
         strData = atData['data']
         pulLoadAddress = atData['load_address']
 
@@ -2029,7 +2207,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2280,7 +2458,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2348,7 +2526,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2402,7 +2580,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2550,7 +2728,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -2630,29 +2808,6 @@ class HbootImage:
             strData = strData.replace(strWhitespace, '')
         return strData
 
-    # This function gets a data block from the OpenSSL output.
-    def __openssl_get_data_block(self, strStdout, strID):
-        aucData = array.array('B')
-        tReData = re.compile('^[0-9a-fA-F]{2}(:[0-9a-fA-F]{2})*:?')
-        iState = 0
-        for strLine in iter(strStdout.splitlines()):
-            strLine = strLine.strip()
-            if iState == 0:
-                if strLine == strID:
-                    iState = 1
-            elif iState == 1:
-                tMatch = tReData.search(strLine)
-                if tMatch is None:
-                    break
-                else:
-                    for strDataHex in strLine.split(':'):
-                        strDataHexStrip = strDataHex.strip()
-                        if len(strDataHexStrip) != 0:
-                            strDataBin = binascii.unhexlify(strDataHexStrip)
-                            aucData.append(ord(strDataBin))
-
-        return aucData
-
     def __openssl_cut_leading_zero(self, aucData):
         # Does the number start with "00" and is the third digit >= 8?
         if aucData[0] == 0x00 and aucData[1] >= 0x80:
@@ -2662,26 +2817,16 @@ class HbootImage:
     def __openssl_convert_to_little_endian(self, aucData):
         aucData.reverse()
 
-    def __openssl_uncompress_field(self, aucData):
-        # The data must not be compressed.
-        if aucData[0] != 0x04:
-            raise Exception('The data is compressed. '
-                            'This is not supported yet.')
-        # Cut off the first byte.
-        aucData.pop(0)
-
-    def __openssl_cut_in_half(self, aucData):
-        # Cut the public key in equal parts.
-        sizDataHalf = len(aucData) / 2
-        aucData0 = array.array('B', aucData[:sizDataHalf])
-        aucData1 = array.array('B', aucData[sizDataHalf:])
-        return aucData0, aucData1
-
     def __keyrom_get_key(self, uiIndex):
         # This needs the keyrom data.
         if self.__XmlKeyromContents is None:
             raise Exception('No Keyrom contents specified!')
 
+        # Each key is decoded only once.
+        strKeyDER = self.__atKeyromKeys.get(uiIndex)
+        if strKeyDER is not None:
+            return strKeyDER
+
         # Find the requested key and hash.
         tNode = self.__XmlKeyromContents.find('Entry/[@index="%d"]' % uiIndex)
         if tNode is None:
@@ -2697,78 +2842,31 @@ class HbootImage:
 
         # Decode the BASE64 data. Now we have the key pair in DER format.
         strKeyDER = base64.b64decode(strKeyBase64)
+        self.__atKeyromKeys[uiIndex] = strKeyDER
 
         return strKeyDER
 
+    def __get_key_cache_path(self):
+        # The analysed keys are only stored on disk if the environment has
+        # a path for the database.
+        strKeyCachePath = None
+        if self.__tEnv is not None:
+            strKeyCachePath = self.__tEnv.get('KEY_CACHE')
+        return strKeyCachePath
+
     def __get_cert_mod_exp(self, tNodeParent, strKeyDER, fIsPublicKey):
         # Extract all information from the key.
-        if len(strKeyDER) > 1000:
-            astrCmd = [
-                self.__cfg_openssl,
-                'pkey',
-                '-inform',
-                'DER',
-                '-text',
-                '-noout'
-            ]
-        else:
-            astrCmd = [
-                self.__cfg_openssl,
-                'ec',
-                '-inform',
-                'DER',
-                '-text',
-                '-noout',
-                '-param_enc', 'explicit',
-                '-no_public'
-            ]
-        if fIsPublicKey is True:
-            astrCmd.append('-pubin')
-        if platform.system() == 'Windows':
-            tProcess = subprocess.Popen(
-                astrCmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                shell=True
-            )
-        else:
-            tProcess = subprocess.Popen(
-                astrCmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE
-            )
-        (strStdout, strStdErr) = tProcess.communicate(strKeyDER)
-        if tProcess.returncode != 0:
-            raise Exception('OpenSSL failed with return code %d.' %
-                            tProcess.returncode)
-
-        # Try to guess if this is an RSA or ECC key.
-        # The text dump of an RSA key has " modulus:", while an ECC key has
-        # "priv:".
-        iKeyTyp_1ECC_2RSA = None
+        iKeyTyp_1ECC_2RSA, atNumbers = crypto_backend.get_key_numbers(
+            self.__tCryptoBackend,
+            strKeyDER,
+            fIsPublicKey,
+            self.__get_key_cache_path()
+        )
+
         atAttr = None
-        strDecodedStdout = strStdout.decode()
-        strMatchExponent = 'publicExponent:'
-        strMatchModulus = 'modulus:'
-        if fIsPublicKey is True:
-            strMatchExponent = 'Exponent:'
-            strMatchModulus = 'Modulus:'
-        if strDecodedStdout.find(strMatchModulus) != -1:
-            # Looks like this is an RSA key.
-            iKeyTyp_1ECC_2RSA = 2
-
-            # Extract the public exponent.
-            tReExp = re.compile(
-                r'^%s\s+(\d+)\s+\(0x([0-9a-fA-F]+)\)' % strMatchExponent,
-                re.MULTILINE
-            )
-            tMatch = tReExp.search(strDecodedStdout)
-            if tMatch is None:
-                raise Exception('Can not find public exponent!')
-            ulExp = int(tMatch.group(1))
-            ulExpHex = int(tMatch.group(2), 16)
-            if ulExp != ulExpHex:
-                raise Exception('Decimal version differs from hex version!')
+        if iKeyTyp_1ECC_2RSA == crypto_backend.KEY_TYPE_RSA:
+            # Get the public exponent.
+            ulExp = atNumbers['exp']
             if (ulExp < 0) or (ulExp > 0xffffff):
                 raise Exception('The exponent exceeds the allowed range of a '
                                 '24bit unsigned integer!')
@@ -2778,10 +2876,8 @@ class HbootImage:
             strData.append((ulExp >> 16) & 0xff)
             aucExp = array.array('B', strData)
 
-            # Extract the modulus "N".
-            aucMod = self.__openssl_get_data_block(strDecodedStdout, strMatchModulus)
-            self.__openssl_cut_leading_zero(aucMod)
-            self.__openssl_convert_to_little_endian(aucMod)
+            # Get the modulus "N" in little endian.
+            aucMod = array.array('B', reversed(atNumbers['mod']))
 
             __atKnownRsaSizes = {
                 0: {'mod': 256, 'exp': 3, 'rsa': 2048},
@@ -2834,58 +2930,18 @@ class HbootImage:
                 'exp': aucExp
             }
 
-        elif strStdout.find('priv:') != -1:
-            # Looks like this is an ECC key.
-            iKeyTyp_1ECC_2RSA = 1
-
-            aucPriv = self.__openssl_get_data_block(strStdout, 'priv:')
-            self.__openssl_cut_leading_zero(aucPriv)
-            self.__openssl_convert_to_little_endian(aucPriv)
-
-            aucPub = self.__openssl_get_data_block(strStdout, 'pub:')
-            self.__openssl_uncompress_field(aucPub)
-            aucPubX, aucPubY = self.__openssl_cut_in_half(aucPub)
-            self.__openssl_convert_to_little_endian(aucPubX)
-            self.__openssl_convert_to_little_endian(aucPubY)
-
-            aucPrime = self.__openssl_get_data_block(strStdout, 'Prime:')
-            self.__openssl_cut_leading_zero(aucPrime)
-            self.__openssl_convert_to_little_endian(aucPrime)
-
-            aucA = self.__openssl_get_data_block(strStdout, 'A:')
-            self.__openssl_cut_leading_zero(aucA)
-            self.__openssl_convert_to_little_endian(aucA)
-
-            aucB = self.__openssl_get_data_block(strStdout, 'B:')
-            self.__openssl_cut_leading_zero(aucB)
-            self.__openssl_convert_to_little_endian(aucB)
-
-            strData = self.__openssl_get_data_block(
-                strStdout,
-                'Generator (uncompressed):'
-            )
-            aucGen = array.array('B', strData)
-            self.__openssl_uncompress_field(aucGen)
-            aucGenX, aucGenY = self.__openssl_cut_in_half(aucGen)
-            self.__openssl_convert_to_little_endian(aucGenX)
-            self.__openssl_convert_to_little_endian(aucGenY)
-
-            aucOrder = self.__openssl_get_data_block(strStdout, 'Order:')
-            self.__openssl_cut_leading_zero(aucOrder)
-            self.__openssl_convert_to_little_endian(aucOrder)
-
-            # Extract the cofactor.
-            tReExp = re.compile(
-                r'^Cofactor:\s+(\d+)\s+\(0x([0-9a-fA-F]+)\)',
-                re.MULTILINE
-            )
-            tMatch = tReExp.search(strStdout)
-            if tMatch is None:
-                raise Exception('Can not find cofactor!')
-            ulCofactor = int(tMatch.group(1))
-            ulCofactorHex = int(tMatch.group(2), 16)
-            if ulCofactor != ulCofactorHex:
-                raise Exception('Decimal version differs from hex version!')
+        elif iKeyTyp_1ECC_2RSA == crypto_backend.KEY_TYPE_ECC:
+            # Get all numbers in little endian.
+            aucPriv = array.array('B', reversed(atNumbers['d']))
+            aucPubX = array.array('B', reversed(atNumbers['Qx']))
+            aucPubY = array.array('B', reversed(atNumbers['Qy']))
+            aucPrime = array.array('B', reversed(atNumbers['p']))
+            aucA = array.array('B', reversed(atNumbers['a']))
+            aucB = array.array('B', reversed(atNumbers['b']))
+            aucGenX = array.array('B', reversed(atNumbers['Gx']))
+            aucGenY = array.array('B', reversed(atNumbers['Gy']))
+            aucOrder = array.array('B', reversed(atNumbers['n']))
+            ulCofactor = atNumbers['cof']
 
             __atKnownEccSizes = {
                 0: 32,
@@ -3461,53 +3517,11 @@ class HbootImage:
                 __atRootCert['RootPublicKey']['idx']
             )
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
+            # Sign the data.
+            strSignature = self.__tCryptoBackend.sign(
+                strKeyDER,
+                atData.tostring()
             )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(atData.tostring())
-            tFile.close()
-
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignature = subprocess.check_output(astrCmd)
-
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
 
             # Append the signature to the chunk.
             aulSignature = array.array('B', strSignature)
@@ -3634,53 +3648,11 @@ class HbootImage:
             # Get the key in DER encoded format.
             strKeyDER = __atCert['Key']['der']
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
+            # Sign the data.
+            strSignature = self.__tCryptoBackend.sign(
+                strKeyDER,
+                atData.tostring()
             )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(atData.tostring())
-            tFile.close()
-
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignature = subprocess.check_output(astrCmd)
-
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
 
             # Append the signature to the chunk.
             aulSignature = array.array('B', strSignature)
@@ -3833,53 +3805,11 @@ class HbootImage:
             # Get the key in DER encoded format.
             strKeyDER = __atCert['Key']['der']
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
+            # Sign the data.
+            strSignature = self.__tCryptoBackend.sign(
+                strKeyDER,
+                atData.tostring()
             )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(atData.tostring())
-            tFile.close()
-
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignature = subprocess.check_output(astrCmd)
-
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
 
             # Append the signature to the chunk.
             aulSignature = array.array('B', strSignature)
@@ -4067,53 +3997,11 @@ class HbootImage:
             # Get the key in DER encoded format.
             strKeyDER = __atCert['Key']['der']
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
+            # Sign the data.
+            strSignature = self.__tCryptoBackend.sign(
+                strKeyDER,
+                atData.tostring()
             )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(atData.tostring())
-            tFile.close()
-
-            astrCmd = [
-                self.__cfg_openssl,
-                'dgst',
-                '-sign', strPathKeypair,
-                '-keyform', 'DER',
-                '-sha384'
-            ]
-            if self.__cfg_openssloptions:
-                astrCmd.extend(self.__cfg_openssloptions)
-            if not self.__fOpensslRandOff:
-                astrCmd.extend([
-                    '-sigopt', 'rsa_padding_mode:pss',
-                    '-sigopt', 'rsa_pss_saltlen:-1'])
-            astrCmd.append(strPathSignatureInputData)
-            strSignature = subprocess.check_output(astrCmd)
-
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
 
             # Append the signature to the chunk.
             aulSignature = array.array('B', strSignature)
@@ -4205,7 +4093,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -4463,7 +4351,7 @@ class HbootImage:
 
             # Get the hash for the chunk.
             tHash = hashlib.sha384()
-            tHash.update(aulChunk.tostring())
+            tHash.update(aulChunk)
             strHash = tHash.digest()
             aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
             aulChunk.extend(aulHash)
@@ -4537,47 +4425,14 @@ class HbootImage:
             # Get the key in DER encoded format.
             strKeyDER = __atCert['Key']['der']
 
-            # Create a temporary file for the keypair.
-            iFile, strPathKeypair = tempfile.mkstemp(
-                suffix='der',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
-            )
-            os.close(iFile)
-
-            # Create a temporary file for the data to sign.
-            iFile, strPathSignatureInputData = tempfile.mkstemp(
-                suffix='bin',
-                prefix='tmp_hboot_image',
-                dir=None,
-                text=False
+            # Sign the data.
+            strSignature = self.__tCryptoBackend.sign(
+                strKeyDER,
+                aulChunk.tostring()
             )
-            os.close(iFile)
-
-            # Write the DER key to the temporary file.
-            tFile = open(strPathKeypair, 'wb')
-            tFile.write(strKeyDER)
-            tFile.close()
-
-            # Write the data to sign to the temporary file.
-            tFile = open(strPathSignatureInputData, 'wb')
-            tFile.write(aulChunk.tostring())
-            tFile.close()
 
             if iKeyTyp_1ECC_2RSA == 1:
-                astrCmd = [
-                    self.__cfg_openssl,
-                    'dgst',
-                    '-sign', strPathKeypair,
-                    '-keyform', 'DER',
-                    '-sha384'
-                ]
-                if self.__cfg_openssloptions:
-                    astrCmd.extend(self.__cfg_openssloptions)
-                astrCmd.append(strPathSignatureInputData)
-                strEccSignature = subprocess.check_output(astrCmd)
-                aucEccSignature = array.array('B', strEccSignature)
+                aucEccSignature = array.array('B', strSignature)
 
                 # Parse the signature.
                 aucSignature = self.__openssl_ecc_get_signature(
@@ -4586,29 +4441,10 @@ class HbootImage:
                 )
 
             elif iKeyTyp_1ECC_2RSA == 2:
-                astrCmd = [
-                    self.__cfg_openssl,
-                    'dgst',
-                    '-sign', strPathKeypair,
-                    '-keyform', 'DER',
-                    '-sha384'
-                ]
-                if self.__cfg_openssloptions:
-                    astrCmd.extend(self.__cfg_openssloptions)
-                if not self.__fOpensslRandOff:
-                    astrCmd.extend([
-                        '-sigopt', 'rsa_padding_mode:pss',
-                        '-sigopt', 'rsa_pss_saltlen:-1'])
-                astrCmd.append(strPathSignatureInputData)
-                strSignatureMirror = subprocess.check_output(astrCmd)
-                aucSignature = array.array('B', strSignatureMirror)
+                aucSignature = array.array('B', strSignature)
                 # Mirror the signature.
                 aucSignature.reverse()
 
-            # Remove the temp files.
-            os.remove(strPathKeypair)
-            os.remove(strPathSignatureInputData)
-
             # Append the signature to the chunk.
             aulChunk.fromstring(aucSignature.tostring())
 
@@ -4618,15 +4454,14 @@ class HbootImage:
 
     def __build_chunk_hash_table(self, tChunkAttributes, atParserState,
                                  uiChunkIndex, atAllChunks):
-        # This chunk must be build in multiple passes as it includes the hash
-        # sums of the following chunks.
+        # This chunk includes the hash sums of the following chunks.
         #
-        # In the first pass, a dummy data block is created as a placeholder.
-        # This sets the address to the correct position for the following
+        # In the layout pass only the size of the chunk is reported. This
+        # sets the address to the correct position for the following
         # chunks.
         #
-        # In the next passes the hash sum can be collected if the chunks are
-        # finished.
+        # The contents are built in the fix-up pass when all following
+        # chunks are finished.
 
         tChunkNode = tChunkAttributes['tNode']
 
@@ -4806,229 +4641,186 @@ class HbootImage:
             )
         sizChunkMinimumSizeInDwords = sizChunkMinimumInBytes / 4
 
-        uiPass = atParserState['uiPass']
-        if uiPass == 0:
-            # In pass 0 only reserve space.
-            aulChunk = array.array(
-                'I',
-                [0] * (int(sizChunkMinimumSizeInDwords) + int(sizFillUpInDwords))
-            )
-
-            tChunkAttributes['fIsFinished'] = False
-            tChunkAttributes['atData'] = aulChunk
-            tChunkAttributes['aulHash'] = None
+        sizAllChunks = len(atAllChunks)
+        sizHtblFirstChunk = uiChunkIndex + 1
+        sizHtblLastChunkPlus1 = sizHtblFirstChunk + ulNumberOfHashes
 
-        else:
-            sizAllChunks = len(atAllChunks)
-            sizHtblFirstChunk = uiChunkIndex + 1
-            sizHtblLastChunkPlus1 = sizHtblFirstChunk + ulNumberOfHashes
+        # Are enough chunks left?
+        if sizHtblLastChunkPlus1 > sizAllChunks:
+            raise Exception(
+                'The hash table should include the chunks [%d,%d[ '
+                'but there are only %d chunks.' % (
+                    sizHtblFirstChunk,
+                    sizHtblLastChunkPlus1,
+                    sizAllChunks
+                )
+            )
 
-            # Are enough chunks left?
-            if sizHtblLastChunkPlus1 > sizAllChunks:
+        # This is the list of chunk names which require a hash table
+        # entry. Other chunks are not allowed to prevent confusion.
+        astrAllowedChunks = [
+            'Options',         # OPTS
+            'SpiMacro',        # SPIM
+            'MemoryDeviceUp',  # MDUP
+            'Firewall',        # FRWL
+            'Skip',            # SKIP
+            'SkipIncomplete',  # This is done with a SKIP chunk.
+            'SecureCopy',      # SCPY
+            'Text',            # TEXT
+            'XIP',             # This is done with a TEXT chunk.
+            'Data',            # DATA
+            'Register',        # REGI
+            'Next',            # NEXT
+            'Execute'          # EXEC
+        ]
+        for uiHashChunkIndex in range(sizHtblFirstChunk,
+                                      sizHtblLastChunkPlus1):
+            # Is this one of the chunks which needs a hash entry?
+            strChunkName = atAllChunks[uiHashChunkIndex]['strName']
+            if strChunkName not in astrAllowedChunks:
                 raise Exception(
-                    'The hash table should include the chunks [%d,%d[ '
-                    'but there are only %d chunks.' % (
-                        sizHtblFirstChunk,
-                        sizHtblLastChunkPlus1,
-                        sizAllChunks
-                    )
+                    'A "%s" chunk can not be included in a HashTable.' %
+                    strChunkName
                 )
 
-            # This is the list of chunk names which require a hash table
-            # entry. Other chunks are not allowed to prevent confusion.
-            astrAllowedChunks = [
-                'Options',         # OPTS
-                'SpiMacro',        # SPIM
-                'MemoryDeviceUp',  # MDUP
-                'Firewall',        # FRWL
-                'Skip',            # SKIP
-                'SkipIncomplete',  # This is done with a SKIP chunk.
-                'SecureCopy',      # SCPY
-                'Text',            # TEXT
-                'XIP',             # This is done with a TEXT chunk.
-                'Data',            # DATA
-                'Register',        # REGI
-                'Next',            # NEXT
-                'Execute'          # EXEC
-            ]
+        # The size of the chunk is known now, but the contents depend on the
+        # hash sums of the following chunks. Only reserve the space here.
+        # The chunk is built in the fix-up pass after all chunks it depends
+        # on are finished.
+        tChunkAttributes['fIsFinished'] = False
+        tChunkAttributes['atData'] = None
+        tChunkAttributes['aulHash'] = None
+        tChunkAttributes['sizData'] = (
+            int(sizChunkMinimumSizeInDwords) + int(sizFillUpInDwords)
+        )
+        tChunkAttributes['auiDependencies'] = list(
+            range(sizHtblFirstChunk, sizHtblLastChunkPlus1)
+        )
+        tChunkAttributes['pfnFixup'] = self.__fixup_chunk_hash_table
+        tChunkAttributes['atFixupData'] = {
+            'atData': __atData,
+            'ulNumberOfHashes': ulNumberOfHashes,
+            'sizKeyInDwords': sizKeyInDwords,
+            'sizChunkMinimumSizeInDwords': sizChunkMinimumSizeInDwords,
+            'sizFillUpInDwords': sizFillUpInDwords
+        }
 
-            # Collect hash sums of the next chunks.
-            atHashes = []
-            for uiChunkIndex in range(sizHtblFirstChunk,
-                                      sizHtblLastChunkPlus1):
-                tAttr = atAllChunks[uiChunkIndex]
+    def __fixup_chunk_hash_table(self, tChunkAttributes, atAllChunks):
+        atFixupData = tChunkAttributes['atFixupData']
+        __atData = atFixupData['atData']
+        ulNumberOfHashes = atFixupData['ulNumberOfHashes']
+        sizKeyInDwords = atFixupData['sizKeyInDwords']
+        sizChunkMinimumSizeInDwords = atFixupData[
+            'sizChunkMinimumSizeInDwords'
+        ]
+        sizFillUpInDwords = atFixupData['sizFillUpInDwords']
+        iKeyTyp_1ECC_2RSA = __atData['Key']['iKeyTyp_1ECC_2RSA']
 
-                # Is this one of the chunks which needs a hash entry?
-                strChunkName = tAttr['strName']
-                if strChunkName not in astrAllowedChunks:
-                    raise Exception(
-                        'A "%s" chunk can not be included in a HashTable.' %
-                        strChunkName
-                    )
+        # Collect hash sums of the next chunks. All of them are finished
+        # before the fix-up is called.
+        atHashes = []
+        for uiChunkIndex in tChunkAttributes['auiDependencies']:
+            atHashes.append(atAllChunks[uiChunkIndex]['aulHash'])
 
-                # Is this chunk already finished?
-                if tAttr['fIsFinished'] is not True:
-                    # The chunk is not finished. Try again in the next pass.
-                    break
-                else:
-                    # Add the hash to the list.
-                    atHashes.append(tAttr['aulHash'])
-
-            # Found all hashes?
-            if len(atHashes) == ulNumberOfHashes:
-                # Yes, all hashes found. Now build the chunk.
-
-                # Combine all data for the chunk.
-                aucData = array.array('B')
-
-                # Info page select
-                aucData.append(__atData['TargetInfoPage'])
-                # root key index
-                aucData.append(__atData['RootKeyIndex'])
-                # Add the number of hashes.
-                aucData.append(ulNumberOfHashes)
-                # Add one dummy byte of 0x00.
-                aucData.append(0x00)
-                # Add the binding.
-                aucData.extend(__atData['Binding']['value'])
-                aucData.extend(__atData['Binding']['mask'])
-
-                if __atData['RootKeyIndex'] < 16:
-                    # Add the padded key.
-                    iKeyTyp_1ECC_2RSA = __atData['Key']['iKeyTyp_1ECC_2RSA']
-                    atAttr = __atData['Key']['atAttr']
-                    if iKeyTyp_1ECC_2RSA == 2:
-                        # Add the algorithm.
-                        aucData.append(iKeyTyp_1ECC_2RSA)
-                        # Add the strength.
-                        aucData.append(atAttr['id'])
-                        # Add the public modulus N and fill up to 64 bytes.
-                        self.__add_array_with_fillup(
-                            aucData,
-                            atAttr['mod'],
-                            512
-                        )
-                        # Add the exponent E.
-                        aucData.extend(atAttr['exp'])
-                        # Pad the key with 3 bytes.
-                        aucData.extend([0, 0, 0])
-
-                    elif iKeyTyp_1ECC_2RSA == 1:
-                        # Add the algorithm.
-                        aucData.append(iKeyTyp_1ECC_2RSA)
-                        # Add the strength.
-                        aucData.append(atAttr['id'])
-                        # Write all fields and fill up to 64 bytes.
-                        self.__add_array_with_fillup(aucData, atAttr['Qx'], 64)
-                        self.__add_array_with_fillup(aucData, atAttr['Qy'], 64)
-                        self.__add_array_with_fillup(aucData, atAttr['a'], 64)
-                        self.__add_array_with_fillup(aucData, atAttr['b'], 64)
-                        self.__add_array_with_fillup(aucData, atAttr['p'], 64)
-                        self.__add_array_with_fillup(aucData, atAttr['Gx'], 64)
-                        self.__add_array_with_fillup(aucData, atAttr['Gy'], 64)
-                        self.__add_array_with_fillup(aucData, atAttr['n'], 64)
-                        aucData.extend([0, 0, 0])
-                        # Pad the key with 3 bytes.
-                        aucData.extend([0, 0, 0])
-
-                # Append all hashes.
-                for atHash in atHashes:
-                    aucData.fromstring(atHash.tostring())
-
-                aulChunk = array.array('I')
-                # Add the ID.
-                aulChunk.append(self.__get_tag_id('H', 'T', 'B', 'L'))
-                # The size field does not include the ID and itself.
-                aulChunk.append(
-                    int(sizChunkMinimumSizeInDwords) + int(sizFillUpInDwords) - 2
-                )
-                # Add the data part.
-                aulChunk.fromstring(aucData.tostring())
-
-                # Get the key in DER encoded format.
-                strKeyDER = __atData['Key']['der']
-
-                # Create a temporary file for the keypair.
-                iFile, strPathKeypair = tempfile.mkstemp(
-                    suffix='der',
-                    prefix='tmp_hboot_image',
-                    dir=None,
-                    text=False
-                )
-                os.close(iFile)
-
-                # Create a temporary file for the data to sign.
-                iFile, strPathSignatureInputData = tempfile.mkstemp(
-                    suffix='bin',
-                    prefix='tmp_hboot_image',
-                    dir=None,
-                    text=False
+        # Combine all data for the chunk.
+        aucData = array.array('B')
+
+        # Info page select
+        aucData.append(__atData['TargetInfoPage'])
+        # root key index
+        aucData.append(__atData['RootKeyIndex'])
+        # Add the number of hashes.
+        aucData.append(ulNumberOfHashes)
+        # Add one dummy byte of 0x00.
+        aucData.append(0x00)
+        # Add the binding.
+        aucData.extend(__atData['Binding']['value'])
+        aucData.extend(__atData['Binding']['mask'])
+
+        if __atData['RootKeyIndex'] < 16:
+            # Add the padded key.
+            iKeyTyp_1ECC_2RSA = __atData['Key']['iKeyTyp_1ECC_2RSA']
+            atAttr = __atData['Key']['atAttr']
+            if iKeyTyp_1ECC_2RSA == 2:
+                # Add the algorithm.
+                aucData.append(iKeyTyp_1ECC_2RSA)
+                # Add the strength.
+                aucData.append(atAttr['id'])
+                # Add the public modulus N and fill up to 64 bytes.
+                self.__add_array_with_fillup(
+                    aucData,
+                    atAttr['mod'],
+                    512
                 )
-                os.close(iFile)
+                # Add the exponent E.
+                aucData.extend(atAttr['exp'])
+                # Pad the key with 3 bytes.
+                aucData.extend([0, 0, 0])
 
-                # Write the DER key to the temporary file.
-                tFile = open(strPathKeypair, 'wb')
-                tFile.write(strKeyDER)
-                tFile.close()
+            elif iKeyTyp_1ECC_2RSA == 1:
+                # Add the algorithm.
+                aucData.append(iKeyTyp_1ECC_2RSA)
+                # Add the strength.
+                aucData.append(atAttr['id'])
+                # Write all fields and fill up to 64 bytes.
+                self.__add_array_with_fillup(aucData, atAttr['Qx'], 64)
+                self.__add_array_with_fillup(aucData, atAttr['Qy'], 64)
+                self.__add_array_with_fillup(aucData, atAttr['a'], 64)
+                self.__add_array_with_fillup(aucData, atAttr['b'], 64)
+                self.__add_array_with_fillup(aucData, atAttr['p'], 64)
+                self.__add_array_with_fillup(aucData, atAttr['Gx'], 64)
+                self.__add_array_with_fillup(aucData, atAttr['Gy'], 64)
+                self.__add_array_with_fillup(aucData, atAttr['n'], 64)
+                aucData.extend([0, 0, 0])
+                # Pad the key with 3 bytes.
+                aucData.extend([0, 0, 0])
 
-                # Write the data to sign to the temporary file.
-                tFile = open(strPathSignatureInputData, 'wb')
-                tFile.write(aulChunk.tostring())
-                tFile.close()
+        # Append all hashes.
+        for atHash in atHashes:
+            aucData.fromstring(atHash.tostring())
 
-                if iKeyTyp_1ECC_2RSA == 1:
-                    astrCmd = [
-                        self.__cfg_openssl,
-                        'dgst',
-                        '-sign', strPathKeypair,
-                        '-keyform', 'DER',
-                        '-sha384'
-                    ]
-                    if self.__cfg_openssloptions:
-                        astrCmd.extend(self.__cfg_openssloptions)
-                    astrCmd.append(strPathSignatureInputData)
-                    strEccSignature = subprocess.check_output(astrCmd)
-                    aucEccSignature = array.array('B', strEccSignature)
-
-                    # Parse the signature.
-                    aucSignature = self.__openssl_ecc_get_signature(
-                        aucEccSignature,
-                        sizKeyInDwords * 4
-                    )
+        aulChunk = array.array('I')
+        # Add the ID.
+        aulChunk.append(self.__get_tag_id('H', 'T', 'B', 'L'))
+        # The size field does not include the ID and itself.
+        aulChunk.append(
+            int(sizChunkMinimumSizeInDwords) + int(sizFillUpInDwords) - 2
+        )
+        # Add the data part.
+        aulChunk.fromstring(aucData.tostring())
 
-                elif iKeyTyp_1ECC_2RSA == 2:
-                    astrCmd = [
-                        self.__cfg_openssl,
-                        'dgst',
-                        '-sign', strPathKeypair,
-                        '-keyform', 'DER',
-                        '-sha384'
-                    ]
-                    if self.__cfg_openssloptions:
-                        astrCmd.extend(self.__cfg_openssloptions)
-                    if not self.__fOpensslRandOff:
-                        astrCmd.extend([
-                            '-sigopt', 'rsa_padding_mode:pss',
-                            '-sigopt', 'rsa_pss_saltlen:-1'])
-                    astrCmd.append(strPathSignatureInputData)
-                    strSignatureMirror = subprocess.check_output(astrCmd)
-                    aucSignature = array.array('B', strSignatureMirror)
-                    # Mirror the signature.
-                    aucSignature.reverse()
-
-                # Remove the temp files.
-                os.remove(strPathKeypair)
-                os.remove(strPathSignatureInputData)
-
-                # Append the fill-up.
-                aulChunk.extend([0] * int(sizFillUpInDwords))
-
-                # Append the signature to the chunk.
-                aulChunk.fromstring(aucSignature.tostring())
+        # Get the key in DER encoded format.
+        strKeyDER = __atData['Key']['der']
 
-                tChunkAttributes['fIsFinished'] = True
-                tChunkAttributes['atData'] = aulChunk
-                tChunkAttributes['aulHash'] = None
+        # Sign the data.
+        strSignature = self.__tCryptoBackend.sign(
+            strKeyDER,
+            aulChunk.tostring()
+        )
+
+        if iKeyTyp_1ECC_2RSA == 1:
+            aucEccSignature = array.array('B', strSignature)
+
+            # Parse the signature.
+            aucSignature = self.__openssl_ecc_get_signature(
+                aucEccSignature,
+                sizKeyInDwords * 4
+            )
+
+        elif iKeyTyp_1ECC_2RSA == 2:
+            aucSignature = array.array('B', strSignature)
+            # Mirror the signature.
+            aucSignature.reverse()
+
+        # Append the fill-up.
+        aulChunk.extend([0] * int(sizFillUpInDwords))
+
+        # Append the signature to the chunk.
+        aulChunk.fromstring(aucSignature.tostring())
+
+        tChunkAttributes['fIsFinished'] = True
+        tChunkAttributes['atData'] = aulChunk
+        tChunkAttributes['aulHash'] = None
 
     def __build_chunk_next(self, tChunkAttributes, atParserState,
                            uiChunkIndex, atAllChunks):
@@ -5088,7 +4880,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -5132,7 +4924,7 @@ class HbootImage:
 
         # Get the hash for the chunk.
         tHash = hashlib.sha384()
-        tHash.update(aulChunk.tostring())
+        tHash.update(aulChunk)
         strHash = tHash.digest()
         aulHash = array.array('I', strHash[:self.__sizHashDw * 4])
         aulChunk.extend(aulHash)
@@ -5170,10 +4962,33 @@ class HbootImage:
             'fIsFinished': False,
             'tNode': tNode,
             'atData': None,
-            'aulHash': None
+            'aulHash': None,
+            'atContents': None,
+            # Unfinished chunks report their size and a fix-up function
+            # which builds the data once all dependencies are finished.
+            'sizData': None,
+            'auiDependencies': [],
+            'pfnFixup': None,
+            'atFixupData': None,
+            # The key of the chunk in the chunk cache if it was taken from
+            # there or stored there.
+            'strCacheKey': None
         }
         atChunks.append(tAttr)
 
+    def __get_chunk_size(self, tAttr):
+        # Get the size of the chunk in elements of the data array. This are
+        # bytes for SECMEM images and DWORDs for all other images.
+        if tAttr['atData'] is not None:
+            sizData = len(tAttr['atData'])
+        elif tAttr['sizData'] is not None:
+            sizData = tAttr['sizData']
+        else:
+            raise Exception(
+                'The %s chunk has neither data nor a size.' % tAttr['strName']
+            )
+        return sizData
+
     def __collect_chunks(self, tImageNode):
         atChunks = []
 
@@ -5684,6 +5499,197 @@ class HbootImage:
 
         return atChunks
 
+    def __chunk_cache_open(self):
+        # The chunk cache is only used with a database.
+        strChunkCachePath = None
+        if self.__tEnv is not None:
+            strChunkCachePath = self.__tEnv.get('CHUNK_CACHE')
+        if strChunkCachePath is None:
+            self.__strChunkCacheConfig = None
+            return
+        tChunkCache.set_database(strChunkCachePath)
+
+        # Collect all settings which influence the chunks, but are not part
+        # of the chunk definitions.
+        tHash = hashlib.sha384()
+        for strValue in [
+            str(self.__CHUNK_CACHE_VERSION),
+            self.__strNetxType,
+            str(self.__tImageType),
+            str(self.__sizHashDw),
+            repr(sorted(self.__atGlobalDefines.items())),
+            repr(sorted(self.__atKnownFiles.items())),
+            repr(self.__astrIncludePaths)
+        ]:
+            tHash.update(strValue.encode('utf-8'))
+            tHash.update(b'\0')
+        for strFile in self.__astrConfigurationFiles:
+            strDigest = 'none'
+            if strFile is not None:
+                tFileKey, strDigest = elf_support.tElfCache.get_file_digest(
+                    strFile
+                )
+            tHash.update(strDigest.encode('utf-8'))
+            tHash.update(b'\0')
+        self.__strChunkCacheConfig = tHash.hexdigest()
+        self.__uiChunkCacheHits = 0
+        self.__uiChunkCacheMisses = 0
+
+    def __get_chunk_cache_key(self, tChunkAttributes, ulOffset):
+        # Get the key of a chunk in the chunk cache. It is made of the XML
+        # definition of the chunk, the contents of all files it refers to
+        # and the offset of the chunk. Chunks which do not depend on their
+        # offset use "None".
+        # Return "None" if the chunk can not be cached.
+        if self.__strChunkCacheConfig is None:
+            return None
+        if tChunkAttributes['strName'] in self.__astrUncachedChunks:
+            return None
+        tNode = tChunkAttributes['tNode']
+        if tNode is None:
+            return None
+
+        tHash = hashlib.sha384()
+        tHash.update(self.__strChunkCacheConfig.encode('utf-8'))
+        tHash.update(tChunkAttributes['strName'].encode('utf-8'))
+        tHash.update(b'\0')
+        tHash.update(tNode.toxml().encode('utf-8'))
+        tHash.update(b'\0')
+        tHash.update(repr(ulOffset).encode('utf-8'))
+        for tFileNode in tNode.getElementsByTagName('File'):
+            strFileName = tFileNode.getAttribute('name')
+            if len(strFileName) == 0:
+                return None
+            strAbsFilePath = self.__find_file(strFileName)
+            if (strAbsFilePath is None) or \
+               (os.path.isfile(strAbsFilePath) is not True):
+                # Let the chunk parser report the missing file.
+                return None
+            tFileKey, strDigest = elf_support.tElfCache.get_file_digest(
+                strAbsFilePath
+            )
+            tHash.update(b'\0')
+            tHash.update(strDigest.encode('utf-8'))
+        return tHash.hexdigest()
+
+    def __get_chunk_fixup_cache_key(self, strCacheKey, tChunkAttributes,
+                                    atAllChunks):
+        # A fix-up depends on the chunk itself and the hashes of all chunks
+        # it covers. Any change in these chunks invalidates the entry.
+        if strCacheKey is None:
+            return None
+        tHash = hashlib.sha384()
+        tHash.update(strCacheKey.encode('utf-8'))
+        for uiIndex in tChunkAttributes['auiDependencies']:
+            aulHash = atAllChunks[uiIndex]['aulHash']
+            if aulHash is None:
+                return None
+            tHash.update(aulHash)
+        return tHash.hexdigest()
+
+    def __chunk_cache_restore(self, tChunkAttributes, strCacheKey,
+                              uiChunkIndex):
+        # Finish the chunk with the data from the chunk cache.
+        # Return "True" if the chunk was found.
+        fIsCached = False
+        if strCacheKey is not None:
+            tValue = tChunkCache.get(strCacheKey)
+            if tValue is not None:
+                strTypeCode, strData, strHash = tValue
+                atData = array.array(strTypeCode)
+                atData.fromstring(strData)
+                aulHash = None
+                if strHash is not None:
+                    aulHash = array.array('I')
+                    aulHash.fromstring(strHash)
+                tChunkAttributes['atData'] = atData
+                tChunkAttributes['aulHash'] = aulHash
+                tChunkAttributes['fIsFinished'] = True
+                tChunkAttributes['strCacheKey'] = strCacheKey
+                fIsCached = True
+                self.__uiChunkCacheHits += 1
+
+                if self.__fVerbose is True:
+                    print('[HBootImage] Chunk cache: reused %s chunk %d.' % (
+                        tChunkAttributes['strName'],
+                        uiChunkIndex
+                    ))
+
+        return fIsCached
+
+    def __chunk_cache_store(self, tChunkAttributes, strCacheKey,
+                            uiChunkIndex):
+        # Add a finished chunk to the chunk cache. Chunks which were taken
+        # from the cache are not stored again.
+        if(
+            (strCacheKey is not None) and
+            (tChunkAttributes['fIsFinished'] is True) and
+            (tChunkAttributes['strCacheKey'] != strCacheKey)
+        ):
+            atData = tChunkAttributes['atData']
+            aulHash = tChunkAttributes['aulHash']
+            strHash = None
+            if aulHash is not None:
+                strHash = aulHash.tostring()
+            tChunkCache.set(
+                strCacheKey,
+                (atData.typecode, atData.tostring(), strHash)
+            )
+            tChunkAttributes['strCacheKey'] = strCacheKey
+            self.__uiChunkCacheMisses += 1
+
+            if self.__fVerbose is True:
+                print('[HBootImage] Chunk cache: built %s chunk %d.' % (
+                    tChunkAttributes['strName'],
+                    uiChunkIndex
+                ))
+
+    def __prefetch_chunk_contents(self, tChunkAttributes):
+        atData = {}
+        self.__get_data_contents(tChunkAttributes['tNode'], atData, True)
+        tChunkAttributes['atContents'] = atData
+
+    def __prebuild_chunks(self, atChunks, atState):
+        # Most chunks do not depend on their position in the image. They
+        # can be built in parallel before the layout pass. The expensive
+        # part is the extraction of ELF files and the hashing of the data.
+        # Chunks from the chunk cache are already finished.
+        atJobs = []
+        for uiChunkIndex, tAttr in enumerate(atChunks):
+            strChunkName = tAttr['strName']
+            if tAttr['fIsFinished'] is True:
+                pass
+            elif strChunkName in self.__astrPrebuildChunks:
+                atJobs.append((
+                    tAttr['pfnParser'],
+                    (tAttr, dict(atState), uiChunkIndex, atChunks)
+                ))
+            elif strChunkName in self.__astrPrefetchChunks:
+                atJobs.append((
+                    self.__prefetch_chunk_contents,
+                    (tAttr, )
+                ))
+
+        # Starting threads does not pay off for a single job.
+        if len(atJobs) < 2:
+            return
+
+        if (fHaveConcurrentFutures is not True) or (self.__sizJobs == 1):
+            for pfnJob, atArgs in atJobs:
+                pfnJob(*atArgs)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.__sizJobs
+        ) as tExecutor:
+            atFutures = [
+                tExecutor.submit(pfnJob, *atArgs)
+                for pfnJob, atArgs in atJobs
+            ]
+            # Wait for all jobs. The first error in chunk order is raised.
+            for tFuture in atFutures:
+                tFuture.result()
+
     def __parse_chunks(self, atChunks):
         # Get the initial offset.
         ulOffsetInitial = self.__ulStartOffset
@@ -5692,53 +5698,130 @@ class HbootImage:
 
         # Create a new state.
         atState = {
-            'uiPass': 0,
             'atChunks': [],
             'ulCurrentOffset': ulOffsetInitial,
             'fMoreChunksAllowed': True
         }
 
-        # All operations should be finished in 2 passes.
-        fAllChunksAreFinished = None
-        for uiPass in range(0, 2):
-            # Set the current pass.
-            atState['uiPass'] = uiPass
+        # Take all chunks which do not depend on the layout from the chunk
+        # cache. Build the rest of them.
+        astrCacheKeys = [None] * len(atChunks)
+        self.__chunk_cache_open()
+        for uiChunkIndex, tAttr in enumerate(atChunks):
+            if tAttr['strName'] in self.__astrPrebuildChunks:
+                astrCacheKeys[uiChunkIndex] = self.__get_chunk_cache_key(
+                    tAttr,
+                    None
+                )
+                self.__chunk_cache_restore(
+                    tAttr,
+                    astrCacheKeys[uiChunkIndex],
+                    uiChunkIndex
+                )
+        self.__prebuild_chunks(atChunks, atState)
+
+        # The layout pass assigns the offsets of all chunks. Chunks which
+        # depend on the contents of other chunks only report their size
+        # here and set a fix-up function.
+        for uiChunkIndex, tAttr in enumerate(atChunks):
+            if atState['fMoreChunksAllowed'] is not True:
+                raise Exception('No more chunks allowed.')
+
+            # Call the parser if the chunk is not finished yet.
+            if tAttr['fIsFinished'] is not True:
+                if astrCacheKeys[uiChunkIndex] is None:
+                    astrCacheKeys[uiChunkIndex] = self.__get_chunk_cache_key(
+                        tAttr,
+                        atState['ulCurrentOffset']
+                    )
+                fIsCached = self.__chunk_cache_restore(
+                    tAttr,
+                    astrCacheKeys[uiChunkIndex],
+                    uiChunkIndex
+                )
+                if fIsCached is not True:
+                    tAttr['pfnParser'](tAttr, atState, uiChunkIndex, atChunks)
 
-            atState['ulCurrentOffset'] = ulOffsetInitial
-            atState['fMoreChunksAllowed'] = True
-            fAllChunksAreFinished = True
+            # Keep all new chunks in the cache.
+            self.__chunk_cache_store(
+                tAttr,
+                astrCacheKeys[uiChunkIndex],
+                uiChunkIndex
+            )
 
-            # Loop over all chunks.
-            sizChunks = len(atChunks)
-            for uiChunkIndex in range(0, sizChunks):
+            # Update the current position.
+            sizChunkInBytes = self.__get_chunk_size(tAttr)
+            if self.__tImageType != self.__IMAGE_TYPE_SECMEM:
+                sizChunkInBytes *= 4
+            atState['ulCurrentOffset'] += sizChunkInBytes
+
+        # Run the fix-ups in the order of their dependencies. A fix-up can
+        # run as soon as all chunks it depends on are finished.
+        atPending = []
+        for uiChunkIndex, tAttr in enumerate(atChunks):
+            if tAttr['fIsFinished'] is not True:
+                if tAttr['pfnFixup'] is None:
+                    raise Exception(
+                        'The %s chunk is not finished.' % tAttr['strName']
+                    )
+                atPending.append(uiChunkIndex)
+        while len(atPending) != 0:
+            atStillPending = []
+            for uiChunkIndex in atPending:
                 tAttr = atChunks[uiChunkIndex]
+                fDependenciesFinished = all(
+                    atChunks[uiIndex]['fIsFinished'] is True
+                    for uiIndex in tAttr['auiDependencies']
+                )
+                if fDependenciesFinished is True:
+                    sizReserved = tAttr['sizData']
+                    # The result of the fix-up depends on the hashes of
+                    # all chunks it covers.
+                    strCacheKey = self.__get_chunk_fixup_cache_key(
+                        astrCacheKeys[uiChunkIndex],
+                        tAttr,
+                        atChunks
+                    )
+                    fIsCached = self.__chunk_cache_restore(
+                        tAttr,
+                        strCacheKey,
+                        uiChunkIndex
+                    )
+                    if fIsCached is not True:
+                        tAttr['pfnFixup'](tAttr, atChunks)
+                        self.__chunk_cache_store(
+                            tAttr,
+                            strCacheKey,
+                            uiChunkIndex
+                        )
+                    if len(tAttr['atData']) != sizReserved:
+                        raise Exception(
+                            'The %s chunk has a size of %d, but %d were '
+                            'reserved.' % (
+                                tAttr['strName'],
+                                len(tAttr['atData']),
+                                sizReserved
+                            )
+                        )
+                else:
+                    atStillPending.append(uiChunkIndex)
 
-                if atState['fMoreChunksAllowed'] is not True:
-                    raise Exception('No more chunks allowed.')
-
-                # Call the parser if the chunk is not finished yet.
-                if tAttr['fIsFinished'] is not True:
-                    # Call the parser.
-                    tAttr['pfnParser'](tAttr, atState, uiChunkIndex, atChunks)
-                    # Update the global finish state.
-                    fAllChunksAreFinished &= tAttr['fIsFinished']
-                    # Update the current position.
-                    if self.__tImageType == self.__IMAGE_TYPE_SECMEM:
-                        sizChunkInBytes = len(tAttr['atData'])
-                    else:
-                        sizChunkInBytes = len(tAttr['atData']) * 4
-                    atState['ulCurrentOffset'] += sizChunkInBytes
-
-            if fAllChunksAreFinished is True:
-                break
-
-        if fAllChunksAreFinished is False:
-            raise Exception('Some chunks are still not finished.')
+            # No progress means a circular dependency.
+            if len(atStillPending) == len(atPending):
+                raise Exception('Some chunks are still not finished.')
+            atPending = atStillPending
 
         # Collect all data from the chunks.
         for tAttr in atChunks:
             self.__atChunkData.extend(tAttr['atData'])
 
+        if (self.__fVerbose is True) and \
+           (self.__strChunkCacheConfig is not None):
+            print('[HBootImage] Chunk cache: %d reused, %d built' % (
+                self.__uiChunkCacheHits,
+                self.__uiChunkCacheMisses
+            ))
+
     def parse_image(self, tInput):
         # Parsing an image requires the patch definition.
         if self.__cPatchDefinitions is None:
@@ -6001,20 +6084,6 @@ class HbootImage:
 
         self.__parse_chunks(atChunks)
 
-    def __crc7(self, strData):
-        ucCrc = 0
-        for uiByteCnt in range(0, len(strData)):
-            ucByte = ord(strData[uiByteCnt])
-            for uiBitCnt in range(0, 8):
-                ucBit = (ucCrc ^ ucByte) & 0x80
-                ucCrc <<= 1
-                ucByte <<= 1
-                if ucBit != 0:
-                    ucCrc ^= 0x07
-            ucCrc &= 0xff
-
-        return ucCrc
-
     def write(self, strTargetPath, strFileToAppend=None):
         """ Write all compiled chunks to the file strTargetPath . """
 
@@ -6045,7 +6114,7 @@ class HbootImage:
                 aucZone2.append(self.__SECMEM_ZONE2_REV1_0)
 
                 # Set the checksum.
-                ucCrc = self.__crc7(aucZone2.tostring())
+                ucCrc = crc7(aucZone2)
                 aucZone2.append(ucCrc)
 
                 # Clear zone 3.
@@ -6069,7 +6138,7 @@ class HbootImage:
                 aucTmp.append(self.__SECMEM_ZONE2_REV1_0)
 
                 # Get the checksum.
-                ucCrc = self.__crc7(aucTmp.tostring())
+                ucCrc = crc7(aucTmp)
 
                 # Get the first 30 bytes as zone2.
                 aucZone2 = aucTmp[0:30]
@@ -6089,47 +6158,42 @@ class HbootImage:
                     'or less, but it has %d bytes.' % uiImageSize
                 )
 
-            # Get a copy of the chunk data.
-            atChunks = array.array('B')
-            atChunks.extend(aucZone2)
-            atChunks.extend(aucZone3)
-
-            # Do not add headers in a SECMEM image.
-            atHeader = array.array('B')
-
-            # Do not add end markers in a SECMEM image.
-            atEndMarker = array.array('B')
+            # Do not add headers or end markers in a SECMEM image.
+            atHeader = None
+            atChunks = [aucZone2, aucZone3]
+            atEndMarker = None
 
         elif(
             (self.__tImageType == self.__IMAGE_TYPE_COM_INFO_PAGE) or
             (self.__tImageType == self.__IMAGE_TYPE_APP_INFO_PAGE)
         ):
-            atChunks = self.__atChunkData
-
             # The chunk data must have a size of 4048 bytes (1012 DWORDS).
-            sizChunksInDWORDs = len(atChunks)
+            sizChunksInDWORDs = len(self.__atChunkData)
             if sizChunksInDWORDs != 1012:
                 raise Exception(
                     'The info page data without the hash must be 1012 '
                     'bytes, but it is %d bytes.' % sizChunksInDWORDs
                 )
 
-            # Build the hash for the info page.
+            # Build the hash for the info page. It follows the chunk data.
             tHash = hashlib.sha384()
-            tHash.update(atChunks.tostring())
-            strHash = tHash.digest()
-            aulHash = array.array('I', strHash)
-            atChunks.extend(aulHash)
+            tHash.update(self.__atChunkData)
+            aulHash = array.array('I', tHash.digest())
 
-        else:
-            # Get a copy of the chunk data.
-            atChunks = array.array('I', self.__atChunkData)
+            # Info pages have no header and no end marker.
+            atHeader = None
+            atChunks = [self.__atChunkData, aulHash]
+            atEndMarker = None
 
+        else:
             # Terminate the chunks with a DWORD of 0.
-            atChunks.append(0x00000000)
+            atEndMarker = array.array('I', [0x00000000])
 
             # Generate the standard header.
-            atHeaderStandard = self.__build_standard_header(atChunks)
+            atHeaderStandard = self.__build_standard_header(
+                self.__atChunkData,
+                atEndMarker
+            )
 
             # Insert flasher parameters if selected.
             if self.__fSetFlasherParameters is True:
@@ -6138,20 +6202,23 @@ class HbootImage:
             # Combine the standard header with the overrides.
             atHeader = self.__combine_headers(atHeaderStandard)
 
-            # Get a fresh copy of the chunk data.
-            atChunks = array.array('I', self.__atChunkData)
+            # The chunks are written directly from the chunk data.
+            atChunks = [self.__atChunkData]
 
-            # Terminate the chunks with a DWORD of 0.
-            atEndMarker = array.array('I', [0x00000000])
+        # Collect the arrays with the header, chunks and end marker. They
+        # are written directly to the file without joining them first.
+        atParts = []
+        if (self.__fHasHeader is True) and (atHeader is not None):
+            atParts.append(atHeader)
+        atParts.extend(atChunks)
+        if (self.__fHasEndMarker is True) and (atEndMarker is not None):
+            atParts.append(atEndMarker)
 
         # Get the size of the header, chunks and end marker.
         # Exclude any pre-padding.
         ulFileSize = 0
-        if self.__fHasHeader is True:
-            ulFileSize += len(atHeader)*4
-        ulFileSize += len(atChunks)*4
-        if self.__fHasEndMarker is True:
-            ulFileSize += len(atEndMarker)*4
+        for atPart in atParts:
+            ulFileSize += len(atPart) * atPart.itemsize
 
         print("Min. image size: 0x%08x" % self.__ulMinImageSize)
         print("File size:       0x%08x" % ulFileSize)
@@ -6163,8 +6230,9 @@ class HbootImage:
             ulFillSizeDwords = int(ulFillSize/4)
             atFiller = array.array(
                 'I',
-                [self.__ulMinImageSizeFillValue] * ulFillSizeDwords
-            )
+                [self.__ulMinImageSizeFillValue]
+            ) * ulFillSizeDwords
+            atParts.append(atFiller)
             ulFileSize = self.__ulMinImageSize
 
         # If a maximum size is set, check the size
@@ -6177,27 +6245,25 @@ class HbootImage:
                 self.__ulMaxImageSize
             ))
 
-        # Write all components to the output file.
-        tFile = open(strTargetPath, 'wb')
+        # The pre-padding is not part of the file size.
         if self.__ulPaddingPreSize != 0:
             atPadding = array.array(
                 'B',
-                [self.__ucPaddingPreValue] * self.__ulPaddingPreSize
-            )
-            atPadding.tofile(tFile)
-        if self.__fHasHeader is True:
-            atHeader.tofile(tFile)
-        atChunks.tofile(tFile)
-        if self.__fHasEndMarker is True:
-            atEndMarker.tofile(tFile)
-        if atFiller is not None:
-            atFiller.tofile(tFile)
+                [self.__ucPaddingPreValue]
+            ) * self.__ulPaddingPreSize
+            atParts.insert(0, atPadding)
+
+        # Write all components to the output file.
+        tFile = open(strTargetPath, 'wb')
+        for atPart in atParts:
+            atPart.tofile(tFile)
         if strFileToAppend is not None:
             print("Info: Appending the contents of the file %s to the output file." % (strFileToAppend))
+            # Copy the file in blocks. It is never read completely into
+            # memory.
             tInputFile = open(strFileToAppend, 'rb')
-            acBin = tInputFile.read()
+            shutil.copyfileobj(tInputFile, tFile, 0x100000)
             tInputFile.close()
-            tFile.write(acBin)
 
         tFile.close()
 
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+import copy
+import hashlib
+import marshal
+import sqlite3
+import sys
+import threading
+
+
+class KeyCache:
+    # The analysed keys in memory. They are keyed by the digest of the DER
+    # data and the public key flag.
+    __atEntries = None
+
+    # The filename of the optional database.
+    __strDatabasePath = None
+
+    # The database connection.
+    __tDb = None
+
+    __tLock = None
+
+    __ulHits = None
+    __ulDatabaseHits = None
+    __ulMisses = None
+
+    # These numbers are private. They are never written to the database.
+    # Only their size is kept there, which is all the image compilers need
+    # to identify the key type.
+    __astrPrivateNumbers = ['d']
+
+    # The keys are stored with marshal. Its data types differ between
+    # Python 2 and 3, so each major version has its own table.
+    __strTable = 'key_cache_py%d' % sys.version_info.major
+
+    def __init__(self):
+        self.__atEntries = {}
+        self.__strDatabasePath = None
+        self.__tDb = None
+        self.__tLock = threading.RLock()
+        self.__ulHits = 0
+        self.__ulDatabaseHits = 0
+        self.__ulMisses = 0
+
+    def set_database(self, strDatabasePath):
+        # Keep the analysed keys also on disk. This is optional, without a
+        # database the keys live only as long as the process.
+        with self.__tLock:
+            if strDatabasePath == self.__strDatabasePath:
+                return
+            if self.__tDb is not None:
+                self.__tDb.close()
+                self.__tDb = None
+            self.__strDatabasePath = strDatabasePath
+            if strDatabasePath is not None:
+                tDb = sqlite3.connect(strDatabasePath, check_same_thread=False)
+                tDb.execute(
+                    'CREATE TABLE IF NOT EXISTS %s ('
+                    'digest TEXT NOT NULL, '
+                    'public INTEGER NOT NULL, '
+                    'value BLOB NOT NULL, '
+                    'PRIMARY KEY (digest, public))' % self.__strTable
+                )
+                tDb.commit()
+                self.__tDb = tDb
+
+    def __db_get(self, strDigest, fIsPublicKey):
+        tValue = None
+        fFound = False
+        if self.__tDb is not None:
+            tCursor = self.__tDb.execute(
+                'SELECT value FROM %s WHERE digest=? AND public=?' %
+                self.__strTable,
+                (strDigest, int(fIsPublicKey))
+            )
+            atRow = tCursor.fetchone()
+            if atRow is not None:
+                try:
+                    iKeyType, atNumbers = marshal.loads(bytes(atRow[0]))
+                except (EOFError, ValueError, TypeError):
+                    # Treat broken entries like missing ones.
+                    pass
+                else:
+                    # The numbers of the backends are bytearrays.
+                    for strName, tNumber in atNumbers.items():
+                        if isinstance(tNumber, bytes):
+                            atNumbers[strName] = bytearray(tNumber)
+                    tValue = (iKeyType, atNumbers)
+                    fFound = True
+        return fFound, tValue
+
+    def __db_set(self, strDigest, fIsPublicKey, tValue):
+        if self.__tDb is not None:
+            iKeyType, atNumbers = tValue
+            atPublicNumbers = dict({})
+            for strName, tNumber in atNumbers.items():
+                if strName in self.__astrPrivateNumbers:
+                    tNumber = bytearray(len(tNumber))
+                # Marshal can not write bytearrays.
+                if isinstance(tNumber, bytearray):
+                    tNumber = bytes(tNumber)
+                atPublicNumbers[strName] = tNumber
+            self.__tDb.execute(
+                'INSERT OR REPLACE INTO %s (digest, public, value) '
+                'VALUES (?, ?, ?)' % self.__strTable,
+                (
+                    strDigest,
+                    int(fIsPublicKey),
+                    sqlite3.Binary(
+                        marshal.dumps((iKeyType, atPublicNumbers), 2)
+                    )
+                )
+            )
+            self.__tDb.commit()
+
+    def get(self, strKeyDER, fIsPublicKey, pfnCompute):
+        """ Return the cached result of pfnCompute for the DER key.
+
+        pfnCompute must return the key type and the numbers of the key
+        like the "get_key_numbers" method of a crypto backend. Each
+        distinct key is analysed only once per process.
+        """
+        strDigest = hashlib.sha384(strKeyDER).hexdigest()
+        tKey = (strDigest, bool(fIsPublicKey))
+
+        with self.__tLock:
+            if tKey in self.__atEntries:
+                self.__ulHits += 1
+                return copy.deepcopy(self.__atEntries[tKey])
+
+            fFound, tValue = self.__db_get(strDigest, fIsPublicKey)
+            if fFound is True:
+                self.__ulDatabaseHits += 1
+            else:
+                self.__ulMisses += 1
+
+        if fFound is False:
+            tValue = pfnCompute()
+
+        with self.__tLock:
+            if fFound is False:
+                self.__db_set(strDigest, fIsPublicKey, tValue)
+            self.__atEntries[tKey] = tValue
+
+        return copy.deepcopy(tValue)
+
+    def get_statistics(self):
+        with self.__tLock:
+            return dict({
+                'hits': self.__ulHits,
+                'database_hits': self.__ulDatabaseHits,
+                'misses': self.__ulMisses,
+                'entries': len(self.__atEntries)
+            })
+
+    def clear(self):
+        with self.__tLock:
+            self.__atEntries.clear()
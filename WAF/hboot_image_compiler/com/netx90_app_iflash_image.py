@@ -91,9 +91,10 @@ def patch_image(strInputFile, strOutputFile, fVerbose=False):
 
     # Create a SHA384 hash over the cm4 vectors and the complete application
     # (i.e. the complete file without the first 512 bytes).
+    tInputImage = memoryview(strInputImage)
     tHash = hashlib.sha384()
-    tHash.update(strInputImage[0:448])
-    tHash.update(strInputImage[512:])
+    tHash.update(tInputImage[0:448])
+    tHash.update(tInputImage[512:])
     aulHash = array.array('I', tHash.digest())
 
     # Write the first 7 DWORDs of the hash to the HBOOT header.
@@ -119,9 +120,9 @@ def patch_image(strInputFile, strOutputFile, fVerbose=False):
     if fVerbose is True:
         print('Writing patched image to "%s".' % strOutputFile)
     tFile = open(strOutputFile, 'wb')
-    tFile.write(strInputImage[0:448])
+    tFile.write(tInputImage[0:448])
     aulHBoot.tofile(tFile)
-    tFile.write(strInputImage[512:])
+    tFile.write(tInputImage[512:])
     tFile.close()
 
     if fVerbose is True:
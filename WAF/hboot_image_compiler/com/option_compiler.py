@@ -20,8 +20,8 @@
 # *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
 # ***************************************************************************
 
-import ast
 import string
+import struct
 import xml.dom.minidom
 import os
 
@@ -38,14 +38,23 @@ class OptionCompiler:
     # This is the patch definitions object.
     __cPatchDefinitions = None
 
+    # These are the struct formats for the data element sizes.
+    __atStructFormat = dict({
+        1: 'B',
+        2: 'H',
+        4: 'I'
+    })
+
     def __init__(self, tPatchDefinitions):
         self.__aucOptions = bytearray()
         self.__cPatchDefinitions = tPatchDefinitions
 
-    def __parse_numeric_expression(self, strExpression):
-        tAstNode = ast.parse(strExpression, mode='eval')
-        tAstResolved = self.__cPatchDefinitions.resolve_constants(tAstNode)
-        ulResult = eval(compile(tAstResolved, 'lala', mode='eval'))
+    def __parse_numeric_expression(self, strExpression,
+                                   atTemporaryConstants=None):
+        ulResult = self.__cPatchDefinitions.evaluate_expression(
+            strExpression,
+            atTemporaryConstants
+        )
         # TODO: is this really necessary? Maybe ast.literal_eval throws
         # something already.
         if ulResult is None:
@@ -68,17 +77,25 @@ class OptionCompiler:
         # Split the text by comma.
         atTextElements = strText.split(',')
 
-        # Process all data elements.
-        atData = bytearray()
+        # Parse all data elements. Cut the values to the element size.
+        ulMask = (1 << (uiElementSizeInBytes * 8)) - 1
+        aulValues = []
         for strElementRaw in atTextElements:
             strElement = strElementRaw.strip()
-
-            # Parse the data.
-            ulValue = self.__parse_numeric_expression(strElement)
-
-            # Generate the data entry.
-            for iCnt in range(0, uiElementSizeInBytes):
-              atData.append((ulValue >> (iCnt << 3)) & 0xff)
+            aulValues.append(self.__parse_numeric_expression(strElement) &
+                             ulMask)
+
+        # Pack all values in little endian into one buffer.
+        atData = bytearray(len(aulValues) * uiElementSizeInBytes)
+        struct.pack_into(
+            '<%d%s' % (
+                len(aulValues),
+                self.__atStructFormat[uiElementSizeInBytes]
+            ),
+            atData,
+            0,
+            *aulValues
+        )
         return atData
 
     # NOTE: This function is also used from outside for SpiMacro parsing.
@@ -138,25 +155,16 @@ class OptionCompiler:
                         ulAddress += 1
                         atElements.append(atTmp[0].strip())
 
-        # Set the labels as temporary constants.
-        self.__cPatchDefinitions.setTemporaryConstants(atLabels)
-
-        # Process all data elements.
-        atData = bytearray()
+        # Process all data elements. The labels are temporary constants.
+        aulValues = []
         for strElement in atElements:
             # Parse the data.
-            tAstNode = ast.parse(strElement, mode='eval')
-            tAstResolved = self.__cPatchDefinitions.resolve_constants(tAstNode)
-            ast.dump(tAstResolved)
-            ulValue = eval(compile(tAstResolved, 'lala', mode='eval'))
-
-            # Generate the data entry.
-            atData.append(ulValue)
+            aulValues.append(
+                self.__parse_numeric_expression(strElement, atLabels)
+            )
 
-        # Remove the labels as temporary constants.
-        self.__cPatchDefinitions.setTemporaryConstants([])
-
-        return atData
+        # Every element is one byte.
+        return bytearray(aulValues)
 
     def __get_ddr_macro_data(self, tDataNode):
         # Collect the DDR macro in this array.
@@ -167,22 +175,10 @@ class OptionCompiler:
             if tNode.nodeType == tNode.ELEMENT_NODE:
                 if tNode.localName == 'WritePhy':
                     strValue = tNode.getAttribute('register')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ucRegister = eval(compile(
-                        tAstResolved,
-                        'lala',
-                        mode='eval'
-                    ))
+                    ucRegister = self.__parse_numeric_expression(strValue)
 
                     strValue = tNode.getAttribute('data')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulData = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulData = self.__parse_numeric_expression(strValue)
 
                     if (ucRegister < 0) or (ucRegister > 0xff):
                         raise Exception(
@@ -207,22 +203,10 @@ class OptionCompiler:
 
                 elif tNode.localName == 'WriteCtrl':
                     strValue = tNode.getAttribute('register')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ucRegister = eval(compile(
-                        tAstResolved,
-                        'lala',
-                        mode='eval'
-                    ))
+                    ucRegister = self.__parse_numeric_expression(strValue)
 
                     strValue = tNode.getAttribute('data')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulData = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulData = self.__parse_numeric_expression(strValue)
 
                     if (ucRegister < 0) or (ucRegister > 0xff):
                         raise Exception(
@@ -247,11 +231,7 @@ class OptionCompiler:
 
                 elif tNode.localName == 'Delay':
                     strValue = tNode.getAttribute('ticks')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulTicks = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulTicks = self.__parse_numeric_expression(strValue)
 
                     if (ulTicks < 0) or (ulTicks > 0xffffffff):
                         raise Exception('Invalid value for Delay: 0x%08x' %
@@ -270,36 +250,16 @@ class OptionCompiler:
 
                 elif tNode.localName == 'PollPhy':
                     strValue = tNode.getAttribute('register')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ucRegister = eval(compile(
-                        tAstResolved,
-                        'lala',
-                        mode='eval'
-                    ))
+                    ucRegister = self.__parse_numeric_expression(strValue)
 
                     strValue = tNode.getAttribute('mask')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulMask = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulMask = self.__parse_numeric_expression(strValue)
 
                     strValue = tNode.getAttribute('data')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulData = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulData = self.__parse_numeric_expression(strValue)
 
                     strValue = tNode.getAttribute('ticks')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulTicks = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulTicks = self.__parse_numeric_expression(strValue)
 
                     if (ucRegister < 0) or (ucRegister > 0xff):
                         raise Exception(
@@ -338,36 +298,16 @@ class OptionCompiler:
 
                 elif tNode.localName == 'PollCtrl':
                     strValue = tNode.getAttribute('register')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ucRegister = eval(compile(
-                        tAstResolved,
-                        'lala',
-                        mode='eval'
-                    ))
+                    ucRegister = self.__parse_numeric_expression(strValue)
 
                     strValue = tNode.getAttribute('mask')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulMask = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulMask = self.__parse_numeric_expression(strValue)
 
                     strValue = tNode.getAttribute('data')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulData = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulData = self.__parse_numeric_expression(strValue)
 
                     strValue = tNode.getAttribute('ticks')
-                    tAstNode = ast.parse(strValue, mode='eval')
-                    tAstResolved = self.__cPatchDefinitions.resolve_constants(
-                        tAstNode
-                    )
-                    ulTicks = eval(compile(tAstResolved, 'lala', mode='eval'))
+                    ulTicks = self.__parse_numeric_expression(strValue)
 
                     if (ucRegister < 0) or (ucRegister > 0xff):
                         raise Exception(
@@ -412,10 +352,9 @@ class OptionCompiler:
         sizDdrMacro = len(atDdrMacro)
 
         # Prepend the size information.
-        atData = bytearray()
-        atData.append(sizDdrMacro & 0xff)
-        atData.append((sizDdrMacro >> 8) & 0xff)
-        atData.extend(atDdrMacro)
+        atData = bytearray(2 + sizDdrMacro)
+        struct.pack_into('<H', atData, 0, sizDdrMacro & 0xffff)
+        atData[2:] = atDdrMacro
 
         # Return the data.
         return atData
@@ -467,7 +406,9 @@ class OptionCompiler:
         return atData
 
     def __processChunkOptions(self, tChunkNode):
-        atOptionData = bytearray()
+        # Collect all parts of the options first. They are copied into one
+        # buffer at the end.
+        atParts = []
 
         # Loop over all children.
         for tOptionNode in tChunkNode.childNodes:
@@ -520,11 +461,13 @@ class OptionCompiler:
 
                             # Write it as a raw option
                             ucOptionIdRaw = 0xfe
-                            atOptionData.append(ucOptionIdRaw)
-                            atOptionData.append(sizChunk)
-                            atOptionData.append(ulOffset & 0xff)
-                            atOptionData.append((ulOffset >> 8) & 0xff)
-                            atOptionData.extend(strChunk)
+                            atParts.append(struct.pack(
+                                '<BBH',
+                                ucOptionIdRaw,
+                                sizChunk,
+                                ulOffset & 0xffff
+                            ))
+                            atParts.append(strChunk)
 
                             iOffset+=sizChunk
                             sizData-=sizChunk
@@ -555,7 +498,7 @@ class OptionCompiler:
                                 )
                             )
 
-                        atOptionData.append(ulOptionValue)
+                        atParts.append(struct.pack('<B', ulOptionValue))
 
                         # Compare the size of all elements.
                         for iCnt in range(0, sizElements):
@@ -611,24 +554,31 @@ class OptionCompiler:
                             sizElement = len(atData[iCnt])
                             (strElementId, ulSize, ulType) = atElements[iCnt]
                             if ulType == 0:
-                                atOptionData.extend(atData[iCnt])
+                                atParts.append(atData[iCnt])
                             elif ulType == 1:
                                 # Add a size byte.
-                                atOptionData.append(sizElement)
-                                atOptionData.extend(atData[iCnt])
+                                atParts.append(struct.pack('<B', sizElement))
+                                atParts.append(atData[iCnt])
                             elif ulType == 2:
                                 # Add 16 bit size information.
-                                atOptionData.append(sizElement & 0xff)
-                                atOptionData.append(
-                                    (sizElement >> 8) & 0xff
+                                atParts.append(
+                                    struct.pack('<H', sizElement & 0xffff)
                                 )
-                                atOptionData.extend(atData[iCnt])
+                                atParts.append(atData[iCnt])
                             else:
                                 raise Exception('Unknown Type %d' % ulType)
                 else:
                     raise Exception('Unexpected node: %s' %
                                     tOptionNode.localName)
 
+        # Copy all parts into one buffer.
+        atOptionData = bytearray(sum(len(tPart) for tPart in atParts))
+        sizOffset = 0
+        for tPart in atParts:
+            sizPart = len(tPart)
+            atOptionData[sizOffset:sizOffset + sizPart] = tPart
+            sizOffset += sizPart
+
         return atOptionData
 
     def process(self, tSource):
@@ -21,6 +21,13 @@
 # ***************************************************************************
 
 import ast
+import hashlib
+import marshal
+import os
+import re
+import sys
+import tempfile
+import threading
 import xml.dom.minidom
 
 # ----------------------------------------------------------------------------
@@ -33,11 +40,12 @@ class RewriteName(ast.NodeTransformer):
     __atConstants = None
     __atTemporaryConstants = None
 
-    def setConstants(self, atConstants):
+    def __init__(self, atConstants, atTemporaryConstants=None):
+        # The instance is only used for one call, so it can be used from
+        # several threads at the same time.
+        ast.NodeTransformer.__init__(self)
         self.__atConstants = atConstants
-
-    def setTemporaryConstants(self, atConstants):
-        self.__atTemporaryConstants = atConstants
+        self.__atTemporaryConstants = atTemporaryConstants
 
     def visit_Name(self, node):
         tNode = None
@@ -56,6 +64,13 @@ class RewriteName(ast.NodeTransformer):
 
 # ----------------------------------------------------------------------------
 
+# This matches a plain decimal or hex number without any constants.
+s_reNumericLiteral = re.compile(r'(0[xX][0-9a-fA-F]+|[1-9][0-9]*|0)\s*$')
+
+# This is the format version of the compiled patch definitions. Increase it
+# with every change of the compiled data.
+s_uiCompiledVersion = 1
+
 
 class PatchDefinitions:
     # This is a dictionary with all the data from the patch definition.
@@ -65,22 +80,36 @@ class PatchDefinitions:
     # definition.
     m_atConstants = None
 
-    m_cAstConstResolver = None
+    # This is the generation of the constants. It changes with every
+    # modification of the constants.
+    m_uiConstantsGeneration = None
+
+    # This is a cache of all parsed expressions. It maps the expression to
+    # the compiled code and a tuple of all names in the expression.
+    m_atCompiledExpressions = None
+
+    # This is a cache of all expressions which use only constants. They are
+    # folded to their value once for the current generation of the
+    # constants.
+    m_atFoldedExpressions = None
+    m_uiFoldedExpressionsGeneration = None
+
+    # This lock protects the caches. The expressions can be evaluated from
+    # several threads at the same time.
+    m_tLock = None
 
     def __init__(self):
         self.m_atPatchDefinitions = dict({})
         self.m_atConstants = dict({})
-        self.m_cAstConstResolver = RewriteName()
-        self.m_cAstConstResolver.setConstants(self.m_atConstants)
+        self.m_uiConstantsGeneration = 0
+        self.m_atCompiledExpressions = dict({})
+        self.m_atFoldedExpressions = dict({})
+        self.m_uiFoldedExpressionsGeneration = 0
+        self.m_tLock = threading.Lock()
 
-    def read_patch_definition(self, tInput):
-        # A string must be the filename of the XML.
-        if isinstance(tInput, ("".__class__, u"".__class__)):
-            tXml = xml.dom.minidom.parse(tInput)
-        elif isinstance(tInput, xml.dom.minidom.Document):
-            tXml = tInput
-        else:
-            raise Exception('Unknown input document: %s' % repr(tInput))
+    def __parse_patch_definition(self, tXml):
+        atPatchDefinitions = dict({})
+        atConstants = dict({})
 
         # Loop over all children.
         for tOptionsNode in tXml.documentElement.childNodes:
@@ -100,7 +129,7 @@ class PatchDefinitions:
                         strOptionId = tOptionNode.getAttribute('id')
                         if strOptionId == '':
                             raise Exception('Missing id attribute!')
-                        if strOptionId in self.m_atPatchDefinitions:
+                        if strOptionId in atPatchDefinitions:
                             raise Exception('ID %s double defined!' %
                                             strOptionId)
 
@@ -140,7 +169,7 @@ class PatchDefinitions:
                         atDesc = dict({})
                         atDesc['value'] = ulOptionValue
                         atDesc['elements'] = atElements
-                        self.m_atPatchDefinitions[strOptionId] = atDesc
+                        atPatchDefinitions[strOptionId] = atDesc
 
             elif(
                 tOptionsNode.nodeType == tOptionsNode.ELEMENT_NODE and
@@ -156,7 +185,7 @@ class PatchDefinitions:
                         strDefinitionName = tDefNode.getAttribute('name')
                         if strDefinitionName == '':
                             raise Exception('Missing name attribute!')
-                        if strDefinitionName in self.m_atConstants:
+                        if strDefinitionName in atConstants:
                             raise Exception('Name "%s" double defined!' %
                                             strDefinitionName)
 
@@ -167,16 +196,217 @@ class PatchDefinitions:
                             raise Exception('Missing value attribute!')
                         ulDefValue = int(strDefinitionValue, 0)
 
-                        self.m_atConstants[strDefinitionName] = ulDefValue
+                        atConstants[strDefinitionName] = ulDefValue
+
+        return atPatchDefinitions, atConstants
+
+    def __get_compiled_path(self, strFileName):
+        # Keep the compiled patch definition in a "__pycache__" folder next
+        # to the XML like Python does for modules. The marshal format
+        # differs between Python 2 and 3, so each major version has its own
+        # file.
+        strFolder, strName = os.path.split(os.path.abspath(strFileName))
+        return os.path.join(
+            strFolder,
+            '__pycache__',
+            '%s.v%d.py%d.marshal' % (
+                strName,
+                s_uiCompiledVersion,
+                sys.version_info.major
+            )
+        )
+
+    def __read_compiled(self, strCompiledPath, strDigest):
+        # Return the dictionaries from the compiled patch definition or None
+        # if it does not exist or belongs to a different XML.
+        tResult = None
+        try:
+            with open(strCompiledPath, 'rb') as tFile:
+                tCompiled = marshal.load(tFile)
+            if(
+                isinstance(tCompiled, tuple) and
+                len(tCompiled) == 4 and
+                tCompiled[0] == s_uiCompiledVersion and
+                tCompiled[1] == strDigest
+            ):
+                tResult = tCompiled[2], tCompiled[3]
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            pass
+        return tResult
+
+    def __replace_file(self, strSourcePath, strTargetPath):
+        if hasattr(os, 'replace') is True:
+            os.replace(strSourcePath, strTargetPath)
+        else:
+            # Python 2 has no os.replace . os.rename replaces an existing
+            # file in one step on POSIX systems, but fails on Windows.
+            if os.name == 'nt' and os.path.exists(strTargetPath):
+                os.remove(strTargetPath)
+            os.rename(strSourcePath, strTargetPath)
+
+    def __write_compiled(self, strCompiledPath, strDigest,
+                         atPatchDefinitions, atConstants):
+        # Writing the compiled patch definition is optional. Ignore all
+        # errors, e.g. from a read-only folder.
+        strTempPath = None
+        try:
+            strFolder = os.path.dirname(strCompiledPath)
+            if os.path.isdir(strFolder) is not True:
+                os.makedirs(strFolder)
+            tHandle, strTempPath = tempfile.mkstemp(dir=strFolder)
+
+            # mkstemp creates the file only for the current user. Use the
+            # default permissions of new files instead.
+            uiUmask = os.umask(0)
+            os.umask(uiUmask)
+            os.chmod(strTempPath, 0o666 & ~uiUmask)
+
+            with os.fdopen(tHandle, 'wb') as tFile:
+                marshal.dump(
+                    (
+                        s_uiCompiledVersion,
+                        strDigest,
+                        atPatchDefinitions,
+                        atConstants
+                    ),
+                    tFile
+                )
+            # Replace the old file in one step. Parallel compilers never
+            # see a partial file.
+            self.__replace_file(strTempPath, strCompiledPath)
+            strTempPath = None
+        except (IOError, OSError):
+            pass
+        if strTempPath is not None:
+            try:
+                os.remove(strTempPath)
+            except OSError:
+                pass
+
+    def read_patch_definition(self, tInput, fUseCompiled=True):
+        # A string must be the filename of the XML.
+        if isinstance(tInput, ("".__class__, u"".__class__)):
+            tFile = open(tInput, 'rb')
+            strData = tFile.read()
+            tFile.close()
+
+            # Use the compiled patch definition if it was made from the
+            # same XML.
+            tCompiled = None
+            if fUseCompiled is True:
+                strDigest = hashlib.sha384(strData).hexdigest()
+                strCompiledPath = self.__get_compiled_path(tInput)
+                tCompiled = self.__read_compiled(strCompiledPath, strDigest)
+
+            if tCompiled is None:
+                tCompiled = self.__parse_patch_definition(
+                    xml.dom.minidom.parseString(strData)
+                )
+                if fUseCompiled is True:
+                    self.__write_compiled(
+                        strCompiledPath,
+                        strDigest,
+                        tCompiled[0],
+                        tCompiled[1]
+                    )
+            atPatchDefinitions, atConstants = tCompiled
+
+        elif isinstance(tInput, xml.dom.minidom.Document):
+            atPatchDefinitions, atConstants = \
+                self.__parse_patch_definition(tInput)
+        else:
+            raise Exception('Unknown input document: %s' % repr(tInput))
+
+        # Merge the new options and constants.
+        for strOptionId, atDesc in atPatchDefinitions.items():
+            if strOptionId in self.m_atPatchDefinitions:
+                raise Exception('ID %s double defined!' % strOptionId)
+            self.m_atPatchDefinitions[strOptionId] = atDesc
+        for strDefinitionName, ulDefValue in atConstants.items():
+            if strDefinitionName in self.m_atConstants:
+                raise Exception('Name "%s" double defined!' %
+                                strDefinitionName)
+            self.m_atConstants[strDefinitionName] = ulDefValue
+
+        # The constants changed.
+        self.m_uiConstantsGeneration += 1
+
+    def resolve_constants(self, tAstNode, atTemporaryConstants=None):
+        tResolver = RewriteName(self.m_atConstants, atTemporaryConstants)
+        return tResolver.visit(tAstNode)
 
-    def resolve_constants(self, tAstNode):
-        return self.m_cAstConstResolver.visit(tAstNode)
+    def __compile_expression(self, strExpression):
+        with self.m_tLock:
+            tCompiled = self.m_atCompiledExpressions.get(strExpression)
+
+        if tCompiled is None:
+            # Parse the expression only once. Collect all names in the
+            # expression, they are resolved with every evaluation.
+            tAstNode = ast.parse(strExpression, mode='eval')
+            astrNames = []
+            for tNode in ast.walk(tAstNode):
+                if isinstance(tNode, ast.Name) and tNode.id not in astrNames:
+                    astrNames.append(tNode.id)
+            tCompiled = (
+                compile(tAstNode, '<expression>', mode='eval'),
+                tuple(astrNames)
+            )
+            with self.m_tLock:
+                self.m_atCompiledExpressions[strExpression] = tCompiled
+
+        return tCompiled
+
+    def evaluate_expression(self, strExpression, atTemporaryConstants=None):
+        """ Evaluate an expression with the constants.
+
+        The names in the expression are looked up in the constants of the
+        patch definition first and then in atTemporaryConstants. Results
+        which depend only on the constants are cached.
+        """
+        # Plain decimal and hex numbers do not need the AST.
+        if s_reNumericLiteral.match(strExpression) is not None:
+            return int(strExpression, 0)
+
+        uiGeneration = self.m_uiConstantsGeneration
+        with self.m_tLock:
+            # Drop all folded results if the constants changed.
+            if uiGeneration != self.m_uiFoldedExpressionsGeneration:
+                self.m_atFoldedExpressions = dict({})
+                self.m_uiFoldedExpressionsGeneration = uiGeneration
+            fFolded = strExpression in self.m_atFoldedExpressions
+            if fFolded is True:
+                tResult = self.m_atFoldedExpressions[strExpression]
+
+        if fFolded is False:
+            tCode, astrNames = self.__compile_expression(strExpression)
+
+            # Get the values for all names in the expression.
+            atConstants = self.m_atConstants
+            atValues = dict({})
+            fOnlyConstants = True
+            for strName in astrNames:
+                if strName in atConstants:
+                    atValues[strName] = atConstants[strName]
+                elif(
+                    atTemporaryConstants is not None and
+                    strName in atTemporaryConstants
+                ):
+                    atValues[strName] = atTemporaryConstants[strName]
+                    fOnlyConstants = False
+                else:
+                    raise Exception('Unknown constant %s.' % strName)
+
+            tResult = eval(tCode, dict({'__builtins__': {}}), atValues)
+
+            if fOnlyConstants is True:
+                with self.m_tLock:
+                    if uiGeneration == self.m_uiFoldedExpressionsGeneration:
+                        self.m_atFoldedExpressions[strExpression] = tResult
+
+        return tResult
 
     def get_patch_definition(self, strOptionId):
         if strOptionId not in self.m_atPatchDefinitions:
             raise Exception('The option ID %s was not found!' % strOptionId)
 
         return self.m_atPatchDefinitions[strOptionId]
-
-    def setTemporaryConstants(self, atConstants):
-        self.m_cAstConstResolver.setTemporaryConstants(atConstants)
@@ -20,11 +20,51 @@
 # *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
 # ***************************************************************************
 
+import fnmatch
 import hashlib
 import os
 import os.path
 import sqlite3
+import stat
 import xml.dom.minidom
+import xml.etree.ElementTree
+
+# The thread pool is not available on Python 2 without the "futures"
+# backport. Scan the search paths in the main thread in this case.
+try:
+    import concurrent.futures
+    fHaveConcurrentFutures = True
+except ImportError:
+    fHaveConcurrentFutures = False
+
+# os.scandir is new in Python 3.5 . Older versions list the folders with
+# os.listdir and get the stat of each entry.
+fHaveScandir = hasattr(os, 'scandir')
+
+
+class SerialJob:
+    # A job which already ran in the calling thread. It has the "result"
+    # method of a future.
+    __tResult = None
+
+    def __init__(self, pfnJob, atArgs):
+        self.__tResult = pfnJob(*atArgs)
+
+    def result(self):
+        return self.__tResult
+
+
+class SerialExecutor:
+    # This replaces the thread pool. It runs each job when it is
+    # submitted.
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tExcType, tExcValue, tTraceback):
+        return False
+
+    def submit(self, pfnJob, *atArgs):
+        return SerialJob(pfnJob, atArgs)
 
 
 class SnippetLibrary:
@@ -40,10 +80,60 @@ class SnippetLibrary:
     # The list of folders to scan recursively for snippets.
     __astrSnippetSearchPaths = None
 
+    # Folders with a name matching one of these patterns are not scanned.
+    __astrExcludes = None
+
+    # The number of threads for scanning the search paths.
+    __sizJobs = None
+
     # The snippet library was already scanned if this flag is set.
     __fSnipLibIsAlreadyScanned = None
 
-    def __init__(self, strDatabasePath, astrSnippetSearchPaths, debug=False):
+    # These are the steps to migrate the database schema. Step N updates
+    # the schema from version N to N+1. The version is stored in the
+    # "user_version" of the database. Never change an existing step, add a
+    # new one instead.
+    __aastrMigrations = [
+        [
+            'CREATE TABLE snippets ('
+            'id INTEGER PRIMARY KEY, '
+            'search_path TEXT NOT NULL, '
+            'path TEXT NOT NULL, '
+            'hash TEXT NOT NULL, '
+            'groupid TEXT NOT NULL, '
+            'artifact TEXT NOT NULL, '
+            'version TEXT NOT NULL, '
+            'clean INTEGER DEFAULT 0)'
+        ],
+        [
+            # Existing entries get a stat of 0. They are hashed again on
+            # the next scan.
+            'ALTER TABLE snippets '
+            'ADD COLUMN mtime_ns INTEGER NOT NULL DEFAULT 0',
+            'ALTER TABLE snippets '
+            'ADD COLUMN size INTEGER NOT NULL DEFAULT 0',
+            'ALTER TABLE snippets '
+            'ADD COLUMN inode INTEGER NOT NULL DEFAULT 0'
+        ],
+        [
+            'CREATE INDEX snippets_gav '
+            'ON snippets (groupid, artifact, version)',
+            'CREATE INDEX snippets_path '
+            'ON snippets (search_path, path)'
+        ]
+    ]
+
+    # These folders are not scanned by default. They hold version control
+    # data. Other folders like build results can be excluded with the
+    # "excludes" parameter.
+    __astrDefaultExcludes = [
+        '.git',
+        '.hg',
+        '.svn'
+    ]
+
+    def __init__(self, strDatabasePath, astrSnippetSearchPaths, debug=False,
+                 excludes=None, jobs=None):
         self.__fDebug = bool(debug)
 
         # Set the filename of the SQLITE3 database.
@@ -65,6 +155,19 @@ class SnippetLibrary:
             for strPath in self.__astrSnippetSearchPaths:
                 print('[SnipLib] Configuration: Search path "%s"' % strPath)
 
+        # Do not scan folders matching one of the exclude patterns.
+        if excludes is None:
+            self.__astrExcludes = list(self.__astrDefaultExcludes)
+        else:
+            self.__astrExcludes = list(excludes)
+        if self.__fDebug:
+            for strPattern in self.__astrExcludes:
+                print('[SnipLib] Configuration: Exclude "%s"' % strPattern)
+
+        # Use one thread per CPU if the number of jobs is not set. Scan in
+        # the main thread if it is 1.
+        self.__sizJobs = jobs
+
         # The snippet library was not scanned yet.
         self.__fSnipLibIsAlreadyScanned = False
 
@@ -107,79 +210,121 @@ class SnippetLibrary:
     def __db_open(self):
         tDb = self.__tDb
         if tDb is None:
-            tDb = sqlite3.connect(self.__strDatabasePath)
+            tDb = sqlite3.connect(
+                self.__strDatabasePath,
+                cached_statements=256
+            )
             self.__tDb = tDb
 
+            # A write-ahead log lets other compilers read the database while
+            # a scan updates it. In-memory databases ignore this.
+            tDb.execute('PRAGMA journal_mode=WAL')
+
+            self.__db_migrate()
+
+    def __db_migrate(self):
+        tDb = self.__tDb
+
+        # Control the transaction here. The sqlite3 module of Python 2
+        # commits before each CREATE or ALTER statement and the module of
+        # Python 3 does not start a transaction for them.
+        strIsolationLevel = tDb.isolation_level
+        tDb.isolation_level = None
         tCursor = tDb.cursor()
 
-        # Construct the "CREATE" statement for the "snippets" table.
-        strCreateStatement = (
-            'CREATE TABLE snippets ('
-            'id INTEGER PRIMARY KEY, '
-            'search_path TEXT NOT NULL, '
-            'path TEXT NOT NULL, '
-            'hash TEXT NOT NULL, '
-            'groupid TEXT NOT NULL, '
-            'artifact TEXT NOT NULL, '
-            'version TEXT NOT NULL, '
-            'clean INTEGER DEFAULT 0)'
-        )
+        # Lock the database before the schema version is read. Other
+        # compilers sharing the database wait until the migration is done.
+        tCursor.execute('BEGIN IMMEDIATE')
+        try:
+            self.__db_migrate_steps(tCursor)
+            tCursor.execute('COMMIT')
+        except Exception:
+            tCursor.execute('ROLLBACK')
+            raise
+        finally:
+            tDb.isolation_level = strIsolationLevel
+
+    def __db_migrate_steps(self, tCursor):
+        # Get the schema version of the database.
+        tCursor.execute('PRAGMA user_version')
+        uiVersion = tCursor.fetchone()[0]
+
+        # Databases from older versions of the compiler have no schema
+        # version. Guess it from the columns of the "snippets" table.
+        if uiVersion == 0:
+            tCursor.execute('PRAGMA table_info(snippets)')
+            astrColumns = [tRes[1] for tRes in tCursor.fetchall()]
+            if len(astrColumns) == 0:
+                uiVersion = 0
+            elif 'mtime_ns' in astrColumns:
+                uiVersion = 2
+            else:
+                uiVersion = 1
+
         if self.__fDebug:
-            print('[SnipLib] Database: The current CREATE statement for the '
-                  '"snippet" table is "%s".' % strCreateStatement)
-
-        # Compare the current "CREATE" statement with the statement of the
-        # existing table.
-        tCursor.execute('SELECT sql FROM sqlite_master WHERE name="snippets"')
-        tRes = tCursor.fetchone()
-        if tRes is None:
-            # The table does not exist yet. Create it now.
-            if self.__fDebug:
-                print('[SnipLib] Database: The "snippet" table does not yet '
-                      'exist. Create it now.')
-            tCursor.execute(strCreateStatement)
-            tDb.commit()
-        elif tRes[0] != strCreateStatement:
-            if self.__fDebug:
-                print('[SnipLib] Database: The existing "snippet" table has '
-                      'a different CREATE statement: "%s".' % tRes[0])
-                print('[SnipLib] Database: Delete the existing table and '
-                      're-create it.')
-            # Delete the old table.
-            tCursor.execute('DROP TABLE snippets')
-            tDb.commit()
-            # Create a new table.
-            tCursor.execute(strCreateStatement)
-            tDb.commit()
-        else:
+            print('[SnipLib] Database: The schema has version %d. The current '
+                  'version is %d.' % (uiVersion, len(self.__aastrMigrations)))
+
+        if uiVersion > len(self.__aastrMigrations):
+            raise Exception(
+                'The snippet database "%s" has the schema version %d, which '
+                'is newer than the supported version %d.' % (
+                    self.__strDatabasePath,
+                    uiVersion,
+                    len(self.__aastrMigrations)
+                )
+            )
+
+        # Run all missing migration steps. The existing entries are kept.
+        for uiStep in range(uiVersion, len(self.__aastrMigrations)):
             if self.__fDebug:
-                print('[SnipLib] Database: The existing "snippet" table was '
-                      'created with the correct statement.')
+                print('[SnipLib] Database: Migrating the schema to '
+                      'version %d.' % (uiStep + 1))
+            for strStatement in self.__aastrMigrations[uiStep]:
+                tCursor.execute(strStatement)
+        tCursor.execute(
+            'PRAGMA user_version=%d' % len(self.__aastrMigrations)
+        )
 
     def __snippet_get_gav(self, strPath):
         strGroup = None
         strArtifact = None
         strVersion = None
 
-        # Parse the snippet.
+        # Only read the start of the snippet up to the "Info" node. The
+        # complete file is parsed later when the snippet is used.
+        tInfoNode = None
+        fValidXml = False
         try:
-            tXml = xml.dom.minidom.parse(strPath)
-        except xml.dom.DOMException as tException:
+            with open(strPath, 'rb') as tFile:
+                sizDepth = 0
+                for strEvent, tNode in xml.etree.ElementTree.iterparse(
+                    tFile,
+                    events=('start', 'end')
+                ):
+                    if strEvent == 'start':
+                        sizDepth += 1
+                        # Look for an "Info" node below the root node.
+                        if sizDepth == 2 and \
+                           tNode.tag.rpartition('}')[2] == 'Info':
+                            tInfoNode = tNode
+                            break
+                    else:
+                        sizDepth -= 1
+                fValidXml = True
+        except xml.etree.ElementTree.ParseError as tException:
             # Invalid XML, ignore.
             strArtifact = 'No valid XML: %s' % repr(tException)
-            tXml = None
 
-        if tXml is not None:
-            # Search for the "Info" node.
-            tInfoNode = self.__xml_get_node(tXml.documentElement, 'Info')
+        if fValidXml is True:
             if tInfoNode is None:
                 # No Info node -> ignore the file.
                 strArtifact = 'It has no "Info" node.'
             else:
                 # Get the "group", "artifact" and "version" attributes.
-                strGroup = tInfoNode.getAttribute('group')
-                strArtifact = tInfoNode.getAttribute('artifact')
-                strVersion = tInfoNode.getAttribute('version')
+                strGroup = tInfoNode.get('group', '')
+                strArtifact = tInfoNode.get('artifact', '')
+                strVersion = tInfoNode.get('version', '')
                 if len(strGroup) == 0:
                     strGroup = None
                     strArtifact = (
@@ -235,125 +380,270 @@ class SnippetLibrary:
             'UPDATE snippets SET clean=1 WHERE search_path=?',
             (strSearchPath, )
         )
-        self.__tDb.commit()
 
-    def __sniplib_scan(self, strSearchPath):
+    def __is_excluded(self, strName):
+        fExcluded = False
+        for strPattern in self.__astrExcludes:
+            if fnmatch.fnmatchcase(strName, strPattern) is True:
+                fExcluded = True
+                break
+        return fExcluded
+
+    def __get_stat_key(self, tStat):
+        # Get the modification time, size and inode of a file. Python 2 has
+        # no st_mtime_ns. The float time is less exact, but a wrong guess
+        # only costs one more hash of the file.
+        ulMtimeNs = getattr(tStat, 'st_mtime_ns', None)
+        if ulMtimeNs is None:
+            ulMtimeNs = int(tStat.st_mtime * 1000000000)
+        return (ulMtimeNs, tStat.st_size, tStat.st_ino)
+
+    def __list_folder(self, strFolder):
+        # Get the subfolders and the XML files of strFolder. Return a list
+        # with the paths of the subfolders and a list of (path, stat)
+        # tuples for the files. Raise OSError if the folder can not be
+        # read.
+        astrFolders = []
+        atFiles = []
+        if fHaveScandir is True:
+            tIterator = os.scandir(strFolder)
+            try:
+                for tEntry in tIterator:
+                    try:
+                        if tEntry.is_dir() is True:
+                            astrFolders.append((tEntry.name, tEntry.path))
+                        elif(
+                            tEntry.name.endswith('.xml') is True and
+                            tEntry.is_file() is True
+                        ):
+                            atFiles.append((tEntry.path, tEntry.stat()))
+                    except OSError:
+                        # The entry vanished or is a broken link.
+                        pass
+            finally:
+                if hasattr(tIterator, 'close') is True:
+                    tIterator.close()
+
+        else:
+            for strName in os.listdir(strFolder):
+                strPath = os.path.join(strFolder, strName)
+                try:
+                    tStat = os.stat(strPath)
+                except OSError:
+                    # The entry vanished or is a broken link.
+                    continue
+                if stat.S_ISDIR(tStat.st_mode):
+                    astrFolders.append((strName, strPath))
+                elif(
+                    strName.endswith('.xml') is True and
+                    stat.S_ISREG(tStat.st_mode)
+                ):
+                    atFiles.append((strPath, tStat))
+
+        return astrFolders, atFiles
+
+    def __sniplib_walk(self, strSearchPath):
+        # Collect all XML files below the search path with their stat.
+        atFiles = []
+
+        # Symbolic links are followed. Remember the device and inode of all
+        # visited folders to stop at loops.
+        atVisited = set()
+
+        astrFolders = [strSearchPath]
+        while len(astrFolders) != 0:
+            strFolder = astrFolders.pop()
+
+            # Ignore folders which can not be read like os.walk does.
+            try:
+                tStat = os.stat(strFolder)
+            except OSError:
+                continue
+            tFolderKey = (tStat.st_dev, tStat.st_ino)
+            if tFolderKey in atVisited:
+                continue
+            atVisited.add(tFolderKey)
+
+            try:
+                atSubFolders, atFolderFiles = self.__list_folder(strFolder)
+            except OSError:
+                continue
+
+            for strName, strPath in atSubFolders:
+                if self.__is_excluded(strName) is False:
+                    astrFolders.append(strPath)
+                elif self.__fDebug:
+                    print('[SnipLib] Skipping excluded folder "%s".' %
+                          strPath)
+            for strPath, tStat in atFolderFiles:
+                atFiles.append((strPath, self.__get_stat_key(tStat)))
+
+        return atFiles
+
+    def __sniplib_get_known_snippets(self, strSearchPath):
+        # Get all known snippets of the search path with one query.
+        atKnownSnippets = {}
+        tCursor = self.__tDb.cursor()
+        tCursor.execute(
+            'SELECT path,id,hash,mtime_ns,size,inode FROM snippets WHERE '
+            'search_path=?', (strSearchPath, )
+        )
+        for tRes in tCursor.fetchall():
+            atKnownSnippets[tRes[0]] = tRes[1:]
+        return atKnownSnippets
+
+    def __sniplib_examine(self, strAbsPath, strKnownDigest):
+        # This runs in a worker thread. It must not use the database.
+        strDigest = self.__get_snip_hash(strAbsPath)
+
+        # Only new or modified snippets need the group, artifact and
+        # version.
+        atGav = None
+        if strDigest != strKnownDigest:
+            atGav = self.__snippet_get_gav(strAbsPath)
+
+        return strDigest, atGav
+
+    def __sniplib_start_scan(self, strSearchPath, tWalk, tExecutor):
+        atKnownSnippets = self.__sniplib_get_known_snippets(strSearchPath)
+        atFiles = tWalk.result()
+
+        # Hash all new files and files with a new modification time, size
+        # or inode in the worker threads.
+        atJobs = {}
+        for strAbsPath, atStat in atFiles:
+            atResults = atKnownSnippets.get(strAbsPath)
+            if atResults is None:
+                atJobs[strAbsPath] = tExecutor.submit(
+                    self.__sniplib_examine,
+                    strAbsPath,
+                    None
+                )
+            elif atResults[2:] != atStat:
+                atJobs[strAbsPath] = tExecutor.submit(
+                    self.__sniplib_examine,
+                    strAbsPath,
+                    atResults[1]
+                )
+
+        return atKnownSnippets, atFiles, atJobs
+
+    def __sniplib_scan(self, strSearchPath, atKnownSnippets, atFiles, atJobs):
         if self.__fDebug:
             print('[SnipLib] Scan: Scanning search path "%s".' %
                   strSearchPath)
 
         tCursor = self.__tDb.cursor()
-        # Search all files recursively.
-        for strRoot, astrDirs, astrFiles in os.walk(strSearchPath,
-                                                    followlinks=True):
-            # Process all files in this folder.
-            for strFile in astrFiles:
-                # Get the extension of the file.
-                strDummy, strExt = os.path.splitext(strFile)
-                if strExt == '.xml':
-                    # Get the absolute path for the file.
-                    strAbsPath = os.path.join(strRoot, strFile)
-
-                    # Get the stamp of the snip.
-                    strDigest = self.__get_snip_hash(strAbsPath)
 
+        # Collect the IDs of all unchanged snippets.
+        auiUnchanged = []
+
+        # Process all files found in the search path.
+        for strAbsPath, atStat in atFiles:
+            atResults = atKnownSnippets.get(strAbsPath)
+            tJob = atJobs.get(strAbsPath)
+            if tJob is None:
+                if self.__fDebug:
+                    print('[SnipLib] Scan:  -> Found unchanged snippet at '
+                          '"%s".' % strAbsPath)
+                auiUnchanged.append((atResults[0], ))
+                continue
+
+            # Get the stamp of the snip.
+            strDigest, atGav = tJob.result()
+
+            if self.__fDebug:
+                print('[SnipLib] Scan:  -> Found snippet at "%s" with the '
+                      'hash "%s".' % (strAbsPath, strDigest))
+
+            if atResults is None:
+                # The snippet is not present in the database yet.
+                if self.__fDebug:
+                    print(
+                        '[SnipLib] Scan:      -> The snippet is not '
+                        'registered in the cache yet. Make a new '
+                        'entry now.'
+                    )
+                strGroup, strArtifact, strVersion = atGav
+                if strGroup is None:
                     if self.__fDebug:
-                        print('[SnipLib] Scan:  -> Found snippet at "%s" '
-                              'with the hash "%s".' % (strAbsPath, strDigest))
+                        print(
+                            '[SnipLib] Scan:      -> Warning: '
+                            'Ignoring file "%s". %s' % (
+                                strAbsPath,
+                                strArtifact
+                            )
+                        )
 
-                    # Search the snippet in the database.
+                # Make a new entry.
+                tCursor.execute(
+                    'INSERT INTO snippets '
+                    '(search_path, path, hash, groupid, '
+                    'artifact, version, mtime_ns, size, inode) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                        strSearchPath,
+                        strAbsPath,
+                        strDigest,
+                        strGroup,
+                        strArtifact,
+                        strVersion
+                    ) + atStat
+                )
+
+            else:
+                # Compare the hash of the file.
+                if atResults[1] == strDigest:
+                    # The hash is the same -> the file is
+                    # already known.
+                    if self.__fDebug:
+                        print('[SnipLib] Scan:      -> The snippet is'
+                              ' already registered in the cache.')
+
+                    # Found the file. Do not delete it from the
+                    # database and remember the new stat.
                     tCursor.execute(
-                        'SELECT id,hash FROM snippets WHERE search_path=? '
-                        'AND path=?', (
-                            strSearchPath,
-                            strAbsPath
-                        )
+                        'UPDATE snippets SET mtime_ns=?, size=?, '
+                        'inode=?, clean=0 WHERE id=?',
+                        atStat + (atResults[0], )
                     )
-                    atResults = tCursor.fetchone()
-                    if atResults is None:
-                        # The snippet is not present in the database yet.
+
+                else:
+                    # The hash differs. Update the entry with the new
+                    # hash, group, artifact and version.
+                    if self.__fDebug:
+                        print(
+                            '[SnipLib] Scan:      -> The snippet has '
+                            'a different hash than the entry in the '
+                            'cache. Update the metadata now.'
+                        )
+
+                    strGroup, strArtifact, strVersion = atGav
+                    if strGroup is None:
                         if self.__fDebug:
                             print(
-                                '[SnipLib] Scan:      -> The snippet is not '
-                                'registered in the cache yet. Make a new '
-                                'entry now.'
-                            )
-                        strGroup, strArtifact, strVersion = \
-                            self.__snippet_get_gav(strAbsPath)
-                        if strGroup is None:
-                            if self.__fDebug:
-                                print(
-                                    '[SnipLib] Scan:      -> Warning: '
-                                    'Ignoring file "%s". %s' % (
-                                        strAbsPath,
-                                        strArtifact
-                                    )
+                                '[SnipLib] Scan:      -> Warning: '
+                                'Ignoring file "%s". %s' % (
+                                    strAbsPath,
+                                    strArtifact
                                 )
-
-                        # Make a new entry.
+                            )
+                    else:
                         tCursor.execute(
-                            'INSERT INTO snippets '
-                            '(search_path, path, hash, groupid, '
-                            'artifact, version) VALUES '
-                            '(?, ?, ?, ?, ?, ?)', (
-                                strSearchPath,
-                                strAbsPath,
+                            'UPDATE snippets SET hash=?, groupid=?, '
+                            'artifact=?, version=?, mtime_ns=?, '
+                            'size=?, inode=?, clean=0 WHERE id=?', (
                                 strDigest,
                                 strGroup,
                                 strArtifact,
                                 strVersion
-                            )
+                            ) + atStat + (atResults[0], )
                         )
 
-                    else:
-                        # Compare the hash of the file.
-                        if atResults[1] == strDigest:
-                            # The hash is the same -> the file is
-                            # already known.
-                            if self.__fDebug:
-                                print('[SnipLib] Scan:      -> The snippet is'
-                                      ' already registered in the cache.')
-
-                            # Found the file. Do not delete it from the
-                            # database.
-                            tCursor.execute(
-                                'UPDATE snippets SET clean=0 WHERE id=?',
-                                (atResults[0], )
-                            )
-
-                        else:
-                            # The hash differs. Update the entry with the new
-                            # hash, group, artifact and version.
-                            if self.__fDebug:
-                                print(
-                                    '[SnipLib] Scan:      -> The snippet has '
-                                    'a different hash than the entry in the '
-                                    'cache. Update the metadata now.'
-                                )
-
-                            strGroup, strArtifact, strVersion = \
-                                self.__snippet_get_gav(strAbsPath)
-                            if strGroup is None:
-                                if self.__fDebug:
-                                    print(
-                                        '[SnipLib] Scan:      -> Warning: '
-                                        'Ignoring file "%s". %s' % (
-                                            strAbsPath,
-                                            strArtifact
-                                        )
-                                    )
-                            else:
-                                tCursor.execute(
-                                    'UPDATE snippets SET hash=?, groupid=?, '
-                                    'artifact=?, version=?, clean=0 WHERE '
-                                    'id=?', (
-                                        strDigest,
-                                        strGroup,
-                                        strArtifact,
-                                        strVersion,
-                                        atResults[0]
-                                    )
-                                )
+        # Keep all unchanged snippets.
+        tCursor.executemany(
+            'UPDATE snippets SET clean=0 WHERE id=?',
+            auiUnchanged
+        )
 
     def __sniplib_forget_invalid_entries(self, strSearchPath):
         # Remove all entries from the cache which are marked for clean.
@@ -386,7 +676,6 @@ class SnippetLibrary:
             'DELETE FROM snippets WHERE clean!=0 AND search_path=?',
             (strSearchPath, )
         )
-        self.__tDb.commit()
 
     def find(self, strGroup, strArtifact, strVersion, atParameter):
         # Open the connection to the database.
@@ -394,28 +683,63 @@ class SnippetLibrary:
 
         # Scan each search path.
         if self.__fSnipLibIsAlreadyScanned is not True:
-            for strSearchPath in self.__astrSnippetSearchPaths:
-                self.__sniplib_invalidate(strSearchPath)
-                self.__sniplib_scan(strSearchPath)
-                self.__sniplib_forget_invalid_entries(strSearchPath)
+            if (fHaveConcurrentFutures is not True) or (self.__sizJobs == 1):
+                tExecutor = SerialExecutor()
+            else:
+                tExecutor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.__sizJobs
+                )
+            with tExecutor:
+                # Walk all search paths at the same time.
+                atWalks = []
+                for strSearchPath in self.__astrSnippetSearchPaths:
+                    atWalks.append(tExecutor.submit(
+                        self.__sniplib_walk,
+                        strSearchPath
+                    ))
+
+                # Start hashing the changed files of all search paths.
+                atScans = []
+                for strSearchPath, tWalk in zip(
+                    self.__astrSnippetSearchPaths,
+                    atWalks
+                ):
+                    atScans.append(self.__sniplib_start_scan(
+                        strSearchPath,
+                        tWalk,
+                        tExecutor
+                    ))
+
+                for strSearchPath, atScan in zip(
+                    self.__astrSnippetSearchPaths,
+                    atScans
+                ):
+                    # Update the cache for one search path in a single
+                    # transaction.
+                    with self.__tDb:
+                        self.__sniplib_invalidate(strSearchPath)
+                        self.__sniplib_scan(strSearchPath, *atScan)
+                        self.__sniplib_forget_invalid_entries(strSearchPath)
             self.__fSnipLibIsAlreadyScanned = True
 
-        # Search for the snippet in each search path. Stop on the first hit.
-        atMatch = None
+        # Get all snippets with the GAV from the index. Use the one from the
+        # first search path.
         tCursor = self.__tDb.cursor()
-        for strSearchPath in self.__astrSnippetSearchPaths:
-            tCursor.execute(
-                'SELECT path FROM snippets WHERE search_path=? AND groupid=? '
-                'AND artifact=? AND version=?', (
-                    strSearchPath,
-                    strGroup,
-                    strArtifact,
-                    strVersion
-                )
+        tCursor.execute(
+            'SELECT search_path,path FROM snippets WHERE groupid=? '
+            'AND artifact=? AND version=?', (
+                strGroup,
+                strArtifact,
+                strVersion
             )
-            atResult = tCursor.fetchone()
-            if atResult is not None:
-                atMatch = atResult
+        )
+        atPaths = {}
+        for tRes in tCursor.fetchall():
+            atPaths.setdefault(tRes[0], (tRes[1], ))
+        atMatch = None
+        for strSearchPath in self.__astrSnippetSearchPaths:
+            if strSearchPath in atPaths:
+                atMatch = atPaths[strSearchPath]
                 break
 
         # Get the snippet name for messages.
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+# Benchmark the table driven CRC functions against the old implementations
+# from test_crc.py .
+#
+# Run it from any folder:
+#   python tests/bench_crc.py [--size N]
+
+import argparse
+import array
+import random
+import timeit
+
+from test_crc import crc7_reference, crc16_reference, hboot_image
+
+
+def main():
+    tParser = argparse.ArgumentParser(
+        description='Benchmark the CRC7 and CRC16 functions.'
+    )
+    tParser.add_argument(
+        '--size',
+        dest='sizData',
+        type=int,
+        default=0x10000,
+        help='Size of the data in bytes.'
+    )
+    tParser.add_argument(
+        '--repeat',
+        dest='uiRepeat',
+        type=int,
+        default=3,
+        help='Take the best of this many runs.'
+    )
+    tArgs = tParser.parse_args()
+
+    tRandom = random.Random(0x4d2)
+    aucData = array.array(
+        'B',
+        [tRandom.randint(0, 255) for uiCnt in range(tArgs.sizData)]
+    )
+
+    for strName, fnOld, fnNew in (
+        ('crc7', crc7_reference, hboot_image.crc7),
+        ('crc16', crc16_reference, hboot_image.crc16)
+    ):
+        if fnOld(aucData) != fnNew(aucData):
+            raise Exception('The %s functions return different values.' %
+                            strName)
+
+        fTimeOld = min(timeit.repeat(
+            lambda: fnOld(aucData),
+            repeat=tArgs.uiRepeat,
+            number=1
+        ))
+        fTimeNew = min(timeit.repeat(
+            lambda: fnNew(aucData),
+            repeat=tArgs.uiRepeat,
+            number=1
+        ))
+        print('%s over %d bytes: old %.3f s, new %.3f s' % (
+            strName,
+            tArgs.sizData,
+            fTimeOld,
+            fTimeNew
+        ))
+
+
+if __name__ == '__main__':
+    main()
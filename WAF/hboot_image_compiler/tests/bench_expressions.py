@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+# Benchmark the numeric expressions of a large UInt32 node.
+#
+# The contents of the node are parsed with the old approach (parse, resolve
+# the constants, compile and evaluate each element) and with the list
+# parser of HbootImage. One node has only plain numbers, the other one
+# mixes numbers with expressions using constants of the patch table.
+#
+# Run it from any folder:
+#   python tests/bench_expressions.py [--elements N]
+
+import argparse
+import ast
+import array
+import os
+import sys
+import timeit
+
+strRoot = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir
+)
+sys.path.insert(0, strRoot)
+
+from com.hboot_image import HbootImage  # noqa: E402
+
+
+def make_uint32_node(sizElements, fWithExpressions):
+    # Generate the text of a UInt32 node.
+    astrElements = []
+    for uiElement in range(sizElements):
+        uiKind = uiElement % 4
+        if (fWithExpressions is True) and (uiKind == 2):
+            strElement = 'BOOTDEV_ETH_LVDS0 + %d' % uiElement
+        elif (fWithExpressions is True) and (uiKind == 3):
+            strElement = '(1 << %d) | BOOTDEV_DPM0_PAR' % (uiElement % 24)
+        elif (uiKind % 2) == 0:
+            strElement = '0x%08x' % (uiElement * 0x01010101 & 0xffffffff)
+        else:
+            strElement = '%d' % uiElement
+        astrElements.append(strElement)
+    return ',\n'.join(astrElements)
+
+
+def parse_uint32_node_old(tPatchDefinitions, strText):
+    # This is the parser before the expression cache was introduced.
+    aulNumbers = []
+    for strNumber in strText.split(','):
+        tAstNode = ast.parse(strNumber.strip(), mode='eval')
+        tAstResolved = tPatchDefinitions.resolve_constants(tAstNode)
+        aulNumbers.append(eval(compile(tAstResolved, 'lala', mode='eval')))
+    return array.array('I', aulNumbers)
+
+
+def main():
+    tParser = argparse.ArgumentParser(
+        description='Benchmark the expressions of a large UInt32 node.'
+    )
+    tParser.add_argument(
+        '--elements',
+        dest='sizElements',
+        type=int,
+        default=20000,
+        help='Number of elements in the UInt32 node.'
+    )
+    tParser.add_argument(
+        '--repeat',
+        dest='uiRepeat',
+        type=int,
+        default=3,
+        help='Take the best of this many runs.'
+    )
+    tArgs = tParser.parse_args()
+
+    tCompiler = HbootImage(
+        dict({}),
+        'NETX90',
+        patch_definition=os.path.join(
+            strRoot,
+            'patch_tables',
+            'hboot_netx90_patch_table.xml'
+        )
+    )
+    tPatchDefinitions = tCompiler._HbootImage__cPatchDefinitions
+    fnParseList = tCompiler._HbootImage__parse_numeric_list
+
+    for strName, fWithExpressions in (
+        ('plain numbers', False),
+        ('with expressions', True)
+    ):
+        strText = make_uint32_node(tArgs.sizElements, fWithExpressions)
+
+        aulOld = parse_uint32_node_old(tPatchDefinitions, strText)
+        strNew = fnParseList(strText, 'I')
+        if array.array('I', strNew) != aulOld:
+            raise Exception('The parsers return different values.')
+
+        fTimeOld = min(timeit.repeat(
+            lambda: parse_uint32_node_old(tPatchDefinitions, strText),
+            repeat=tArgs.uiRepeat,
+            number=1
+        ))
+        fTimeNew = min(timeit.repeat(
+            lambda: fnParseList(strText, 'I'),
+            repeat=tArgs.uiRepeat,
+            number=1
+        ))
+        print('%d elements, %s: old %.3f s, new %.3f s' % (
+            tArgs.sizElements,
+            strName,
+            fTimeOld,
+            fTimeNew
+        ))
+
+
+if __name__ == '__main__':
+    main()
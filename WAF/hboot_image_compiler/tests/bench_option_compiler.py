@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+# Benchmark the option compiler with a large set of DDR and SPI options.
+#
+# The options are generated for the netX4000 patch table. There are DDR
+# scripts with all commands, RAW options with SPI macros and RAW options
+# with U32 elements. The generated set is always the same, so the
+# printed SHA256 of the compiled options must not change between
+# revisions of the option compiler.
+#
+# Run it from any folder:
+#   python tests/bench_option_compiler.py [--options N]
+
+import argparse
+import hashlib
+import os
+import sys
+import timeit
+import xml.dom.minidom
+
+strRoot = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir
+)
+sys.path.insert(0, strRoot)
+
+from com import option_compiler  # noqa: E402
+from com import patch_definitions  # noqa: E402
+
+
+def make_ddr_script(uiOption, sizCommands):
+    # Generate a DDR node with all commands.
+    astrCommands = []
+    for uiCommand in range(sizCommands):
+        uiKind = uiCommand % 5
+        ulData = (uiOption * 0x01000193 + uiCommand * 0x9e3779b9) & 0xffffffff
+        ucRegister = (uiOption + uiCommand) & 0xff
+        if uiKind == 0:
+            astrCommands.append(
+                '<WritePhy register="%d" data="0x%08x"/>' %
+                (ucRegister, ulData)
+            )
+        elif uiKind == 1:
+            astrCommands.append(
+                '<WriteCtrl register="0x%02x" data="%d"/>' %
+                (ucRegister, ulData)
+            )
+        elif uiKind == 2:
+            astrCommands.append('<Delay ticks="%d"/>' % (uiCommand * 10))
+        elif uiKind == 3:
+            astrCommands.append(
+                '<PollPhy register="%d" mask="0x%08x" data="0x%08x" '
+                'ticks="1000"/>' % (ucRegister, ulData, ulData & 0xff00ff00)
+            )
+        else:
+            astrCommands.append(
+                '<PollCtrl register="%d" mask="0xffffffff" data="0x%08x" '
+                'ticks="%d"/>' % (ucRegister, ulData, uiOption + 1)
+            )
+    return '<DDR>%s</DDR>' % ''.join(astrCommands)
+
+
+def make_spi_macro(uiOption, sizBytes):
+    # Generate an SPI macro with numbers, expressions and labels.
+    astrLines = ['# SPI macro %d' % uiOption]
+    for uiLine in range(sizBytes // 8):
+        astrElements = []
+        for uiElement in range(8):
+            uiValue = (uiOption + uiLine * 8 + uiElement) & 0xff
+            uiKind = uiElement % 4
+            if uiKind == 0:
+                astrElements.append('0x%02x' % uiValue)
+            elif uiKind == 1:
+                astrElements.append('%d' % uiValue)
+            elif uiKind == 2:
+                astrElements.append('SPI_MACRO_CHANGE_TRANSPORT_FIFO')
+            else:
+                astrElements.append('L%d' % (uiLine % 4))
+        strLine = ', '.join(astrElements)
+        if uiLine < 4:
+            strLine = 'L%d: 0\n%s' % (uiLine, strLine)
+        astrLines.append(strLine)
+    return '<SPIM>\n%s\n</SPIM>' % ',\n'.join(astrLines)
+
+
+def make_options(sizOptions):
+    astrOptions = []
+    for uiOption in range(sizOptions):
+        uiKind = uiOption % 4
+        if uiKind == 0:
+            astrOptions.append(
+                '<Option id="ddr_script">%s</Option>' %
+                make_ddr_script(uiOption, 150)
+            )
+        elif uiKind == 1:
+            astrOptions.append(
+                '<Option id="ddr"><U32>%d</U32>%s</Option>' % (
+                    uiOption * 1000,
+                    make_ddr_script(uiOption, 100)
+                )
+            )
+        elif uiKind == 2:
+            astrOptions.append(
+                '<Option id="RAW" offset="0x%x">%s</Option>' % (
+                    uiOption * 0x10,
+                    make_spi_macro(uiOption, 1024)
+                )
+            )
+        else:
+            astrOptions.append(
+                '<Option id="RAW" offset="0x%x"><U32>%s</U32></Option>' % (
+                    uiOption * 0x10,
+                    ','.join([
+                        '0x%08x' % ((uiOption << 16) | uiValue)
+                        for uiValue in range(256)
+                    ])
+                )
+            )
+    return '<Options>%s</Options>' % ''.join(astrOptions)
+
+
+def main():
+    tParser = argparse.ArgumentParser(
+        description='Benchmark the option compiler.'
+    )
+    tParser.add_argument(
+        '--options',
+        dest='sizOptions',
+        type=int,
+        default=400,
+        help='Number of generated options.'
+    )
+    tParser.add_argument(
+        '--repeat',
+        dest='uiRepeat',
+        type=int,
+        default=3,
+        help='Take the best of this many runs.'
+    )
+    tArgs = tParser.parse_args()
+
+    tPatchDefinitions = patch_definitions.PatchDefinitions()
+    tPatchDefinitions.read_patch_definition(
+        os.path.join(strRoot, 'patch_tables', 'hboot_netx4000_patch_table.xml')
+    )
+    tOptionCompiler = option_compiler.OptionCompiler(tPatchDefinitions)
+
+    tXml = xml.dom.minidom.parseString(make_options(tArgs.sizOptions))
+    tOptionsNode = tXml.documentElement
+
+    tOptionCompiler.process(tOptionsNode)
+    aucOptions = tOptionCompiler.tostring()
+    print('%d options, %d bytes, SHA256 %s' % (
+        tArgs.sizOptions,
+        len(aucOptions),
+        hashlib.sha256(bytes(aucOptions)).hexdigest()
+    ))
+
+    fTime = min(timeit.repeat(
+        lambda: tOptionCompiler.process(tOptionsNode),
+        repeat=tArgs.uiRepeat,
+        number=1
+    ))
+    print('Time: %.3f s' % fTime)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+# Benchmark the macro extraction from "readelf --debug-dump=macro".
+#
+# The fixture is a synthetic dump with DW_MACRO_define_strp records like
+# gcc 9.2 writes them. It is parsed with the old approach (split the
+# complete output and try 3 expressions per line) and with
+# merge_macro_definitions. Both results must be the same.
+#
+# Run it from any folder:
+#   python tests/bench_readelf_macros.py [--units N] [--defines N]
+#   python tests/bench_readelf_macros.py --write macros.txt
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+)
+
+from com import elf_support  # noqa: E402
+
+
+def make_macro_dump(sizUnits, sizDefines):
+    # Generate the readelf output for a number of compile units. Each unit
+    # defines the same set of macros. Every 10th macro gets a different
+    # value in each unit, which must be merged to None.
+    astrLines = ['Contents of the .debug_macro section:', '']
+    for uiUnit in range(sizUnits):
+        astrLines.extend([
+            '  Offset:                      0x%x' % (uiUnit * 0x1000),
+            '  Version:                     4',
+            '  Offset size:                 4',
+            '  Offset into .debug_line:     0x%x' % (uiUnit * 0x100),
+            '',
+            ' DW_MACRO_start_file - lineno: 0 filenum: 1 filename: u%d.c' %
+            uiUnit,
+            ' DW_MACRO_import - offset : 0x26'
+        ])
+        for uiDefine in range(sizDefines):
+            if (uiDefine % 10) == 0:
+                strValue = '0x%08x' % uiUnit
+            else:
+                strValue = '0x%08x' % uiDefine
+            astrLines.append(
+                ' DW_MACRO_define_strp - lineno : %d macro : '
+                'MACRO_%d %s' % (uiDefine + 1, uiDefine, strValue)
+            )
+            if (uiDefine % 50) == 0:
+                # Macros with parameters are not extracted.
+                astrLines.append(
+                    ' DW_MACRO_define_strp - lineno : %d macro : '
+                    'FUNC_%d(a) ((a)+1)' % (uiDefine + 1, uiDefine)
+                )
+                astrLines.append(
+                    ' DW_MACRO_undef_strp - lineno : %d macro : MACRO_%d' %
+                    (uiDefine + 1, uiDefine)
+                )
+        astrLines.extend([' DW_MACRO_end_file', ''])
+    return '\n'.join(astrLines) + '\n'
+
+
+def merge_macro_definitions_old(strOutput):
+    # This is the parser before the single expression was introduced.
+    atMergedMacros = dict({})
+    areMacro = [
+        re.compile(
+            r'\s+DW_MACINFO_define - lineno : \d+ macro : (\w+)\s+(.*)'
+        ),
+        re.compile(
+            r'\s+DW_MACRO_GNU_define_indirect - lineno : \d+ '
+            r'macro : (\w+)\s+(.*)'
+        ),
+        re.compile(
+            r'\s+DW_MACRO_define_strp - lineno : \d+ macro : (\w+)\s+(.*)'
+        )
+    ]
+    for strLine in strOutput.split('\n'):
+        for reMacro in areMacro:
+            tObj = reMacro.match(strLine)
+            if tObj is not None:
+                strName = tObj.group(1)
+                strValue = tObj.group(2)
+                if strName in atMergedMacros:
+                    if(
+                        atMergedMacros[strName] is not None and
+                        atMergedMacros[strName] != strValue
+                    ):
+                        atMergedMacros[strName] = None
+                else:
+                    atMergedMacros[strName] = strValue
+    return atMergedMacros
+
+
+def merge_macro_definitions_new(strOutput):
+    return elf_support.merge_macro_definitions(
+        strOutput.splitlines(True)
+    )
+
+
+def main():
+    tParser = argparse.ArgumentParser(
+        description='Benchmark the readelf macro parser.'
+    )
+    tParser.add_argument(
+        '--units',
+        dest='sizUnits',
+        type=int,
+        default=200,
+        help='Number of compile units in the dump.'
+    )
+    tParser.add_argument(
+        '--defines',
+        dest='sizDefines',
+        type=int,
+        default=500,
+        help='Number of macro definitions per compile unit.'
+    )
+    tParser.add_argument(
+        '--repeat',
+        dest='uiRepeat',
+        type=int,
+        default=3,
+        help='Take the best of this many runs.'
+    )
+    tParser.add_argument(
+        '--write',
+        dest='strWrite',
+        default=None,
+        help='Only write the fixture to this file.'
+    )
+    tArgs = tParser.parse_args()
+
+    strOutput = make_macro_dump(tArgs.sizUnits, tArgs.sizDefines)
+    if tArgs.strWrite is not None:
+        with open(tArgs.strWrite, 'w') as tFile:
+            tFile.write(strOutput)
+        return
+
+    atOld = merge_macro_definitions_old(strOutput)
+    atNew = merge_macro_definitions_new(strOutput)
+    if atOld != atNew:
+        raise Exception('The parsers return different macros.')
+
+    print(
+        'Fixture: %d lines, %d macros, %d ambiguous' % (
+            strOutput.count('\n'),
+            len(atNew),
+            len([strName for strName in atNew if atNew[strName] is None])
+        )
+    )
+    for strName, fnParser in (
+        ('old', merge_macro_definitions_old),
+        ('new', merge_macro_definitions_new)
+    ):
+        fTime = min(timeit.repeat(
+            lambda: fnParser(strOutput),
+            repeat=tArgs.uiRepeat,
+            number=1
+        ))
+        print('%s: %.3f s' % (strName, fTime))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+# Benchmark the scan of a large snippet library.
+#
+# This generates a tree with 20000 snippets in a temporary folder. It also
+# has some other files and a ".git" folder, which must not be scanned. Then
+# it measures the first lookup of a snippet with...
+#   * an empty database (all snippets are read),
+#   * the same database again (nothing changed),
+#   * the same database after 1% of the snippets were modified.
+#
+# Run it from any folder:
+#   python tests/bench_sniplib_scan.py [--snippets N] [--jobs N]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+)
+
+from com import snippet_library  # noqa: E402
+
+
+s_strSnippet = '''<?xml version="1.0" encoding="UTF-8"?>
+<HBootSnippet>
+  <Info artifact="%s" group="%s" version="%s">
+    <License name="GPL-2.0"/>
+    <Author name="bench" url="https://www.hilscher.com"/>
+    <Description>Generated snippet %d.</Description>
+  </Info>
+  <ParameterList>
+    <Parameter name="VALUE" default="0x%08x"/>
+  </ParameterList>
+  <Snippet>
+    <Chunks>
+      <Data><UInt32 address="0x%08x">%s</UInt32></Data>
+    </Chunks>
+  </Snippet>
+</HBootSnippet>
+'''
+
+
+def get_gav(uiSnippet):
+    return (
+        'org.example.group%d' % (uiSnippet // 1000),
+        'artifact%d' % uiSnippet,
+        '1.%d.0' % (uiSnippet % 7)
+    )
+
+
+def get_snippet_path(strRoot, uiSnippet):
+    return os.path.join(
+        strRoot,
+        'group%d' % (uiSnippet // 1000),
+        'folder%d' % ((uiSnippet // 50) % 20),
+        'snippet%d.xml' % uiSnippet
+    )
+
+
+def write_snippet(strRoot, uiSnippet, uiRevision):
+    strGroup, strArtifact, strVersion = get_gav(uiSnippet)
+    tFile = open(get_snippet_path(strRoot, uiSnippet), 'wt')
+    tFile.write(s_strSnippet % (
+        strArtifact,
+        strGroup,
+        strVersion,
+        uiSnippet,
+        uiRevision,
+        0x20080000 + uiSnippet * 0x100,
+        ', '.join(['${VALUE}'] * 32)
+    ))
+    tFile.close()
+
+
+def make_tree(strRoot, sizSnippets):
+    # Create the folders first.
+    atFolders = set()
+    for uiSnippet in range(sizSnippets):
+        atFolders.add(os.path.dirname(get_snippet_path(strRoot, uiSnippet)))
+    for strFolder in atFolders:
+        os.makedirs(strFolder)
+
+    for uiSnippet in range(sizSnippets):
+        write_snippet(strRoot, uiSnippet, 0)
+
+    # Add some files which are no snippets. Each folder gets a readme and
+    # the version control data has XML files which must be skipped.
+    for strFolder in atFolders:
+        tFile = open(os.path.join(strFolder, 'readme.txt'), 'wt')
+        tFile.write('These are generated snippets.\n')
+        tFile.close()
+    strGit = os.path.join(strRoot, '.git', 'objects')
+    os.makedirs(strGit)
+    for uiCnt in range(1000):
+        tFile = open(os.path.join(strGit, 'object%d.xml' % uiCnt), 'wt')
+        tFile.write('<NoSnippet/>\n')
+        tFile.close()
+
+
+def find_snippet(strDatabase, strRoot, uiSnippet, sizJobs):
+    # Create a new library like each run of the compiler does and time the
+    # first lookup. It scans the complete search path.
+    tStartTime = time.time()
+    tLibrary = snippet_library.SnippetLibrary(
+        strDatabase,
+        [strRoot],
+        jobs=sizJobs
+    )
+    strGroup, strArtifact, strVersion = get_gav(uiSnippet)
+    tResult = tLibrary.find(
+        strGroup,
+        strArtifact,
+        strVersion,
+        dict({'VALUE': '0'})
+    )
+    tDuration = time.time() - tStartTime
+
+    if tResult[2] != get_snippet_path(strRoot, uiSnippet):
+        raise Exception('Found the wrong snippet: %s' % tResult[2])
+    return tDuration
+
+
+def main():
+    tParser = argparse.ArgumentParser(
+        description='Benchmark the scan of a large snippet library.'
+    )
+    tParser.add_argument(
+        '--snippets',
+        dest='sizSnippets',
+        type=int,
+        default=20000,
+        help='Number of generated snippets.'
+    )
+    tParser.add_argument(
+        '--jobs',
+        dest='sizJobs',
+        type=int,
+        default=None,
+        help='Number of threads for the scan.'
+    )
+    tParser.add_argument(
+        '--folder',
+        dest='strFolder',
+        default=None,
+        help='Create the tree in this folder and keep it.'
+    )
+    tArgs = tParser.parse_args()
+
+    if tArgs.strFolder is None:
+        strTemp = tempfile.mkdtemp(prefix='sniplib_bench_')
+    else:
+        strTemp = os.path.abspath(tArgs.strFolder)
+    strRoot = os.path.join(strTemp, 'sniplib')
+    strDatabase = os.path.join(strTemp, 'sniplib.db')
+
+    try:
+        tStartTime = time.time()
+        make_tree(strRoot, tArgs.sizSnippets)
+        print('Generated %d snippets in %.3f s' % (
+            tArgs.sizSnippets,
+            time.time() - tStartTime
+        ))
+
+        uiLast = tArgs.sizSnippets - 1
+        fTime = find_snippet(strDatabase, strRoot, uiLast, tArgs.sizJobs)
+        print('Empty database:     %.3f s' % fTime)
+
+        fTime = find_snippet(strDatabase, strRoot, uiLast, tArgs.sizJobs)
+        print('Unchanged snippets: %.3f s' % fTime)
+
+        # Modify every 100th snippet. Move the modification time forward,
+        # as the new contents may be written within the same time stamp.
+        for uiSnippet in range(0, tArgs.sizSnippets, 100):
+            write_snippet(strRoot, uiSnippet, 1)
+            strPath = get_snippet_path(strRoot, uiSnippet)
+            tStat = os.stat(strPath)
+            os.utime(strPath, (tStat.st_atime, tStat.st_mtime + 10))
+        fTime = find_snippet(strDatabase, strRoot, uiLast, tArgs.sizJobs)
+        print('1%% modified:        %.3f s' % fTime)
+
+    finally:
+        if tArgs.strFolder is None:
+            shutil.rmtree(strTemp)
+
+
+if __name__ == '__main__':
+    main()
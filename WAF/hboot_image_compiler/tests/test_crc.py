@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+# Check the table driven CRC functions of the HBoot image compiler against
+# golden vectors and the old bit by bit implementations.
+#
+# Run it from any folder:
+#   python -m unittest discover -s tests -p "test_*.py"
+#   python tests/test_crc.py
+
+import array
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+)
+
+from com import hboot_image  # noqa: E402
+
+
+def crc7_reference(aucData):
+    # This is the bit by bit CRC7 of the SECMEM zones before the table was
+    # introduced.
+    ucCrc = 0
+    for ucByte in bytearray(aucData):
+        for uiBitCnt in range(0, 8):
+            ucBit = (ucCrc ^ ucByte) & 0x80
+            ucCrc <<= 1
+            ucByte <<= 1
+            if ucBit != 0:
+                ucCrc ^= 0x07
+        ucCrc &= 0xff
+    return ucCrc
+
+
+def crc16_reference(aucData):
+    # This is the byte wise CRC16 of the netX56 option chunks before the
+    # table was introduced.
+    usCrc = 0
+    for ucByte in bytearray(aucData):
+        usCrc = (usCrc >> 8) | ((usCrc & 0xff) << 8)
+        usCrc ^= ucByte
+        usCrc ^= (usCrc & 0xff) >> 4
+        usCrc ^= (usCrc & 0x0f) << 12
+        usCrc ^= ((usCrc & 0xff) << 4) << 1
+    return usCrc
+
+
+class TestCrc(unittest.TestCase):
+    # The standard check input of CRC catalogues.
+    strCheck = b'123456789'
+
+    def __get_buffers(self):
+        # Random buffers with all lengths up to 3 table rounds. The seed is
+        # fixed to get the same buffers in every run.
+        tRandom = random.Random(0x4d2)
+        atBuffers = [b'', b'\x00', b'\xff' * 64]
+        for sizBuffer in range(0, 768, 7):
+            atBuffers.append(bytes(bytearray(
+                [tRandom.randint(0, 255) for uiCnt in range(sizBuffer)]
+            )))
+        return atBuffers
+
+    def test_crc7_golden(self):
+        self.assertEqual(hboot_image.crc7(self.strCheck), 0xf4)
+        self.assertEqual(crc7_reference(self.strCheck), 0xf4)
+
+    def test_crc16_golden(self):
+        self.assertEqual(hboot_image.crc16(self.strCheck), 0x31c3)
+        self.assertEqual(crc16_reference(self.strCheck), 0x31c3)
+
+    def test_crc7_reference(self):
+        for strData in self.__get_buffers():
+            self.assertEqual(
+                hboot_image.crc7(strData),
+                crc7_reference(strData)
+            )
+
+    def test_crc16_reference(self):
+        for strData in self.__get_buffers():
+            self.assertEqual(
+                hboot_image.crc16(strData),
+                crc16_reference(strData)
+            )
+
+    def test_input_types(self):
+        # The image compiler passes arrays, bytearrays and memoryviews.
+        strData = self.__get_buffers()[-1]
+        ucCrc7 = crc7_reference(strData)
+        usCrc16 = crc16_reference(strData)
+        for tData in (
+            bytearray(strData),
+            array.array('B', strData),
+            memoryview(strData)
+        ):
+            self.assertEqual(hboot_image.crc7(tData), ucCrc7)
+            self.assertEqual(hboot_image.crc16(tData), usCrc16)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+# ***************************************************************************
+# *   Copyright (C) 2019 by Hilscher GmbH                                   *
+# *   netXsupport@hilscher.com                                              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation; either version 2 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program; if not, write to the                         *
+# *   Free Software Foundation, Inc.,                                       *
+# *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+# ***************************************************************************
+
+# Check the native ELF reader against the binutils.
+#
+# This assembles a small 32 bit program with the host binutils. The
+# executable has a data section with a different load address, the object
+# file has relocations. The native results must be the same as the output
+# of objdump, readelf and objcopy.
+#
+# Run it from any folder:
+#   python -m unittest discover -s tests -p "test_*.py"
+#   python tests/test_elf_reader.py
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+try:
+    from shutil import which
+except ImportError:
+    # Python 2 has no "which" in shutil.
+    from distutils.spawn import find_executable as which
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+)
+
+from com import elf_reader  # noqa: E402
+from com import elf_support  # noqa: E402
+
+
+s_strSource = '''
+.section .text
+.globl start
+start:
+  nop
+  nop
+  ret
+.globl function
+function:
+  .long 1, 2, 3
+.section .rodata
+.globl text
+text:
+  .ascii "hello"
+.section .data
+.globl data
+data:
+  .long 0x11223344, 0x55667788
+.section .bss
+.globl buffer
+buffer:
+  .space 64
+'''
+
+s_strLinkerScript = '''
+SECTIONS {
+  . = 0x20000;
+  .text : { *(.text) }
+  .rodata : { *(.rodata) }
+  .data 0x30000 : AT(ADDR(.rodata) + SIZEOF(.rodata) + 0x10) { *(.data) }
+  .bss : { *(.bss) }
+}
+'''
+
+s_atEnv = dict({
+    'OBJCOPY': 'objcopy',
+    'OBJDUMP': 'objdump',
+    'READELF': 'readelf'
+})
+
+
+def have_binutils():
+    fFound = True
+    for strTool in ['as', 'ld', 'objcopy', 'objdump', 'readelf']:
+        if which(strTool) is None:
+            fFound = False
+    return fFound
+
+
+@unittest.skipIf(have_binutils() is False, 'The host binutils are missing.')
+class TestElfReader(unittest.TestCase):
+    # The folder with the generated ELF files.
+    strFolder = None
+
+    # The paths to the executable and the object file.
+    astrFiles = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.strFolder = tempfile.mkdtemp(prefix='elf_reader_test_')
+        strSource = os.path.join(cls.strFolder, 'test.s')
+        strLinkerScript = os.path.join(cls.strFolder, 'test.ld')
+        strObject = os.path.join(cls.strFolder, 'test.o')
+        strExecutable = os.path.join(cls.strFolder, 'test.elf')
+        for strPath, strContents in [
+            (strSource, s_strSource),
+            (strLinkerScript, s_strLinkerScript)
+        ]:
+            tFile = open(strPath, 'wt')
+            tFile.write(strContents)
+            tFile.close()
+
+        subprocess.check_call(['as', '--32', '-o', strObject, strSource])
+        subprocess.check_call([
+            'ld', '-m', 'elf_i386',
+            '-T', strLinkerScript,
+            '-o', strExecutable,
+            strObject
+        ])
+        cls.astrFiles = [strExecutable, strObject]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.strFolder)
+
+    def __objcopy(self, strFileName, astrSegmentsToDump):
+        return getattr(elf_support, '__get_binary_objcopy')(
+            s_atEnv,
+            strFileName,
+            astrSegmentsToDump
+        )
+
+    def test_native_path(self):
+        # The files must not fall back to the binutils.
+        for strFileName in self.astrFiles:
+            tElf = getattr(elf_support, '__open_elf')(strFileName)
+            self.assertTrue(isinstance(tElf, elf_reader.ElfReader))
+
+    def test_segments(self):
+        for strFileName in self.astrFiles:
+            self.assertEqual(
+                elf_reader.ElfReader(strFileName).get_segment_table(),
+                getattr(elf_support, '__get_segment_table_objdump')(
+                    s_atEnv,
+                    strFileName,
+                    None
+                )
+            )
+
+    def test_symbols(self):
+        for strFileName in self.astrFiles:
+            atSymbols = elf_reader.ElfReader(strFileName).get_symbol_table()
+            self.assertEqual(
+                atSymbols,
+                getattr(elf_support, '__get_symbol_table_readelf')(
+                    s_atEnv,
+                    strFileName
+                )
+            )
+            self.assertTrue('buffer' in atSymbols)
+
+    def test_exec_address(self):
+        strFileName = self.astrFiles[0]
+        self.assertEqual(
+            elf_support.get_exec_address(s_atEnv, strFileName),
+            getattr(elf_support, '__get_exec_address_readelf')(
+                s_atEnv,
+                strFileName
+            )
+        )
+
+    def test_binary(self):
+        for strFileName in self.astrFiles:
+            tElf = elf_reader.ElfReader(strFileName)
+            for astrSegmentsToDump in [
+                None,
+                ['.text'],
+                ['.rodata', '.data']
+            ]:
+                self.assertEqual(
+                    tElf.get_binary(astrSegmentsToDump),
+                    self.__objcopy(strFileName, astrSegmentsToDump)
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()